@@ -0,0 +1,156 @@
+"""Offline tempo, key and duration estimation for uploaded beat files.
+
+WAV files are decoded in fixed-size blocks with the standard library `wave`
+module, mixed to mono and decimated to roughly 11 kHz as they are read, so only
+the reduced signal is held in memory. Tempo comes from the autocorrelation of a
+spectral-flux onset envelope weighted towards common tempos; key comes from a
+chroma vector correlated against the Krumhansl-Kessler major and minor profiles.
+"""
+import wave
+from pathlib import Path
+from typing import Any, Dict, Iterator, Union
+
+import numpy as np
+
+TARGET_RATE = 11025
+BLOCK_FRAMES = 1 << 16
+
+# Onset envelope STFT: ~93 ms windows every ~23 ms at the target rate
+ONSET_FFT = 1024
+ONSET_HOP = 256
+# Chroma STFT: longer windows resolve semitones down to ~110 Hz
+CHROMA_FFT = 4096
+CHROMA_HOP = 2048
+CHROMA_MIN_HZ = 110.0
+CHROMA_MAX_HZ = 3520.0
+
+MIN_BPM = 60
+MAX_BPM = 200
+# Log-normal prior on tempo (centre and width in octaves), so half/double-time peaks lose to the usual range
+TEMPO_PRIOR_BPM = 110.0
+TEMPO_PRIOR_OCTAVES = 1.0
+
+PITCH_CLASSES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+
+
+def _to_mono(frames: bytes, channels: int, sample_width: int) -> np.ndarray:
+    if sample_width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    elif sample_width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        values = np.where(values & 0x800000, values - 0x1000000, values)
+        samples = values.astype(np.float32) / 8388608.0
+    elif sample_width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"Unsupported sample width: {sample_width} bytes")
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples
+
+
+def read_wav_blocks(path: Union[str, Path]) -> Iterator[tuple]:
+    """Yield (sample rate, mono float32 block) decimated towards TARGET_RATE."""
+    with wave.open(str(path), "rb") as wav:
+        if wav.getcomptype() != "NONE":
+            raise ValueError("Only PCM WAV files can be analysed")
+        channels, sample_width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+        factor = max(1, rate // TARGET_RATE)
+        # Whole multiples of the decimation factor, so blocks join without remainders
+        block_frames = BLOCK_FRAMES - BLOCK_FRAMES % factor
+        while True:
+            frames = wav.readframes(block_frames)
+            if not frames:
+                break
+            samples = _to_mono(frames, channels, sample_width)
+            usable = len(samples) - len(samples) % factor
+            if usable:
+                yield rate / factor, samples[:usable].reshape(-1, factor).mean(axis=1)
+
+
+def _stft_magnitude(signal: np.ndarray, n_fft: int, hop: int) -> np.ndarray:
+    if len(signal) < n_fft:
+        signal = np.pad(signal, (0, n_fft - len(signal)))
+    frames = np.lib.stride_tricks.sliding_window_view(signal, n_fft)[::hop]
+    return np.abs(np.fft.rfft(frames * np.hanning(n_fft).astype(np.float32), axis=1))
+
+
+def onset_envelope(signal: np.ndarray) -> np.ndarray:
+    """Half-wave rectified spectral flux of the log-compressed spectrogram."""
+    spectrum = np.log1p(100.0 * _stft_magnitude(signal, ONSET_FFT, ONSET_HOP))
+    flux = np.maximum(np.diff(spectrum, axis=0), 0.0).sum(axis=1)
+    # Remove the slowly varying loudness trend (~1 s moving average)
+    width = 43
+    trend = np.convolve(flux, np.ones(width) / width, mode="same")
+    # Light smoothing widens autocorrelation peaks, so beat periods that fall between frames still score fully
+    return np.convolve(np.maximum(flux - trend, 0.0), np.array([1, 2, 3, 2, 1]) / 9.0, mode="same")
+
+
+def estimate_tempo(envelope: np.ndarray, frame_rate: float) -> Dict[str, float]:
+    envelope = envelope - envelope.mean()
+    size = 1 << int(np.ceil(np.log2(2 * len(envelope))))
+    spectrum = np.fft.rfft(envelope, size)
+    autocorrelation = np.fft.irfft(spectrum * np.conj(spectrum), size)[:len(envelope)]
+    if autocorrelation[0] <= 0:
+        return {"bpm": 0.0, "confidence": 0.0}
+    autocorrelation /= autocorrelation[0]
+
+    min_lag = max(1, int(frame_rate * 60.0 / MAX_BPM))
+    max_lag = min(len(autocorrelation) - 2, int(np.ceil(frame_rate * 60.0 / MIN_BPM)))
+    if max_lag <= min_lag:
+        return {"bpm": 0.0, "confidence": 0.0}
+    lags = np.arange(min_lag, max_lag + 1)
+    bpms = 60.0 * frame_rate / lags
+    prior = np.exp(-0.5 * (np.log2(bpms / TEMPO_PRIOR_BPM) / TEMPO_PRIOR_OCTAVES) ** 2)
+    best = int(np.argmax(autocorrelation[lags] * prior)) + min_lag
+
+    # Parabolic interpolation between neighbouring lags for sub-frame precision
+    left, centre, right = autocorrelation[best - 1:best + 2]
+    denominator = left - 2 * centre + right
+    shift = 0.5 * (left - right) / denominator if denominator else 0.0
+    return {"bpm": 60.0 * frame_rate / (best + shift), "confidence": float(max(centre, 0.0))}
+
+
+def chroma_vector(signal: np.ndarray, rate: float) -> np.ndarray:
+    magnitude = _stft_magnitude(signal, CHROMA_FFT, CHROMA_HOP)
+    frequencies = np.fft.rfftfreq(CHROMA_FFT, 1.0 / rate)
+    in_range = (frequencies >= CHROMA_MIN_HZ) & (frequencies <= min(CHROMA_MAX_HZ, rate / 2))
+    pitch_classes = (np.round(12 * np.log2(frequencies[in_range] / 440.0)).astype(int) + 9) % 12
+    energy = magnitude[:, in_range].sum(axis=0)
+    return np.bincount(pitch_classes, weights=energy, minlength=12)
+
+
+def estimate_key(chroma: np.ndarray) -> Dict[str, Any]:
+    if not chroma.any():
+        return {"key": None, "confidence": 0.0}
+    best_key, best_score = None, -np.inf
+    for mode, profile in (("major", MAJOR_PROFILE), ("minor", MINOR_PROFILE)):
+        for tonic in range(12):
+            score = np.corrcoef(chroma, np.roll(profile, tonic))[0, 1]
+            if score > best_score:
+                best_key, best_score = f"{PITCH_CLASSES[tonic]} {mode}", score
+    return {"key": best_key, "confidence": float(best_score)}
+
+
+def analyze_wav(path: Union[str, Path]) -> Dict[str, Any]:
+    """Estimate bpm, key and duration (seconds) of a PCM WAV file."""
+    blocks = list(read_wav_blocks(path))
+    if not blocks:
+        raise ValueError("WAV file has no audio frames")
+    rate = blocks[0][0]
+    signal = np.concatenate([block for _, block in blocks])
+
+    tempo = estimate_tempo(onset_envelope(signal), rate / ONSET_HOP)
+    key = estimate_key(chroma_vector(signal, rate))
+    return {
+        "bpm": int(round(tempo["bpm"])) or None,
+        "key": key["key"],
+        "duration": int(round(len(signal) / rate)),
+        "tempo_confidence": round(tempo["confidence"], 3),
+        "key_confidence": round(key["confidence"], 3)
+    }
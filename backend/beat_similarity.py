@@ -0,0 +1,202 @@
+"""In-memory beat similarity index.
+
+Each beat becomes a fixed-width float32 vector made of feature groups:
+
+- tempo: a point on the log2-tempo circle, so half and double time (70/140 BPM)
+  coincide and nearby tempos stay close;
+- key: a point on the Camelot wheel plus a small major/minor offset, so the
+  harmonically compatible neighbours (adjacent numbers, relative major/minor)
+  are the nearest keys;
+- mood and genre: hashed one-hot columns;
+- tags: a normalised hashed bag of tags.
+
+Queries compare only the groups they carry (a verse with just a bpm and a mood
+ignores key, genre and tags), using squared Euclidean distance computed for the
+whole matrix at once. Hashing keeps the width fixed, so beats can be appended
+without rebuilding the vocabulary.
+"""
+import math
+import re
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+MOOD_BUCKETS = 12
+GENRE_BUCKETS = 12
+TAG_BUCKETS = 32
+
+# Relative weight of each group in the distance
+GROUP_WEIGHTS = {"tempo": 1.0, "key": 1.0, "mood": 0.8, "genre": 0.6, "tags": 0.5}
+# Half the distance between relative major and minor, about that of adjacent Camelot numbers
+MODE_OFFSET = 0.25
+
+GROUPS: List[Tuple[str, int]] = [
+    ("tempo", 2), ("key", 3), ("mood", MOOD_BUCKETS), ("genre", GENRE_BUCKETS), ("tags", TAG_BUCKETS)
+]
+GROUP_SLICES: Dict[str, slice] = {}
+_start = 0
+for _name, _width in GROUPS:
+    GROUP_SLICES[_name] = slice(_start, _start + _width)
+    _start += _width
+DIMENSIONS = _start
+_GROUP_STARTS = [GROUP_SLICES[name].start for name, _ in GROUPS]
+
+NOTE_PITCHES = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+_CAMELOT_RE = re.compile(r"^\s*(1[0-2]|[1-9])\s*([AaBb])\s*$")
+_KEY_RE = re.compile(r"^\s*([A-Ga-g])\s*([#b♯♭]?)\s*(.*?)\s*$")
+_MINOR_SUFFIXES = {"m", "min", "minor", "-", "mi"}
+_MAJOR_SUFFIXES = {"", "maj", "major", "ma"}
+
+
+def camelot(key: Optional[str]) -> Optional[Tuple[int, str]]:
+    """Parse "8A", "A minor", "Am", "C#m", "Db major" and the like to (number, "A"/"B")."""
+    if not key:
+        return None
+    match = _CAMELOT_RE.match(key)
+    if match:
+        return int(match.group(1)), match.group(2).upper()
+    match = _KEY_RE.match(key)
+    if not match:
+        return None
+    letter, accidental, suffix = match.groups()
+    pitch = NOTE_PITCHES[letter.upper()]
+    if accidental in ("#", "♯"):
+        pitch += 1
+    elif accidental in ("b", "♭"):
+        pitch -= 1
+    # "M" alone is major and "m" minor; every longer suffix is case-insensitive
+    if suffix == "M" or suffix.lower() in _MAJOR_SUFFIXES:
+        minor = False
+    elif suffix.lower() in _MINOR_SUFFIXES:
+        minor = True
+    else:
+        return None
+    # Camelot numbers walk the circle of fifths from 8B = C major; minor keys share their relative major's number
+    major_pitch = (pitch + 3) % 12 if minor else pitch % 12
+    return ((7 * major_pitch) % 12 + 7) % 12 + 1, "A" if minor else "B"
+
+
+def _bucket(value: str, buckets: int) -> int:
+    # crc32 rather than hash(): string hashes are salted per process
+    return zlib.crc32(value.strip().lower().encode()) % buckets
+
+
+def beat_features(bpm: Optional[float] = None, key: Optional[str] = None, mood: Optional[str] = None,
+                  genre: Optional[str] = None, tags: Iterable[str] = ()) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the feature vector and a per-group presence mask (in GROUPS order)."""
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    present = np.zeros(len(GROUPS), dtype=np.float32)
+
+    if bpm and bpm > 0:
+        angle = 2 * math.pi * math.log2(bpm)
+        vector[GROUP_SLICES["tempo"]] = [math.cos(angle), math.sin(angle)]
+        present[0] = 1
+    position = camelot(key)
+    if position:
+        number, letter = position
+        angle = 2 * math.pi * (number - 1) / 12
+        vector[GROUP_SLICES["key"]] = [math.cos(angle), math.sin(angle), MODE_OFFSET if letter == "B" else -MODE_OFFSET]
+        present[1] = 1
+    if mood and mood.strip():
+        vector[GROUP_SLICES["mood"].start + _bucket(mood, MOOD_BUCKETS)] = 1
+        present[2] = 1
+    if genre and genre.strip():
+        vector[GROUP_SLICES["genre"].start + _bucket(genre, GENRE_BUCKETS)] = 1
+        present[3] = 1
+    tags = [tag for tag in tags if tag and tag.strip()]
+    if tags:
+        bag = np.bincount([_bucket(tag, TAG_BUCKETS) for tag in tags], minlength=TAG_BUCKETS).astype(np.float32)
+        vector[GROUP_SLICES["tags"]] = bag / np.linalg.norm(bag)
+        present[4] = 1
+
+    for name, _ in GROUPS:
+        vector[GROUP_SLICES[name]] *= math.sqrt(GROUP_WEIGHTS[name])
+    return vector, present
+
+
+class BeatIndex:
+    """Append/overwrite-only feature matrix with vectorised top-k search."""
+
+    def __init__(self, capacity: int = 1024):
+        self._features = np.zeros((capacity, DIMENSIONS), dtype=np.float32)
+        # Squared norm of each group per row, so masked distances need no extra pass over the matrix
+        self._group_norms = np.zeros((capacity, len(GROUPS)), dtype=np.float32)
+        self._present = np.zeros((capacity, len(GROUPS)), dtype=np.float32)
+        self.ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, beat_id: str) -> bool:
+        return beat_id in self._rows
+
+    def add(self, beat: Dict[str, Any]):
+        """Insert a beat document, or replace its row if it is already indexed."""
+        self.add_many([beat])
+
+    def add_many(self, beats: Iterable[Dict[str, Any]]):
+        rows = []
+        for beat in beats:
+            vector, present = beat_features(
+                beat.get("bpm"), beat.get("key"), beat.get("mood"), beat.get("genre"), beat.get("tags") or ()
+            )
+            row = self._rows.get(beat["id"])
+            if row is None:
+                row = len(self.ids)
+                if row == len(self._features):
+                    self._grow()
+                self.ids.append(beat["id"])
+                self._rows[beat["id"]] = row
+            self._features[row] = vector
+            self._present[row] = present
+            rows.append(row)
+        if rows:
+            squared = self._features[rows] ** 2
+            self._group_norms[rows] = np.add.reduceat(squared, _GROUP_STARTS, axis=1)
+
+    def _grow(self):
+        capacity = 2 * len(self._features)
+        for name in ("_features", "_group_norms", "_present"):
+            current = getattr(self, name)
+            grown = np.zeros((capacity, current.shape[1]), dtype=np.float32)
+            grown[:len(current)] = current
+            setattr(self, name, grown)
+
+    def vector(self, beat_id: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        row = self._rows.get(beat_id)
+        if row is None:
+            return None
+        return self._features[row].copy(), self._present[row].copy()
+
+    def search(self, vector: np.ndarray, present: np.ndarray, k: int = 10,
+               exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Nearest k beats over the groups present in the query, as (beat id, distance)."""
+        count = len(self.ids)
+        if count == 0 or not present.any():
+            return []
+        features = self._features[:count]
+        query = vector.copy()
+        for group, (name, _) in enumerate(GROUPS):
+            if not present[group]:
+                query[GROUP_SLICES[name]] = 0
+
+        # |x - q|^2 over the present groups = sum of x's present group norms + |q|^2 - 2 x.q
+        distances = self._group_norms[:count] @ present + float(query @ query) - 2.0 * (features @ query)
+        # Beats missing a group the query has are compared as if at the far side of it
+        distances += (1.0 - self._present[:count]) @ (present * self._missing_penalty())
+        if exclude is not None and exclude in self._rows:
+            distances[self._rows[exclude]] = np.inf
+
+        k = min(k, count - (1 if exclude in self._rows else 0))
+        if k <= 0:
+            return []
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        return [(self.ids[row], float(max(distances[row], 0.0))) for row in top]
+
+    @staticmethod
+    def _missing_penalty() -> np.ndarray:
+        # A missing group has a zero vector, whose distance to a unit point is 1; add half again so known matches rank first
+        return np.array([0.5 * GROUP_WEIGHTS[name] for name, _ in GROUPS], dtype=np.float32)
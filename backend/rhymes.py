@@ -0,0 +1,359 @@
+"""Offline phonetic rhyme analysis for verse lyrics.
+
+Words are transcribed to ARPAbet phones from a CMUdict-format pronunciation
+dictionary when one is available, falling back to letter-to-sound rules for
+slang and other out-of-vocabulary words. Line endings are clustered into rhyme
+families by their stressed vowel tail, which drives the rhyme scheme.
+"""
+import logging
+import mmap
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+DICT_PATH = Path(os.environ.get("PRONUNCIATION_DICT", Path(__file__).parent / "data" / "cmudict.dict"))
+
+VOWELS = {
+    "AA", "AE", "AH", "AO", "AW", "AY", "EH", "ER", "EY",
+    "IH", "IY", "OW", "OY", "UH", "UW"
+}
+REDUCED_VOWELS = {"AH", "ER"}
+
+# Consonant classes used to compare codas for near rhymes ("time"/"mind" vs "time"/"tight")
+CONSONANT_CLASSES = {
+    "P": "stop", "B": "stop", "T": "stop", "D": "stop", "K": "stop", "G": "stop",
+    "M": "nasal", "N": "nasal", "NG": "nasal",
+    "F": "fric", "V": "fric", "TH": "fric", "DH": "fric", "S": "fric", "Z": "fric",
+    "SH": "fric", "ZH": "fric", "HH": "fric", "CH": "affr", "JH": "affr",
+    "L": "liquid", "R": "liquid", "W": "glide", "Y": "glide"
+}
+
+# Words too common to count as internal rhymes
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "to", "of", "in", "on", "at", "it", "is",
+    "i", "me", "my", "we", "you", "he", "she", "they", "be", "so", "no", "do", "up",
+    "i'm", "im", "it's", "its"
+}
+
+# Frequent words the letter-to-sound rules get wrong
+IRREGULAR_WORDS = {
+    "a": "AH", "the": "DH AH", "of": "AH V", "to": "T UW", "do": "D UW", "who": "HH UW",
+    "you": "Y UW", "two": "T UW", "through": "TH R UW", "though": "DH OW",
+    "one": "W AH N", "done": "D AH N", "none": "N AH N", "gone": "G AO N",
+    "love": "L AH V", "above": "AH B AH V", "come": "K AH M", "some": "S AH M",
+    "money": "M AH N IY", "honey": "HH AH N IY", "said": "S EH D", "says": "S EH Z",
+    "been": "B IH N", "again": "AH G EH N", "are": "AA R", "were": "W ER",
+    "have": "HH AE V", "give": "G IH V", "live": "L IH V", "what": "W AH T",
+    "was": "W AH Z", "eye": "AY", "i": "AY", "my": "M AY", "by": "B AY",
+    "eyes": "AY Z", "heart": "HH AA R T", "world": "W ER L D", "word": "W ER D",
+    "work": "W ER K", "flow": "F L OW", "know": "N OW", "show": "SH OW",
+    "now": "N AW", "how": "HH AW", "wow": "W AW", "mic": "M AY K", "real": "R IY L",
+    "people": "P IY P AH L", "where": "W EH R", "there": "DH EH R", "their": "DH EH R",
+    "any": "EH N IY", "many": "M EH N IY", "only": "OW N L IY", "blood": "B L AH D",
+    "could": "K UH D", "would": "W UH D", "should": "SH UH D", "put": "P UH T",
+    "good": "G UH D", "hood": "HH UH D", "look": "L UH K", "book": "B UH K"
+}
+
+# Letter-to-sound rules, longest grapheme first: (grapheme, phones, position)
+# position is "start", "end" or None for anywhere
+_GRAPHEME_RULES: List[Tuple[str, str, Optional[str]]] = [
+    ("tion", "SH AH N", None), ("sion", "ZH AH N", None), ("ough", "AO", None),
+    ("augh", "AO", None), ("eigh", "EY", None), ("igh", "AY", None),
+    ("tch", "CH", None), ("dge", "JH", None), ("in'", "IH N", "end"),
+    ("ing", "IH NG", "end"), ("kn", "N", "start"), ("wr", "R", "start"),
+    ("ch", "CH", None), ("sh", "SH", None), ("th", "TH", None), ("ph", "F", None),
+    ("wh", "W", None), ("ck", "K", None), ("ng", "NG", None), ("qu", "K W", None),
+    ("ee", "IY", None), ("ea", "IY", None), ("ie", "AY", "end"), ("ie", "IY", None),
+    ("oo", "UW", None), ("ou", "AW", None), ("ow", "OW", None), ("oi", "OY", None),
+    ("oy", "OY", None), ("ai", "EY", None), ("ay", "EY", None), ("au", "AO", None),
+    ("aw", "AO", None), ("oa", "OW", None), ("ew", "UW", None), ("ey", "IY", "end"),
+    ("ue", "UW", None), ("ui", "UW", None), ("ar", "AA R", None), ("er", "ER", None),
+    ("ir", "ER", None), ("ur", "ER", None), ("or", "AO R", None)
+]
+_LONG_VOWELS = {"a": "EY", "e": "IY", "i": "AY", "o": "OW", "u": "UW"}
+_SHORT_VOWELS = {"a": "AE", "e": "EH", "i": "IH", "o": "AA", "u": "AH"}
+_CONSONANTS = {
+    "b": "B", "d": "D", "f": "F", "g": "G", "h": "HH", "j": "JH", "k": "K", "l": "L",
+    "m": "M", "n": "N", "p": "P", "q": "K", "r": "R", "s": "S", "t": "T", "v": "V",
+    "w": "W", "x": "K S", "z": "Z"
+}
+_WORD_RE = re.compile(r"[a-z][a-z']*")
+_KEY_END_RE = re.compile(rb"[ \t\r\n]")
+
+logger = logging.getLogger(__name__)
+
+
+class PronunciationDictionary:
+    """CMUdict-format dictionary memory-mapped from disk.
+
+    The file is mapped lazily on first lookup, once per process. Only the sorted
+    lowercase keys and their line offsets are kept in memory; lookups bisect the
+    keys and read the pronunciation straight from the mapping.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._map: Optional[mmap.mmap] = None
+        self._offsets = array("I")
+        self._keys: List[bytes] = []
+
+    def _key_at(self, offset: int) -> bytes:
+        match = _KEY_END_RE.search(self._map, offset)
+        key = self._map[offset:match.start() if match else len(self._map)].lower()
+        # Alternate pronunciations are listed as "word(2)"
+        paren = key.find(b"(")
+        return key[:paren] if paren > 0 else key
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            if self.path.exists() and self.path.stat().st_size:
+                with open(self.path, "rb") as f:
+                    self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                offsets = []
+                offset = 0
+                size = len(self._map)
+                while offset < size:
+                    end = self._map.find(b"\n", offset)
+                    end = size if end == -1 else end
+                    if end > offset and not self._map[offset:offset + 3] == b";;;":
+                        offsets.append(offset)
+                    offset = end + 1
+                keys = [self._key_at(offset) for offset in offsets]
+                # Stable sort keeps the primary pronunciation ahead of "(2)" variants
+                order = sorted(range(len(offsets)), key=keys.__getitem__)
+                self._keys = [keys[i] for i in order]
+                self._offsets = array("I", (offsets[i] for i in order))
+            if self._keys:
+                logger.info("Pronunciation dictionary %s: %d entries", self.path, len(self._keys))
+            else:
+                logger.warning(
+                    "Pronunciation dictionary %s not found; rhyme analysis falls back to letter-to-sound rules "
+                    "(set PRONUNCIATION_DICT to a CMUdict-format file)", self.path
+                )
+            self._loaded = True
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def load(self) -> int:
+        """Map the dictionary now rather than on first lookup; returns the entry count (0 if missing)."""
+        if not self._loaded:
+            self._load()
+        return len(self._offsets)
+
+    def lookup(self, word: str) -> Optional[List[str]]:
+        if not self._loaded:
+            self._load()
+        if not self._offsets:
+            return None
+        key = word.encode("latin-1", "ignore")
+        lo = bisect_left(self._keys, key)
+        if lo == len(self._keys) or self._keys[lo] != key:
+            return None
+        start = self._offsets[lo]
+        end = self._map.find(b"\n", start)
+        line = self._map[start:end if end != -1 else len(self._map)].decode("latin-1")
+        # Entries may end in a comment ("aalborg AO1 L B AO0 R G # place, danish")
+        return line.split("#", 1)[0].split()[1:]
+
+
+dictionary = PronunciationDictionary(DICT_PATH)
+
+
+def letter_to_sound(word: str) -> List[str]:
+    """Approximate ARPAbet phones for a word from its spelling."""
+    phones: List[str] = []
+    i = 0
+    n = len(word)
+    while i < n:
+        for grapheme, sound, position in _GRAPHEME_RULES:
+            if not word.startswith(grapheme, i):
+                continue
+            if position == "start" and i != 0:
+                continue
+            if position == "end" and i + len(grapheme) != n:
+                continue
+            phones.extend(sound.split())
+            i += len(grapheme)
+            break
+        else:
+            char = word[i]
+            nxt = word[i + 1] if i + 1 < n else ""
+            if char in _SHORT_VOWELS:
+                # Magic e: vowel + one consonant + final silent e
+                if i + 2 == n - 1 and word[-1] == "e" and nxt not in _SHORT_VOWELS:
+                    phones.append(_LONG_VOWELS[char])
+                elif char == "a" and i == n - 1 and n > 1:
+                    phones.append("AH")
+                elif char == "o" and i == n - 1:
+                    phones.append("OW")
+                elif char == "e" and i == n - 1:
+                    # Final e is silent unless it is the only vowel ("me", "she")
+                    if not any(c in "aeiouy" for c in word[:-1]):
+                        phones.append("IY")
+                else:
+                    phones.append(_SHORT_VOWELS[char])
+            elif char == "y":
+                if i == 0:
+                    phones.append("Y")
+                elif i == n - 1:
+                    phones.append("AY" if n <= 3 else "IY")
+                else:
+                    phones.append("IH")
+            elif char == "c":
+                phones.append("S" if nxt in ("e", "i", "y") else "K")
+            elif char in _CONSONANTS:
+                # Collapse doubled consonants
+                if not (i > 0 and word[i - 1] == char):
+                    phones.extend(_CONSONANTS[char].split())
+            i += 1
+    return phones
+
+
+@lru_cache(maxsize=65536)
+def pronounce(word: str) -> Tuple[Tuple[str, ...], bool]:
+    """Return (phones, stressed) where stressed marks dictionary phones carrying stress digits."""
+    if word in IRREGULAR_WORDS:
+        return tuple(IRREGULAR_WORDS[word].split()), False
+    phones = dictionary.lookup(word)
+    if phones:
+        return tuple(phones), True
+    return tuple(letter_to_sound(word.replace("'", "") if not word.endswith("in'") else word)), False
+
+
+def _is_vowel(phone: str) -> bool:
+    return phone.rstrip("012") in VOWELS
+
+
+def rhyme_tail(phones: Tuple[str, ...], stressed: bool) -> Tuple[str, ...]:
+    """Phones from the last stressed vowel to the end, with stress marks removed."""
+    vowels = [i for i, phone in enumerate(phones) if _is_vowel(phone)]
+    if not vowels:
+        return ()
+    start = vowels[-1]
+    if stressed:
+        stressed_vowels = [i for i in vowels if phones[i][-1] in "12"]
+        if stressed_vowels:
+            start = stressed_vowels[-1]
+    elif len(vowels) > 1 and (
+        phones[vowels[-1]] in REDUCED_VOWELS or phones[vowels[-1]:] in (("IH", "NG"), ("IH", "N"))
+    ):
+        # Unstressed endings ("-er", "-a", "-in'") rhyme on the syllable before
+        start = vowels[-2]
+    return tuple(phone.rstrip("012") for phone in phones[start:])
+
+
+def rhyme_key(tail: Tuple[str, ...]) -> Optional[tuple]:
+    """Family key: vowel nuclei of the tail plus the consonant classes of its coda."""
+    if not tail:
+        return None
+    vowels = tuple(phone for phone in tail if phone in VOWELS)
+    last_vowel = max(i for i, phone in enumerate(tail) if phone in VOWELS)
+    coda = list(tail[last_vowel + 1:])
+    # Plural/verb "s" doesn't break a rhyme ("dreams"/"seem")
+    if coda and coda[-1] in ("S", "Z"):
+        coda.pop()
+    classes = []
+    for phone in coda:
+        cls = CONSONANT_CLASSES.get(phone, phone)
+        if not classes or classes[-1] != cls:
+            classes.append(cls)
+    return vowels, tuple(classes)
+
+
+@lru_cache(maxsize=65536)
+def word_rhyme_key(word: str) -> Optional[tuple]:
+    return rhyme_key(rhyme_tail(*pronounce(word)))
+
+
+@lru_cache(maxsize=65536)
+def word_vowels(word: str) -> Tuple[str, ...]:
+    phones, _ = pronounce(word)
+    return tuple(phone.rstrip("012") for phone in phones if _is_vowel(phone))
+
+
+def _vowel_sequence(words: List[str]) -> List[str]:
+    sequence: List[str] = []
+    for word in words:
+        sequence.extend(word_vowels(word))
+    return sequence
+
+
+def _shared_vowel_run(a: List[str], b: List[str]) -> int:
+    run = 0
+    while run < len(a) and run < len(b) and a[-1 - run] == b[-1 - run]:
+        run += 1
+    return run
+
+
+def _scheme_label(index: int) -> str:
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    label = letters[index % 26]
+    return label if index < 26 else f"{label}{index // 26 + 1}"
+
+
+def analyze_rhymes(lyrics: str) -> Dict[str, Any]:
+    """Rhyme scheme, per-line rhyme groups, multisyllabic and internal rhymes."""
+    lines = [line.strip() for line in lyrics.split("\n") if line.strip()]
+    line_words = [_WORD_RE.findall(line.lower()) for line in lines]
+
+    keys = []
+    for words in line_words:
+        key = None
+        if words:
+            key = word_rhyme_key(words[-1])
+        keys.append(key)
+
+    # Lines share a letter when their end words share a rhyme family
+    labels: Dict[Any, str] = {}
+    scheme = []
+    for i, key in enumerate(keys):
+        family = key if key is not None else ("unrhymed", i)
+        if family not in labels:
+            labels[family] = _scheme_label(len(labels))
+        scheme.append(labels[family])
+
+    groups: Dict[str, List[int]] = {}
+    for i, label in enumerate(scheme):
+        groups.setdefault(label, []).append(i)
+
+    # Multisyllabic rhymes compare trailing vowel runs over the last few words of grouped lines
+    tails = [_vowel_sequence(words[-3:]) for words in line_words]
+    results = []
+    for i, words in enumerate(line_words):
+        peers = [j for j in groups[scheme[i]] if j != i]
+        syllables = max((_shared_vowel_run(tails[i], tails[j]) for j in peers), default=0)
+
+        word_keys: Dict[tuple, List[str]] = {}
+        for word in words:
+            if word in STOPWORDS or len(word) < 2:
+                continue
+            key = word_rhyme_key(word)
+            if key is not None:
+                word_keys.setdefault(key, []).append(word)
+        internal = [sorted(set(ws)) for ws in word_keys.values() if len(set(ws)) > 1]
+
+        results.append({
+            "line": i,
+            "text": lines[i],
+            "end_word": words[-1] if words else None,
+            "group": scheme[i],
+            "rhymes_with": peers,
+            "multisyllabic": syllables if syllables > 1 else 0,
+            "internal_rhymes": internal
+        })
+
+    return {
+        "scheme": "".join(scheme),
+        "groups": groups,
+        "lines": results
+    }
@@ -1,23 +1,116 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Query
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Query, Request, Response, Header
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import StreamingResponse, FileResponse, PlainTextResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne, ReturnDocument, IndexModel, TEXT, monitoring
+from pymongo.errors import OperationFailure, BulkWriteError, PyMongoError
 import os
 import logging
+import asyncio
+import time
+import threading
 from pathlib import Path
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timedelta
 from enum import Enum
 import re
+import json
+import base64
+import hashlib
+import csv
+import io
+import zipfile
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from collections import OrderedDict, Counter
+import heapq
+from difflib import SequenceMatcher, unified_diff
+from functools import lru_cache
+from contextvars import ContextVar
+from bisect import bisect_left
+import numpy as np
+import orjson
+from sortedcontainers import SortedDict, SortedList
+
+from rhymes import analyze_rhymes
+from audio_analysis import analyze_wav
+from beat_similarity import BeatIndex, beat_features
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# MONGO COMMAND MONITORING
+# Every command is counted per command name (see REQUEST METRICS). Commands issued
+# while serving a request are also charged to that request: Motor runs pymongo on
+# its executor inside a copy of the caller's contextvars, so the request's stats
+# object is visible from the listener.
+MAX_REQUEST_SHAPES = 50
+SHAPE_FIELDS = ("filter", "query", "sort", "projection", "pipeline", "updates", "deletes")
+
+class RequestStats:
+    def __init__(self):
+        self.commands = 0
+        self.mongo_seconds = 0.0
+        self.shapes: List[tuple] = []
+        self._lock = threading.Lock()
+    
+    def add(self, seconds: float, shape: Optional[Dict[str, Any]]):
+        with self._lock:
+            self.commands += 1
+            self.mongo_seconds += seconds
+            if shape is not None and len(self.shapes) < MAX_REQUEST_SHAPES:
+                self.shapes.append((shape, seconds))
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def _blank_values(value, keep: bool = False):
+    # Keep the structure of a query and drop its values; sort specs are kept as they are part of the shape
+    if isinstance(value, dict):
+        return {key: _blank_values(item, keep or key in ("sort", "$sort")) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            return [_blank_values(item, keep) for item in value]
+        return ["?"] if value else []
+    return value if keep else "?"
+
+def command_shape(name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    target = command.get(name)
+    shape = {"command": name, "collection": target if isinstance(target, str) else None}
+    for field in SHAPE_FIELDS:
+        if field in command:
+            shape[field] = _blank_values(command[field], keep=field == "sort")
+    return shape
+
+class MongoCommandListener(monitoring.CommandListener):
+    def __init__(self):
+        self._shapes: Dict[tuple, Dict[str, Any]] = {}
+    
+    def started(self, event):
+        stats = _request_stats.get()
+        if stats is not None and len(stats.shapes) < MAX_REQUEST_SHAPES:
+            self._shapes[(event.connection_id, event.request_id)] = command_shape(event.command_name, event.command)
+    
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+    
+    def failed(self, event):
+        self._finish(event, failed=True)
+    
+    def _finish(self, event, failed: bool):
+        seconds = event.duration_micros / 1_000_000
+        shape = self._shapes.pop((event.connection_id, event.request_id), None)
+        request_metrics.record_command(event.command_name, seconds, failed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.add(seconds, shape)
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandListener()])
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
@@ -141,6 +234,10 @@ class Beat(BaseModel):
     is_free: bool = True
     download_count: int = 0
     rating: float = 0.0
+    file_hash: Optional[str] = None  # sha256 of the stored file
+    file_size: Optional[int] = None
+    file_content_type: Optional[str] = None
+    analysis: Optional[Dict[str, Any]] = None  # estimated bpm/key/duration of the stored file
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -157,6 +254,24 @@ class BeatCreate(BaseModel):
     price: Optional[float] = None
     is_free: bool = True
 
+class BeatMatch(BaseModel):
+    beat: Beat
+    distance: float
+
+class BeatUploadCreate(BaseModel):
+    size: int = Field(gt=0)
+    filename: Optional[str] = None
+    content_type: Optional[str] = None
+
+class BeatUpload(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    beat_id: str
+    size: int
+    offset: int = 0
+    filename: Optional[str] = None
+    content_type: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
 class Product(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
@@ -168,15 +283,20 @@ class Product(BaseModel):
     gallery_urls: List[str] = []
     download_url: Optional[str] = None
     stock_quantity: int = 0
+    # Checkout only enforces stock_quantity when set; products from before stock was enforced have it unset
+    track_stock: bool = False
     sold_count: int = 0
     rating: float = 0.0
+    rating_sum: int = 0
     review_count: int = 0
+    rating_histogram: Dict[str, int] = Field(default_factory=lambda: {str(stars): 0 for stars in range(1, 6)})
     tags: List[str] = []
     features: List[str] = []
     requirements: List[str] = []
     is_active: bool = True
     is_featured: bool = False
     discount_percentage: float = 0.0
+    version: int = 1
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -190,6 +310,8 @@ class ProductCreate(BaseModel):
     gallery_urls: List[str] = []
     download_url: Optional[str] = None
     stock_quantity: int = 0
+    # Defaults to true for physical products created with a stock_quantity
+    track_stock: Optional[bool] = None
     tags: List[str] = []
     features: List[str] = []
     requirements: List[str] = []
@@ -244,6 +366,48 @@ class OrderCreate(BaseModel):
     products: List[dict]
     payment_method: Optional[str] = None
 
+class VerseRevision(BaseModel):
+    version: int
+    title: str
+    kind: str  # "snapshot" or "delta"
+    created_at: datetime
+
+class VerseRevisionContent(BaseModel):
+    version: int
+    title: str
+    lyrics: str
+    created_at: datetime
+
+class VerseSearchHit(BaseModel):
+    id: str
+    title: str
+    category: VerseCategory
+    beat_name: Optional[str] = None
+    tags: List[str] = []
+    updated_at: datetime
+    score: float
+    snippet: str
+    highlights: List[List[int]] = []  # [start, end) offsets of query matches in snippet
+
+VERSE_SEARCH_FIELDS = ["id", "title", "category", "beat_name", "tags", "updated_at", "lyrics"]
+
+class RhymeAnalysisRequest(BaseModel):
+    lyrics: str
+
+class RhymeLine(BaseModel):
+    line: int
+    text: str
+    end_word: Optional[str] = None
+    group: str
+    rhymes_with: List[int] = []
+    multisyllabic: int = 0  # trailing syllables shared with the best-matching line in the group
+    internal_rhymes: List[List[str]] = []
+
+class RhymeAnalysis(BaseModel):
+    scheme: str
+    groups: Dict[str, List[int]]
+    lines: List[RhymeLine]
+
 class AnalyticsData(BaseModel):
     total_verses: int
     total_products: int
@@ -264,13 +428,746 @@ def calculate_line_count(lyrics: str) -> int:
     return len([line for line in lyrics.split('\n') if line.strip()])
 
 def analyze_rhyme_scheme(lyrics: str) -> str:
-    # Simple rhyme scheme analysis (can be enhanced)
+    # Phonetic rhyme families of line endings (see rhymes.py)
     lines = [line.strip() for line in lyrics.split('\n') if line.strip()]
     if len(lines) < 2:
         return "N/A"
     
-    # Basic pattern detection (AABB, ABAB, etc.)
-    return "ABAB"  # Placeholder - would need more sophisticated analysis
+    return analyze_rhymes(lyrics)["scheme"]
+
+# LYRIC SEARCH
+SNIPPET_LENGTH = 160
+
+def search_terms_pattern(search: str) -> Optional[re.Pattern]:
+    # Match query words as word prefixes so stemmed text-index matches ("rhymes" for "rhyme") highlight too
+    terms = [term for term in re.findall(r"[\w']+", search.lower()) if len(term) > 1]
+    if not terms:
+        return None
+    return re.compile(r"\b(?:" + "|".join(re.escape(term) for term in terms) + r")[\w']*", re.IGNORECASE)
+
+def lyric_snippet(lyrics: str, pattern: Optional[re.Pattern]) -> tuple:
+    """Return the lyric line with the most query hits and the [start, end) offsets of each hit."""
+    lines = [line.strip() for line in lyrics.split('\n') if line.strip()]
+    if not lines:
+        return "", []
+    best = lines[0]
+    if pattern:
+        best = max(lines, key=lambda line: len(pattern.findall(line)))
+    snippet = best[:SNIPPET_LENGTH]
+    highlights = [[m.start(), m.end()] for m in pattern.finditer(snippet)] if pattern else []
+    return snippet, highlights
+
+# OPTIMISTIC CONCURRENCY
+# Updates are one find_one_and_update that increments `version`. Clients can send the
+# version they edited as If-Match ("3", W/"3" or the "3-<digest>" ETag of a GET)
+# or ?expected_version=3; if the document moved on in the meantime the update is
+# rejected with 409.
+def required_version(if_match: Optional[str], expected_version: Optional[int]) -> Optional[int]:
+    if expected_version is not None:
+        return expected_version
+    if not if_match or if_match.strip() == "*":
+        return None
+    try:
+        return int(if_match.strip().removeprefix("W/").strip('"').split("-")[0])
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be a version number")
+
+def version_query(version: int) -> Dict[str, Any]:
+    # Documents created before versioning have no `version` field and read as version 1
+    if version == 1:
+        return {"$or": [{"version": 1}, {"version": {"$exists": False}}]}
+    return {"version": version}
+
+async def versioned_update(collection, doc_id: str, update_data: Dict[str, Any],
+                           version: Optional[int], not_found: str) -> tuple:
+    """Apply the $set and bump `version` atomically; return the (before, after) documents."""
+    query = {"id": doc_id}
+    if version is not None:
+        query.update(version_query(version))
+    # Pipeline form so a missing version counts as 1; $literal keeps "$..." strings in the data from being read as fields
+    before = await collection.find_one_and_update(
+        query,
+        [{"$set": {
+            **{field: {"$literal": value} for field, value in update_data.items()},
+            "version": {"$add": [{"$ifNull": ["$version", 1]}, 1]}
+        }}],
+        return_document=ReturnDocument.BEFORE
+    )
+    if before is None:
+        # Only the failure path pays for a second read, to tell a conflict from a missing document
+        if version is not None and await collection.count_documents({"id": doc_id}, limit=1):
+            raise HTTPException(status_code=409, detail="Version conflict")
+        raise HTTPException(status_code=404, detail=not_found)
+    # The pre-image plus the applied update is exactly the stored result
+    after = {**before, **update_data, "version": before.get("version", 1) + 1}
+    return before, after
+
+# KEYSET PAGINATION
+# Cursors are opaque base64 tokens of (sort value, id) for the last item of a page.
+# Listings sort on (sort_field desc, id desc), so page N is an index range scan
+# from the cursor instead of skipping N * limit documents.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(doc: Dict[str, Any], sort_field: str) -> str:
+    value = doc.get(sort_field)
+    if isinstance(value, datetime):
+        payload = {"t": "dt", "v": value.isoformat(), "id": doc["id"]}
+    else:
+        payload = {"t": "raw", "v": value, "id": doc["id"]}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        value = datetime.fromisoformat(payload["v"]) if payload["t"] == "dt" else payload["v"]
+        return value, payload["id"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_query(query: Dict[str, Any], sort_field: str, cursor: Optional[str]) -> Dict[str, Any]:
+    if not cursor:
+        return query
+    value, last_id = decode_cursor(cursor)
+    after = {"$or": [
+        {sort_field: {"$lt": value}},
+        {sort_field: value, "id": {"$lt": last_id}}
+    ]}
+    return {"$and": [query, after]} if query else after
+
+async def fetch_page(collection, query: Dict[str, Any], sort_field: str, limit: int,
+                     cursor: Optional[str], response: Response, skip: int = 0,
+                     projection: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+    """Fetch one page sorted newest first and set the next-page cursor header."""
+    find = collection.find(keyset_query(query, sort_field, cursor), projection).sort([(sort_field, -1), ("id", -1)])
+    if skip and not cursor:
+        find = find.skip(skip)
+    docs = await find.limit(limit + 1).to_list(limit + 1)
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(docs[-1], sort_field)
+    return docs
+
+# CONDITIONAL REQUESTS
+# Detail ETags are "<version>-<digest>" of the fields a write can change without
+# bumping the version (counters, ratings, stock). List and analytics ETags hash a
+# per-collection change token with the request parameters. Every write path bumps
+# the token of the collections it touched after writing, and readers read it before
+# the data, so an ETag can only be older than the body it was sent with, never newer.
+# Revalidations that still match answer 304 before any list query or serialization.
+VERSE_ETAG_FIELDS = ["version", "updated_at", "plays_count", "likes_count"]
+PRODUCT_ETAG_FIELDS = ["version", "updated_at", "rating_sum", "review_count", "sold_count", "stock_quantity"]
+
+def document_etag(doc: Dict[str, Any], fields: List[str]) -> str:
+    digest = hashlib.blake2b(repr([doc.get(field) for field in fields]).encode(), digest_size=8).hexdigest()
+    return f'"{doc.get("version", 1)}-{digest}"'
+
+def list_etag(tokens: Dict[str, tuple], key: tuple) -> str:
+    return '"' + hashlib.blake2b(repr((sorted(tokens.items()), key)).encode(), digest_size=12).hexdigest() + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+async def bump_change_tokens(*collections: str):
+    # The epoch is set once per token document, so a dropped and recreated token never reuses old ETags
+    await db.change_tokens.bulk_write([
+        UpdateOne({"_id": name}, {"$inc": {"token": 1}, "$setOnInsert": {"epoch": uuid.uuid4().hex}}, upsert=True)
+        for name in collections
+    ], ordered=False)
+
+async def read_change_tokens(*collections: str) -> Dict[str, tuple]:
+    docs = await db.change_tokens.find({"_id": {"$in": list(collections)}}).to_list(None)
+    tokens = {doc["_id"]: (doc.get("epoch"), doc["token"]) for doc in docs}
+    return {name: tokens.get(name, (None, 0)) for name in collections}
+
+# CATALOGUE CACHE
+# Read-through TTL + LRU cache for product and beat reads, which change a few times
+# a day but are read on every storefront view. Entries are keyed by namespace plus
+# the normalized query parameters (lists) or document id (details) and invalidated
+# by the writes that touch them. With CATALOGUE_CACHE_CHANGE_STREAM=1 each worker
+# also tails a change stream (replica set only) so writes made by other uvicorn
+# workers invalidate it too; otherwise they are bounded by the TTL. Play/download
+# counter flushes deliberately do not invalidate, so those counts lag by up to the TTL.
+CATALOGUE_CACHE_TTL = float(os.environ.get("CATALOGUE_CACHE_TTL", "60"))
+CATALOGUE_CACHE_MAX_BYTES = int(os.environ.get("CATALOGUE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CATALOGUE_CACHE_CHANGE_STREAM = os.environ.get("CATALOGUE_CACHE_CHANGE_STREAM", "").lower() in ("1", "true", "yes")
+
+class CatalogueCache:
+    def __init__(self, ttl: float, max_bytes: int):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        # Bumped by every invalidation of a namespace; a read that started before one is not cached
+        self._generations: Dict[str, int] = {}
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+    
+    def get(self, key: tuple):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        expires_at, value, _ = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return value
+    
+    def generation(self, namespace: str) -> int:
+        return self._generations.get(namespace, 0)
+    
+    def set(self, key: tuple, value, size: int, generation: Optional[int] = None):
+        if size > self.max_bytes or (generation is not None and generation != self.generation(key[0])):
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+    
+    def invalidate(self, namespace: str, doc_id: Optional[str] = None):
+        # Drop every entry of a namespace, or only the one for doc_id
+        self._generations[namespace] = self.generation(namespace) + 1
+        stale = [key for key in self._entries if key[0] == namespace and (doc_id is None or key[1] == doc_id)]
+        for key in stale:
+            self._remove(key)
+        self.stats["invalidations"] += len(stale)
+    
+    def _remove(self, key: tuple):
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+    
+    def info(self) -> Dict[str, Any]:
+        return {**self.stats, "entries": len(self._entries), "bytes": self.bytes, "max_bytes": self.max_bytes, "ttl": self.ttl}
+
+catalogue_cache = CatalogueCache(CATALOGUE_CACHE_TTL, CATALOGUE_CACHE_MAX_BYTES)
+
+def cache_key(namespace: str, **params) -> tuple:
+    normalized = []
+    for name, value in sorted(params.items()):
+        if value is None:
+            continue
+        if name == "tags":
+            value = tuple(sorted(tag.strip() for tag in value.split(",")))
+        normalized.append((name, _enum_value(value)))
+    return (namespace, tuple(normalized))
+
+def _approximate_size(docs) -> int:
+    return len(json.dumps(docs, default=str))
+
+# TRUSTED SERIALIZATION
+# Documents were validated by their model on the way into Mongo, so list pages skip
+# the second validation pass: the query projects only the model's fields (no _id),
+# rows are built the way model_construct would (defaults only fill fields added
+# after the document was written) and the page is encoded once with orjson.
+# Rows are only ever encoded, so defaults are shared rather than copied per row.
+@lru_cache(maxsize=None)
+def model_projection(model, fields: Optional[tuple] = None) -> Dict[str, int]:
+    return {"_id": 0, **{name: 1 for name in fields or model.model_fields}}
+
+@lru_cache(maxsize=None)
+def _row_defaults(model, fields: Optional[tuple] = None) -> tuple:
+    names = [name for name in fields or model.model_fields if name in model.model_fields]
+    defaults = {}
+    factories = {}
+    for name in names:
+        field = model.model_fields[name]
+        if field.default_factory is not None:
+            factories[name] = field.default_factory
+        elif not field.is_required():
+            defaults[name] = field.default
+    return names, defaults, factories
+
+def trusted_rows(docs: List[Dict[str, Any]], model, fields: Optional[tuple] = None) -> List[Dict[str, Any]]:
+    names, defaults, factories = _row_defaults(model, fields)
+    rows = []
+    for doc in docs:
+        row = {name: doc[name] for name in names if name in doc}
+        if len(row) < len(names):
+            # Keep the model's field order, as model_construct does
+            row = {
+                name: doc[name] if name in doc else defaults[name] if name in defaults else factories[name]()
+                for name in names if name in doc or name in defaults or name in factories
+            }
+        rows.append(row)
+    return rows
+
+def encode_rows(content: Any) -> bytes:
+    # orjson writes naive datetimes and str enums exactly as the response_model would
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+# SPARSE FIELDSETS
+# List endpoints take fields=: "summary" (the default, what list views render),
+# "full", or a comma-separated list of field names that may include "summary".
+# The selection becomes the Mongo projection, so unrequested fields (lyrics, notes,
+# descriptions, order lines) are never read into the response. id and the sort
+# field are always included because the next-page cursor is built from them.
+LIST_SUMMARY_FIELDS = {
+    Verse: ["id", "title", "category", "tags", "priority", "beat_name", "word_count", "line_count",
+            "version", "is_complete", "is_recorded", "is_published", "plays_count", "likes_count",
+            "created_at", "updated_at"],
+    Beat: ["id", "name", "producer", "bpm", "key", "genre", "mood", "duration", "tags", "price",
+           "is_free", "download_count", "rating", "file_url", "created_at"],
+    Product: ["id", "name", "price", "category", "product_type", "image_url", "stock_quantity",
+              "sold_count", "rating", "review_count", "tags", "is_active", "is_featured",
+              "discount_percentage", "version", "created_at"],
+    Order: ["id", "order_number", "customer_name", "customer_email", "final_amount", "status",
+            "created_at", "updated_at"]
+}
+
+def list_fields(model, fields: str, sort_field: str) -> Optional[tuple]:
+    """Resolve a fields= parameter to the selected field names in model order; None means every field."""
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    if not requested or "full" in requested:
+        return None
+    if "summary" in requested:
+        requested.remove("summary")
+        requested.update(LIST_SUMMARY_FIELDS[model])
+    unknown = requested - set(model.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    requested.update(("id", sort_field))
+    return tuple(name for name in model.model_fields if name in requested)
+
+async def conditional_page(key: tuple, collection, query: Dict[str, Any], sort_field: str, limit: int,
+                           cursor: Optional[str], response: Response, model, if_none_match: Optional[str],
+                           skip: int = 0, cache: bool = False, fields: Optional[tuple] = None):
+    """Serve one page with an ETag, from the catalogue cache when cache=True; 304 if the client's copy is current."""
+    cached = catalogue_cache.get(key) if cache else None
+    if cached is None:
+        generation = catalogue_cache.generation(key[0])
+        etag = list_etag(await read_change_tokens(collection.name), key)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        docs = await fetch_page(
+            collection, query, sort_field, limit, cursor, response, skip=skip,
+            projection=model_projection(model, fields)
+        )
+        # The encoded page is what gets cached, so cache hits skip serialization as well
+        cached = (encode_rows(trusted_rows(docs, model, fields)), response.headers.get(NEXT_CURSOR_HEADER), etag)
+        if cache:
+            catalogue_cache.set(key, cached, len(cached[0]), generation)
+    body, next_cursor, etag = cached
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    headers = {"ETag": etag}
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def invalidate_products(product_ids: Optional[List[str]] = None):
+    catalogue_cache.invalidate("products:list")
+    if product_ids is None:
+        catalogue_cache.invalidate("products:item")
+    for product_id in product_ids or []:
+        catalogue_cache.invalidate("products:item", product_id)
+
+def invalidate_beats():
+    catalogue_cache.invalidate("beats:list")
+
+async def watch_catalogue_changes():
+    # Invalidate on writes made by any worker; needs a replica set. Lists are invalidated again
+    # when the writer bumps the change token, so no list is cached under the token from before the write.
+    pipeline = [{"$match": {"ns.coll": {"$in": ["products", "beats", "change_tokens"]}}}]
+    try:
+        async with db.watch(pipeline, full_document="updateLookup") as stream:
+            async for change in stream:
+                full_document = change.get("fullDocument") or {}
+                if change["ns"]["coll"] == "change_tokens":
+                    token = change.get("documentKey", {}).get("_id")
+                    if token == "products":
+                        catalogue_cache.invalidate("products:list")
+                    elif token == "beats":
+                        invalidate_beats()
+                elif change["ns"]["coll"] == "products":
+                    invalidate_products([full_document["id"]] if "id" in full_document else None)
+                else:
+                    invalidate_beats()
+    except PyMongoError as e:
+        logger.warning("Catalogue cache change stream stopped, relying on TTL: %s", e)
+
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    return catalogue_cache.info()
+
+# BATCH READS
+# Fetch-by-ids for clients that would otherwise issue one GET per id: a single $in
+# query, rows returned in request order (each id once) and unknown ids listed.
+BATCH_GET_LIMIT = 1000
+
+async def batch_get(collection, model, ids: List[str], fields: str) -> Response:
+    if len(ids) > BATCH_GET_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_GET_LIMIT} ids per request")
+    ids = list(dict.fromkeys(ids))
+    selected = list_fields(model, fields, "id")
+    docs = await collection.find({"id": {"$in": ids}}, model_projection(model, selected)).to_list(None)
+    by_id = {row["id"]: row for row in trusted_rows(docs, model, selected)}
+    return Response(content=encode_rows({
+        "items": [by_id[doc_id] for doc_id in ids if doc_id in by_id],
+        "missing": [doc_id for doc_id in ids if doc_id not in by_id]
+    }), media_type="application/json")
+
+# ANALYTICS ROLLUPS
+# Per-day and per-month counters in `analytics_rollups`, keyed "day:YYYY-MM-DD" / "month:YYYY-MM".
+# Writes apply signed $inc deltas to the buckets of the document's created_at, so the
+# analytics endpoints read O(months) rollup documents instead of scanning collections.
+# A "meta" document marks that the rollups were built from scratch (see rebuild_rollups).
+REVENUE_STATUSES = [OrderStatus.PAID.value, OrderStatus.SHIPPED.value, OrderStatus.DELIVERED.value]
+ROLLUPS_META_ID = "meta"
+VERSE_ROLLUP_FIELDS = {
+    "_id": 0, "id": 1, "created_at": 1, "category": 1, "is_complete": 1,
+    "is_recorded": 1, "is_published": 1, "word_count": 1, "line_count": 1
+}
+ORDER_ROLLUP_FIELDS = {"_id": 0, "created_at": 1, "status": 1, "final_amount": 1}
+_rollups_ready = False
+
+def _enum_value(value):
+    return value.value if isinstance(value, Enum) else value
+
+def _rollup_buckets(when: datetime) -> List[tuple]:
+    day_start = when.replace(hour=0, minute=0, second=0, microsecond=0)
+    month_start = day_start.replace(day=1)
+    return [
+        (f"day:{day_start.strftime('%Y-%m-%d')}", "day", day_start),
+        (f"month:{month_start.strftime('%Y-%m')}", "month", month_start)
+    ]
+
+def _verse_rollup_delta(verse: Dict[str, Any], sign: int = 1) -> Dict[str, float]:
+    return {
+        "verses.total": sign,
+        f"verses.by_category.{_enum_value(verse['category'])}": sign,
+        "verses.completed": sign * int(bool(verse.get("is_complete"))),
+        "verses.recorded": sign * int(bool(verse.get("is_recorded"))),
+        "verses.published": sign * int(bool(verse.get("is_published"))),
+        "verses.word_count": sign * verse.get("word_count", 0),
+        "verses.line_count": sign * verse.get("line_count", 0)
+    }
+
+def _product_rollup_delta(product: Dict[str, Any], sign: int = 1) -> Dict[str, float]:
+    # Only active products are counted, matching the dashboard
+    if not product.get("is_active", True):
+        return {}
+    return {
+        "products.active": sign,
+        f"products.by_category.{_enum_value(product['category'])}": sign
+    }
+
+def _order_rollup_delta(order: Dict[str, Any], sign: int = 1) -> Dict[str, float]:
+    status = _enum_value(order["status"])
+    delta = {"orders.total": sign, f"orders.by_status.{status}": sign}
+    if status in REVENUE_STATUSES:
+        delta["orders.revenue"] = sign * order.get("final_amount", 0)
+        delta["orders.revenue_orders"] = sign
+    return delta
+
+def _merge_deltas(*deltas: Dict[str, float]) -> Dict[str, float]:
+    merged: Dict[str, float] = {}
+    for delta in deltas:
+        for field, value in delta.items():
+            merged[field] = merged.get(field, 0) + value
+    return {field: value for field, value in merged.items() if value}
+
+async def apply_rollup_deltas(changes: List[tuple]):
+    """Apply (created_at, delta) pairs to the day and month rollups in one bulk write."""
+    per_bucket: Dict[str, Dict[str, Any]] = {}
+    for when, delta in changes:
+        for bucket_id, period, start in _rollup_buckets(when):
+            bucket = per_bucket.setdefault(bucket_id, {"period": period, "start": start, "inc": {}})
+            bucket["inc"] = _merge_deltas(bucket["inc"], delta)
+    
+    operations = [
+        UpdateOne(
+            {"_id": bucket_id},
+            {"$inc": bucket["inc"], "$setOnInsert": {"period": bucket["period"], "start": bucket["start"]}},
+            upsert=True
+        )
+        for bucket_id, bucket in per_bucket.items() if bucket["inc"]
+    ]
+    if operations:
+        await db.analytics_rollups.bulk_write(operations, ordered=False)
+
+async def apply_rollup_delta(when: datetime, delta: Dict[str, float]):
+    await apply_rollup_deltas([(when, delta)])
+
+async def rollups_ready() -> bool:
+    global _rollups_ready
+    if not _rollups_ready:
+        _rollups_ready = await db.analytics_rollups.find_one({"_id": ROLLUPS_META_ID}) is not None
+    return _rollups_ready
+
+def _add_nested(target: Dict[str, Any], source: Dict[str, Any]):
+    for field, value in source.items():
+        if isinstance(value, dict):
+            _add_nested(target.setdefault(field, {}), value)
+        else:
+            target[field] = target.get(field, 0) + value
+
+def sum_rollups(rollups: List[Dict[str, Any]]) -> Dict[str, Any]:
+    totals: Dict[str, Any] = {}
+    for rollup in rollups:
+        _add_nested(totals, {key: rollup.get(key, {}) for key in ("verses", "products", "orders")})
+    return totals
+
+# TAG INDEX
+# `tag_counts` holds one {collection, tag, count} document per tag of verses, beats
+# and products, kept current by $inc deltas from every write path (like the rollups);
+# `python server.py rebuild-tags` recomputes it. A tag counts once per document.
+# Autocomplete is served from a per-collection TagIndex, loaded from tag_counts and
+# reloaded after TAG_INDEX_MAX_AGE so other workers' writes show up; this worker's
+# own writes update it in place.
+TAGGED_COLLECTIONS = ("verses", "beats", "products")
+TAG_INDEX_MAX_AGE = float(os.environ.get("TAG_INDEX_MAX_AGE", "60"))
+_tag_indexes: Dict[str, tuple] = {}
+
+class TagIndex:
+    """Tag counts kept in two orders: by (casefolded tag, tag) for prefix ranges and
+    by descending count for the most used tags.
+
+    top() answers from whichever order is cheaper: scanning the prefix range costs
+    its size, while walking the count order until `limit` tags match costs about
+    limit * total / range size. Both give the same tags in the same order (count
+    descending, then casefolded tag).
+    """
+
+    def __init__(self, counts: Optional[Dict[str, int]] = None):
+        self._by_name = SortedDict()
+        self._by_count = SortedList()
+        for tag, count in (counts or {}).items():
+            self.add(tag, count)
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+    def get(self, tag: str) -> int:
+        return self._by_name.get((tag.casefold(), tag), 0)
+
+    def add(self, tag: str, delta: int):
+        key = (tag.casefold(), tag)
+        count = self._by_name.pop(key, 0)
+        if count:
+            self._by_count.remove((-count, key))
+        count += delta
+        if count > 0:
+            self._by_name[key] = count
+            self._by_count.add((-count, key))
+
+    def top(self, prefix: str, limit: int) -> List[Dict[str, Any]]:
+        folded = prefix.casefold()
+        if not folded:
+            ranked = self._by_count.islice(0, limit)
+        else:
+            start = self._by_name.bisect_left((folded,))
+            stop = self._by_name.bisect_left((folded + "\U0010ffff",))
+            matching = stop - start
+            if not matching:
+                return []
+            if matching <= limit * len(self._by_name) / matching:
+                keys = self._by_name.islice(start, stop)
+                ranked = heapq.nsmallest(limit, ((-self._by_name[key], key) for key in keys))
+            else:
+                ranked = islice((entry for entry in self._by_count if entry[1][0].startswith(folded)), limit)
+        return [{"tag": key[1], "count": -negated} for negated, key in ranked]
+
+def tag_deltas(before: Optional[List[str]], after: Optional[List[str]]) -> Dict[str, int]:
+    delta = Counter(set(after or []))
+    delta.subtract(set(before or []))
+    return dict(delta)
+
+def document_tag_deltas(docs: List[Dict[str, Any]], sign: int = 1) -> Dict[str, int]:
+    delta = Counter()
+    for doc in docs:
+        for tag in set(doc.get("tags") or []):
+            delta[tag] += sign
+    return dict(delta)
+
+async def apply_tag_deltas(collection: str, deltas: Dict[str, int]):
+    deltas = {tag: count for tag, count in deltas.items() if count and tag}
+    if not deltas:
+        return
+    await db.tag_counts.bulk_write([
+        UpdateOne(
+            {"_id": f"{collection}:{tag}"},
+            {"$inc": {"count": count}, "$setOnInsert": {"collection": collection, "tag": tag}},
+            upsert=True
+        )
+        for tag, count in deltas.items()
+    ], ordered=False)
+    if any(count < 0 for count in deltas.values()):
+        await db.tag_counts.delete_many({"collection": collection, "count": {"$lte": 0}})
+    
+    cached = _tag_indexes.get(collection)
+    if cached is not None:
+        for tag, count in deltas.items():
+            cached[1].add(tag, count)
+
+async def tag_index(collection: str) -> TagIndex:
+    cached = _tag_indexes.get(collection)
+    if cached is not None and time.monotonic() - cached[0] < TAG_INDEX_MAX_AGE:
+        return cached[1]
+    docs = await db.tag_counts.find({"collection": collection}, {"_id": 0, "tag": 1, "count": 1}).to_list(None)
+    index = TagIndex({doc["tag"]: doc["count"] for doc in docs})
+    _tag_indexes[collection] = (time.monotonic(), index)
+    return index
+
+async def rebuild_tag_counts() -> Dict[str, int]:
+    """Recount every tag from the tagged collections and swap the result in; returns tags per collection."""
+    documents = []
+    summary = {}
+    for name in TAGGED_COLLECTIONS:
+        groups = await db[name].aggregate([
+            {"$project": {"tags": {"$setUnion": [{"$ifNull": ["$tags", []]}, []]}}},
+            {"$unwind": "$tags"},
+            {"$group": {"_id": "$tags", "count": {"$sum": 1}}}
+        ]).to_list(None)
+        documents.extend(
+            {"_id": f"{name}:{group['_id']}", "collection": name, "tag": group["_id"], "count": group["count"]}
+            for group in groups
+        )
+        summary[name] = len(groups)
+    
+    scratch = db["tag_counts_rebuild"]
+    await scratch.drop()
+    if documents:
+        await scratch.insert_many(documents)
+        await scratch.rename("tag_counts", dropTarget=True)
+    else:
+        await db.tag_counts.drop()
+    await db.tag_counts.create_indexes(INDEX_CATALOGUE["tag_counts"])
+    _tag_indexes.clear()
+    return summary
+
+@api_router.get("/tags/{collection}")
+async def autocomplete_tags(collection: str, prefix: str = "", limit: int = Query(20, ge=1, le=200)):
+    # Most used tags starting with prefix (case-insensitive); no prefix gives the most used overall
+    if collection not in TAGGED_COLLECTIONS:
+        raise HTTPException(status_code=404, detail="Unknown collection")
+    return (await tag_index(collection)).top(prefix, limit)
+
+async def faceted_page(collection, model, query: Dict[str, Any], sort_field: str, limit: int,
+                       fields: str, tag_limit: int) -> Response:
+    """First page of a filtered listing with its total and tag counts, from one $facet aggregation."""
+    selected = list_fields(model, fields, sort_field)
+    result = await collection.aggregate([
+        {"$match": query},
+        {"$facet": {
+            "items": [
+                {"$sort": {sort_field: -1, "id": -1}},
+                {"$limit": limit},
+                {"$project": model_projection(model, selected)}
+            ],
+            "total": [{"$count": "count"}],
+            "tags": [
+                {"$project": {"tags": {"$setUnion": [{"$ifNull": ["$tags", []]}, []]}}},
+                {"$unwind": "$tags"},
+                {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}},
+                {"$limit": tag_limit}
+            ]
+        }}
+    ]).to_list(1)
+    facets = result[0]
+    return Response(content=encode_rows({
+        "items": trusted_rows(facets["items"], model, selected),
+        "total": facets["total"][0]["count"] if facets["total"] else 0,
+        "tags": [{"tag": group["_id"], "count": group["count"]} for group in facets["tags"]]
+    }), media_type="application/json")
+
+# VERSE EXPORT
+def verse_filter_query(category: Optional[VerseCategory], search: Optional[str],
+                       priority: Optional[Priority], tags: Optional[str]) -> Dict[str, Any]:
+    query = {}
+    
+    if category:
+        query["category"] = category
+    if priority:
+        query["priority"] = priority
+    if search:
+        query["$text"] = {"$search": search}
+    if tags:
+        tag_list = [tag.strip() for tag in tags.split(",")]
+        query["tags"] = {"$in": tag_list}
+    return query
+
+def verse_export_text(verse: Dict[str, Any]) -> str:
+    content = f"Title: {verse['title']}\n"
+    content += f"Category: {verse['category']}\n"
+    content += f"Beat: {verse.get('beat_name', 'N/A')}\n"
+    content += f"BPM: {verse.get('bpm', 'N/A')}\n"
+    content += f"Key: {verse.get('key', 'N/A')}\n"
+    content += f"Word Count: {verse.get('word_count', 0)}\n"
+    content += f"Line Count: {verse.get('line_count', 0)}\n"
+    content += "\n--- LYRICS ---\n"
+    content += verse['lyrics']
+    content += "\n\n--- NOTES ---\n"
+    content += verse.get('notes') or 'No notes'
+    return content
+
+VERSE_CSV_COLUMNS = [
+    "id", "title", "category", "priority", "tags", "beat_name", "bpm", "key", "mood",
+    "word_count", "line_count", "rhyme_scheme", "is_complete", "is_recorded", "is_published",
+    "created_at", "updated_at", "lyrics", "notes"
+]
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only, unseekable sink; zipfile falls back to streaming mode (data descriptors)
+    def __init__(self):
+        self.chunks: List[bytes] = []
+    
+    def writable(self) -> bool:
+        return True
+    
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+    
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+async def _export_ndjson(verses):
+    async for verse in verses:
+        yield Verse(**verse).model_dump_json() + "\n"
+
+async def _export_csv(verses):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(VERSE_CSV_COLUMNS)
+    async for verse in verses:
+        row = {**Verse(**verse).dict(), "tags": ";".join(verse.get("tags", []))}
+        writer.writerow([_enum_value(row.get(column)) for column in VERSE_CSV_COLUMNS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+async def _export_zip(verses):
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        async for verse in verses:
+            title = re.sub(r"[^\w\- ]", "", verse["title"]).strip() or "verse"
+            archive.writestr(f"{title}-{verse['id'][:8]}.txt", verse_export_text(verse))
+            yield sink.drain()
+    yield sink.drain()
+
+# format -> (media type, file extension, async chunk generator over a verse cursor)
+VERSE_EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson", _export_ndjson),
+    "csv": ("text/csv", "csv", _export_csv),
+    "zip": ("application/zip", "zip", _export_zip)
+}
 
 # VERSE ENDPOINTS
 @api_router.post("/verses", response_model=Verse)
@@ -283,55 +1180,130 @@ async def create_verse(verse: VerseCreate):
     verse_dict["rhyme_scheme"] = analyze_rhyme_scheme(verse.lyrics)
     
     verse_obj = Verse(**verse_dict)
-    result = await db.verses.insert_one(verse_obj.dict())
+    verse_doc = verse_obj.dict()
+    result = await db.verses.insert_one(verse_doc)
+    await asyncio.gather(
+        apply_rollup_delta(verse_obj.created_at, _verse_rollup_delta(verse_doc)),
+        apply_tag_deltas("verses", document_tag_deltas([verse_doc])),
+        record_revision(verse_doc),
+        bump_change_tokens("verses")
+    )
     return verse_obj
 
-@api_router.get("/verses", response_model=List[Verse])
+@api_router.get("/verses")
 async def get_verses(
+    response: Response,
     category: Optional[VerseCategory] = None,
     search: Optional[str] = None,
     priority: Optional[Priority] = None,
     tags: Optional[str] = None,
-    limit: int = Query(100, le=1000),
-    skip: int = Query(0, ge=0)
+    limit: int = Query(100, ge=1, le=1000),
+    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    fields: str = "summary",
+    if_none_match: Optional[str] = Header(None)
 ):
-    query = {}
+    query = verse_filter_query(category, search, priority, tags)
+    selected = list_fields(Verse, fields, "updated_at")
+    key = cache_key(
+        "verses:list", category=category, search=search, priority=priority, tags=tags,
+        limit=limit, skip=skip, cursor=cursor, fields=selected
+    )
+    return await conditional_page(
+        key, db.verses, query, "updated_at", limit, cursor, response, Verse, if_none_match,
+        skip=skip, fields=selected
+    )
+
+@api_router.get("/verses/facets")
+async def get_verse_facets(
+    category: Optional[VerseCategory] = None,
+    search: Optional[str] = None,
+    priority: Optional[Priority] = None,
+    tags: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    fields: str = "summary",
+    tag_limit: int = Query(50, ge=1, le=500)
+):
+    query = verse_filter_query(category, search, priority, tags)
+    return await faceted_page(db.verses, Verse, query, "updated_at", limit, fields, tag_limit)
+
+@api_router.get("/verses/export")
+async def export_verses(
+    format: str = "ndjson",
+    category: Optional[VerseCategory] = None,
+    search: Optional[str] = None,
+    priority: Optional[Priority] = None,
+    tags: Optional[str] = None
+):
+    # Stream the filtered library from a batched cursor. NDJSON and CSV memory stays flat regardless of
+    # size; ZIP also keeps each entry's central-directory record (about 1 KB) until the archive closes.
+    if format not in VERSE_EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported format")
+    verses = db.verses.find(
+        verse_filter_query(category, search, priority, tags), {"_id": 0}
+    ).sort(VERSE_LIST_ORDER).batch_size(500)
     
+    media_type, extension, writer = VERSE_EXPORT_FORMATS[format]
+    filename = f"verses-{datetime.utcnow().strftime('%Y%m%d')}.{extension}"
+    return StreamingResponse(
+        writer(verses),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@api_router.get("/verses/search", response_model=List[VerseSearchHit])
+async def search_verses(
+    q: str = Query(..., min_length=1),
+    category: Optional[VerseCategory] = None,
+    limit: int = Query(20, ge=1, le=100)
+):
+    # Relevance-ranked lyric search served by the verses text index
+    query = {"$text": {"$search": q}}
     if category:
         query["category"] = category
-    if priority:
-        query["priority"] = priority
-    if search:
-        query["$or"] = [
-            {"title": {"$regex": search, "$options": "i"}},
-            {"lyrics": {"$regex": search, "$options": "i"}},
-            {"tags": {"$in": [search]}},
-            {"beat_name": {"$regex": search, "$options": "i"}}
-        ]
-    if tags:
-        tag_list = [tag.strip() for tag in tags.split(",")]
-        query["tags"] = {"$in": tag_list}
     
-    verses = await db.verses.find(query).sort("updated_at", -1).skip(skip).limit(limit).to_list(limit)
-    return [Verse(**verse) for verse in verses]
+    verses = await db.verses.find(
+        query,
+        {"_id": 0, "score": {"$meta": "textScore"}, **{field: 1 for field in VERSE_SEARCH_FIELDS}}
+    ).sort([("score", {"$meta": "textScore"})]).limit(limit).to_list(limit)
+    
+    pattern = search_terms_pattern(q)
+    hits = []
+    for verse in verses:
+        snippet, highlights = lyric_snippet(verse["lyrics"], pattern)
+        hits.append(VerseSearchHit(
+            **{field: verse.get(field) for field in VERSE_SEARCH_FIELDS if field != "lyrics"},
+            score=verse["score"],
+            snippet=snippet,
+            highlights=highlights
+        ))
+    return hits
 
 @api_router.get("/verses/{verse_id}", response_model=Verse)
-async def get_verse(verse_id: str):
+async def get_verse(verse_id: str, response: Response, if_none_match: Optional[str] = Header(None)):
+    if if_none_match:
+        # Revalidation reads only the ETag fields, not the lyrics
+        current = await db.verses.find_one({"id": verse_id}, {"_id": 0, **{field: 1 for field in VERSE_ETAG_FIELDS}})
+        if current is not None:
+            etag = document_etag(current, VERSE_ETAG_FIELDS)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
     verse = await db.verses.find_one({"id": verse_id})
     if not verse:
         raise HTTPException(status_code=404, detail="Verse not found")
+    response.headers["ETag"] = document_etag(verse, VERSE_ETAG_FIELDS)
     return Verse(**verse)
 
 @api_router.put("/verses/{verse_id}", response_model=Verse)
-async def update_verse(verse_id: str, verse_update: VerseUpdate):
-    verse = await db.verses.find_one({"id": verse_id})
-    if not verse:
-        raise HTTPException(status_code=404, detail="Verse not found")
-    
+async def update_verse(
+    verse_id: str,
+    verse_update: VerseUpdate,
+    if_match: Optional[str] = Header(None),
+    expected_version: Optional[int] = None
+):
     update_data = verse_update.dict(exclude_unset=True)
     update_data["updated_at"] = datetime.utcnow()
     update_data["last_edited_at"] = datetime.utcnow()
-    update_data["version"] = verse.get("version", 1) + 1
     
     # Recalculate metrics if lyrics changed
     if "lyrics" in update_data:
@@ -339,23 +1311,49 @@ async def update_verse(verse_id: str, verse_update: VerseUpdate):
         update_data["line_count"] = calculate_line_count(update_data["lyrics"])
         update_data["rhyme_scheme"] = analyze_rhyme_scheme(update_data["lyrics"])
     
-    await db.verses.update_one({"id": verse_id}, {"$set": update_data})
-    
-    updated_verse = await db.verses.find_one({"id": verse_id})
+    verse, updated_verse = await versioned_update(
+        db.verses, verse_id, update_data, required_version(if_match, expected_version), "Verse not found"
+    )
+    await asyncio.gather(
+        apply_rollup_delta(verse["created_at"], _merge_deltas(
+            _verse_rollup_delta(verse, -1), _verse_rollup_delta(updated_verse)
+        )),
+        apply_tag_deltas("verses", tag_deltas(verse.get("tags"), updated_verse.get("tags"))),
+        record_revision(updated_verse, verse),
+        bump_change_tokens("verses")
+    )
     return Verse(**updated_verse)
 
 @api_router.delete("/verses/{verse_id}")
 async def delete_verse(verse_id: str):
-    result = await db.verses.delete_one({"id": verse_id})
-    if result.deleted_count == 0:
+    verse = await db.verses.find_one_and_delete({"id": verse_id}, projection={**VERSE_ROLLUP_FIELDS, "tags": 1})
+    if not verse:
         raise HTTPException(status_code=404, detail="Verse not found")
+    await asyncio.gather(
+        apply_rollup_delta(verse["created_at"], _verse_rollup_delta(verse, -1)),
+        apply_tag_deltas("verses", document_tag_deltas([verse], -1)),
+        db.verse_revisions.delete_many({"verse_id": verse_id}),
+        bump_change_tokens("verses")
+    )
     return {"message": "Verse deleted successfully"}
 
 @api_router.post("/verses/bulk-delete")
 async def bulk_delete_verses(verse_ids: List[str]):
-    result = await db.verses.delete_many({"id": {"$in": verse_ids}})
+    verses = await db.verses.find({"id": {"$in": verse_ids}}, {**VERSE_ROLLUP_FIELDS, "tags": 1}).to_list(None)
+    deleted_ids = [verse["id"] for verse in verses]
+    result = await db.verses.delete_many({"id": {"$in": deleted_ids}})
+    await asyncio.gather(
+        apply_rollup_deltas([(verse["created_at"], _verse_rollup_delta(verse, -1)) for verse in verses]),
+        apply_tag_deltas("verses", document_tag_deltas(verses, -1)),
+        db.verse_revisions.delete_many({"verse_id": {"$in": deleted_ids}}),
+        bump_change_tokens("verses")
+    )
     return {"message": f"Deleted {result.deleted_count} verses"}
 
+@api_router.post("/verses/batch-get")
+async def batch_get_verses(verse_ids: List[str], fields: str = "full"):
+    return await batch_get(db.verses, Verse, verse_ids, fields)
+
 @api_router.get("/verses/{verse_id}/export")
 async def export_verse(verse_id: str, format: str = "txt"):
     verse = await db.verses.find_one({"id": verse_id})
@@ -363,38 +1361,164 @@ async def export_verse(verse_id: str, format: str = "txt"):
         raise HTTPException(status_code=404, detail="Verse not found")
     
     if format == "txt":
-        content = f"Title: {verse['title']}\n"
-        content += f"Category: {verse['category']}\n"
-        content += f"Beat: {verse.get('beat_name', 'N/A')}\n"
-        content += f"BPM: {verse.get('bpm', 'N/A')}\n"
-        content += f"Key: {verse.get('key', 'N/A')}\n"
-        content += f"Word Count: {verse.get('word_count', 0)}\n"
-        content += f"Line Count: {verse.get('line_count', 0)}\n"
-        content += "\n--- LYRICS ---\n"
-        content += verse['lyrics']
-        content += "\n\n--- NOTES ---\n"
-        content += verse.get('notes', 'No notes')
-        
-        return {"content": content, "filename": f"{verse['title']}.txt"}
+        return {"content": verse_export_text(verse), "filename": f"{verse['title']}.txt"}
     
     return {"error": "Unsupported format"}
 
+@api_router.get("/verses/{verse_id}/rhymes", response_model=RhymeAnalysis)
+async def get_verse_rhymes(verse_id: str):
+    verse = await db.verses.find_one({"id": verse_id}, {"_id": 0, "lyrics": 1})
+    if not verse:
+        raise HTTPException(status_code=404, detail="Verse not found")
+    return analyze_rhymes(verse["lyrics"])
+
+@api_router.post("/rhymes/analyze", response_model=RhymeAnalysis)
+async def analyze_lyrics_rhymes(request: RhymeAnalysisRequest):
+    return analyze_rhymes(request.lyrics)
+
+# VERSE REVISIONS
+# Every verse version gets a `verse_revisions` entry. Most store only a line-level
+# delta against the previous version; every REVISION_SNAPSHOT_INTERVAL-th stores
+# the full lyrics, so rebuilding any version applies at most that many deltas.
+REVISION_SNAPSHOT_INTERVAL = 50
+
+def _revision_delta(old_lines: List[str], new_lines: List[str]) -> List[Dict[str, Any]]:
+    # {"c": [i, j]} copies old_lines[i:j]; {"i": [...]} inserts new lines
+    ops = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, old_lines, new_lines, autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops.append({"c": [i1, i2]})
+        elif tag in ("replace", "insert"):
+            ops.append({"i": new_lines[j1:j2]})
+    return ops
+
+def _apply_revision_delta(old_lines: List[str], ops: List[Dict[str, Any]]) -> List[str]:
+    lines = []
+    for op in ops:
+        if "c" in op:
+            lines.extend(old_lines[op["c"][0]:op["c"][1]])
+        else:
+            lines.extend(op["i"])
+    return lines
+
+def _revision_fields(verse: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    version = verse.get("version", 1)
+    fields = {"title": verse["title"], "created_at": verse.get("updated_at", datetime.utcnow())}
+    if previous is None or (version - 1) % REVISION_SNAPSHOT_INTERVAL == 0:
+        fields.update({"kind": "snapshot", "lyrics": verse["lyrics"]})
+    else:
+        fields.update({
+            "kind": "delta",
+            "ops": _revision_delta(previous["lyrics"].split("\n"), verse["lyrics"].split("\n"))
+        })
+    return fields
+
+async def record_revision(verse: Dict[str, Any], previous: Optional[Dict[str, Any]] = None):
+    # The previous version is upserted as a snapshot if it was never recorded (verses
+    # created before revisions existed, or imported), keeping every chain rebuildable
+    operations = []
+    if previous is not None:
+        operations.append(UpdateOne(
+            {"verse_id": verse["id"], "version": previous.get("version", 1)},
+            {"$setOnInsert": _revision_fields(previous)},
+            upsert=True
+        ))
+    operations.append(UpdateOne(
+        {"verse_id": verse["id"], "version": verse.get("version", 1)},
+        {"$setOnInsert": _revision_fields(verse, previous)},
+        upsert=True
+    ))
+    await db.verse_revisions.bulk_write(operations)
+
+async def reconstruct_revision(verse_id: str, version: int) -> Dict[str, Any]:
+    snapshot = await db.verse_revisions.find_one(
+        {"verse_id": verse_id, "kind": "snapshot", "version": {"$lte": version}},
+        sort=[("version", -1)]
+    )
+    if not snapshot:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    revisions = await db.verse_revisions.find(
+        {"verse_id": verse_id, "version": {"$gt": snapshot["version"], "$lte": version}}
+    ).sort("version", 1).to_list(None)
+    if [r["version"] for r in revisions] != list(range(snapshot["version"] + 1, version + 1)):
+        raise HTTPException(status_code=404, detail="Revision not found")
+    
+    lines = snapshot["lyrics"].split("\n")
+    current = snapshot
+    for revision in revisions:
+        lines = revision["lyrics"].split("\n") if revision["kind"] == "snapshot" else _apply_revision_delta(lines, revision["ops"])
+        current = revision
+    return {
+        "version": version,
+        "title": current["title"],
+        "lyrics": "\n".join(lines),
+        "created_at": current["created_at"]
+    }
+
+@api_router.get("/verses/{verse_id}/revisions", response_model=List[VerseRevision])
+async def get_verse_revisions(verse_id: str, before: Optional[int] = None, limit: int = Query(100, ge=1, le=1000)):
+    query = {"verse_id": verse_id}
+    if before is not None:
+        query["version"] = {"$lt": before}
+    revisions = await db.verse_revisions.find(
+        query, {"_id": 0, "version": 1, "title": 1, "kind": 1, "created_at": 1}
+    ).sort("version", -1).limit(limit).to_list(limit)
+    return [VerseRevision(**revision) for revision in revisions]
+
+@api_router.get("/verses/{verse_id}/revisions/diff")
+async def diff_verse_revisions(verse_id: str, from_version: int, to_version: int):
+    old, new = await asyncio.gather(
+        reconstruct_revision(verse_id, from_version),
+        reconstruct_revision(verse_id, to_version)
+    )
+    diff = unified_diff(
+        old["lyrics"].split("\n"), new["lyrics"].split("\n"),
+        fromfile=f"v{from_version}", tofile=f"v{to_version}", lineterm=""
+    )
+    return {"from_version": from_version, "to_version": to_version, "diff": list(diff)}
+
+@api_router.get("/verses/{verse_id}/revisions/{version}", response_model=VerseRevisionContent)
+async def get_verse_revision(verse_id: str, version: int):
+    return VerseRevisionContent(**await reconstruct_revision(verse_id, version))
+
+@api_router.post("/verses/{verse_id}/revisions/{version}/restore", response_model=Verse)
+async def restore_verse_revision(verse_id: str, version: int):
+    # Restoring writes the old take as a new version; history is never rewritten
+    revision = await reconstruct_revision(verse_id, version)
+    return await update_verse(
+        verse_id,
+        VerseUpdate(title=revision["title"], lyrics=revision["lyrics"]),
+        if_match=None,
+        expected_version=None
+    )
+
 # BEAT ENDPOINTS
 @api_router.post("/beats", response_model=Beat)
 async def create_beat(beat: BeatCreate):
     beat_dict = beat.dict()
     beat_obj = Beat(**beat_dict)
-    result = await db.beats.insert_one(beat_obj.dict())
+    beat_doc = beat_obj.dict()
+    result = await db.beats.insert_one(beat_doc)
+    index_beats([beat_doc])
+    await asyncio.gather(
+        apply_tag_deltas("beats", document_tag_deltas([beat_doc])),
+        bump_change_tokens("beats")
+    )
+    invalidate_beats()
     return beat_obj
 
-@api_router.get("/beats", response_model=List[Beat])
+@api_router.get("/beats")
 async def get_beats(
+    response: Response,
     genre: Optional[str] = None,
     mood: Optional[str] = None,
     bpm_min: Optional[int] = None,
     bpm_max: Optional[int] = None,
     is_free: Optional[bool] = None,
-    limit: int = Query(100, le=1000)
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: str = "summary",
+    if_none_match: Optional[str] = Header(None)
 ):
     query = {}
     
@@ -412,28 +1536,483 @@ async def get_beats(
             bpm_query["$lte"] = bpm_max
         query["bpm"] = bpm_query
     
-    beats = await db.beats.find(query).sort("created_at", -1).limit(limit).to_list(limit)
-    return [Beat(**beat) for beat in beats]
+    selected = list_fields(Beat, fields, "created_at")
+    key = cache_key(
+        "beats:list", genre=genre, mood=mood, bpm_min=bpm_min, bpm_max=bpm_max,
+        is_free=is_free, limit=limit, cursor=cursor, fields=selected
+    )
+    return await conditional_page(
+        key, db.beats, query, "created_at", limit, cursor, response, Beat, if_none_match,
+        cache=True, fields=selected
+    )
+
+# BEAT FILE STORAGE
+# Beat audio is stored on local disk, content-addressed by sha256 so the same file
+# uploaded for several beats is kept once. Uploads are resumable: create a session
+# with the total size, PUT raw chunks at ?offset= (sequentially; GET the session to
+# find where to resume), then complete it, optionally with the file's sha256. Each
+# PUT streams its body into its own chunk file, never buffered whole, then claims
+# the session at its offset and appends the chunk to the upload's .part file, so a
+# retried PUT racing the original can never interleave bytes with it. Downloads
+# honour single byte ranges so the player can seek.
+BEAT_STORAGE_DIR = Path(os.environ.get("BEAT_STORAGE_DIR", str(ROOT_DIR / "storage" / "beats")))
+BEAT_UPLOAD_MAX_BYTES = int(os.environ.get("BEAT_UPLOAD_MAX_BYTES", str(500 * 1024 * 1024)))
+BEAT_UPLOAD_TTL = int(os.environ.get("BEAT_UPLOAD_TTL", str(24 * 3600)))
+BEAT_FILE_CHUNK = 256 * 1024
+# How long a PUT may hold its claim on a session while appending its chunk
+BEAT_UPLOAD_WRITE_LEASE = 300
+
+def _upload_part_path(upload_id: str) -> Path:
+    return BEAT_STORAGE_DIR / "uploads" / f"{upload_id}.part"
+
+def _upload_chunk_path(upload_id: str, writer: str) -> Path:
+    return BEAT_STORAGE_DIR / "uploads" / f"{upload_id}.{writer}.chunk"
+
+def beat_file_path(digest: str) -> Path:
+    return BEAT_STORAGE_DIR / digest[:2] / digest
+
+def _open_part(path: Path, offset: int):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    part = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT), "r+b")
+    if os.fstat(part.fileno()).st_size < offset:
+        part.close()
+        raise HTTPException(status_code=409, detail="Upload data is missing, start a new upload")
+    # Drop bytes past the committed offset left by an interrupted chunk
+    part.truncate(offset)
+    part.seek(offset)
+    return part
+
+def _open_chunk(path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return open(path, "wb")
+
+def _append_chunk(part_path: Path, chunk_path: Path, offset: int):
+    with _open_part(part_path, offset) as part, open(chunk_path, "rb") as chunk:
+        shutil.copyfileobj(chunk, part, BEAT_FILE_CHUNK)
+
+def _store_part(path: Path, expected_sha256: Optional[str] = None) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as part:
+        for block in iter(lambda: part.read(BEAT_FILE_CHUNK), b""):
+            digest.update(block)
+    if expected_sha256 and digest.hexdigest() != expected_sha256.lower():
+        path.unlink()
+        raise ValueError("Uploaded data does not match the sha256 given")
+    target = beat_file_path(digest.hexdigest())
+    if target.exists():
+        path.unlink()
+    else:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(path, target)
+    return digest.hexdigest()
+
+def _remove_stale_parts():
+    # Sessions expire through a TTL index; their abandoned .part and .chunk files are swept here
+    cutoff = time.time() - BEAT_UPLOAD_TTL
+    uploads = BEAT_STORAGE_DIR / "uploads"
+    for part in [*uploads.glob("*.part"), *uploads.glob("*.chunk")]:
+        try:
+            if part.stat().st_mtime < cutoff:
+                part.unlink()
+        except FileNotFoundError:
+            pass
+
+def parse_byte_range(header: str, size: int) -> Optional[tuple]:
+    """Return the inclusive (start, end) of a single-range header, or None to serve the whole file."""
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start, end = int(first), int(last) if last else size - 1
+        else:
+            start, end = size - int(last), size - 1
+    except ValueError:
+        return None
+    start, end = max(start, 0), min(end, size - 1)
+    if start > end:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+def _read_range(path: Path, start: int, end: int):
+    with open(path, "rb") as beat_file:
+        beat_file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            block = beat_file.read(min(BEAT_FILE_CHUNK, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+@api_router.post("/beats/{beat_id}/uploads", response_model=BeatUpload)
+async def create_beat_upload(beat_id: str, upload: BeatUploadCreate):
+    if upload.size > BEAT_UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Beat file too large")
+    if not await db.beats.count_documents({"id": beat_id}, limit=1):
+        raise HTTPException(status_code=404, detail="Beat not found")
+    upload_obj = BeatUpload(beat_id=beat_id, **upload.dict())
+    await db.beat_uploads.insert_one(upload_obj.dict())
+    await asyncio.to_thread(_remove_stale_parts)
+    return upload_obj
+
+@api_router.get("/beats/uploads/{upload_id}", response_model=BeatUpload)
+async def get_beat_upload(upload_id: str):
+    upload = await db.beat_uploads.find_one({"id": upload_id})
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return BeatUpload(**upload)
+
+@api_router.put("/beats/uploads/{upload_id}", response_model=BeatUpload)
+async def upload_beat_chunk(upload_id: str, request: Request, offset: int = Query(..., ge=0)):
+    upload = await db.beat_uploads.find_one({"id": upload_id})
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if offset != upload["offset"]:
+        raise HTTPException(status_code=409, detail=f"Upload is at offset {upload['offset']}")
+    
+    writer = uuid.uuid4().hex
+    chunk_path = _upload_chunk_path(upload_id, writer)
+    try:
+        chunk_file = await asyncio.to_thread(_open_chunk, chunk_path)
+        written = 0
+        try:
+            async for chunk in request.stream():
+                if offset + written + len(chunk) > upload["size"]:
+                    raise HTTPException(status_code=413, detail="Chunk runs past the declared size")
+                await asyncio.to_thread(chunk_file.write, chunk)
+                written += len(chunk)
+        finally:
+            await asyncio.to_thread(chunk_file.close)
+        
+        # Only one request at a time may append at this offset; an expired claim belongs to a crashed writer
+        now = datetime.utcnow()
+        claimed = await db.beat_uploads.find_one_and_update(
+            {"id": upload_id, "offset": offset, "$or": [{"writer": None}, {"writer_expires": {"$lt": now}}]},
+            {"$set": {"writer": writer, "writer_expires": now + timedelta(seconds=BEAT_UPLOAD_WRITE_LEASE)}}
+        )
+        if claimed is None:
+            raise HTTPException(status_code=409, detail="Upload was changed by another request")
+        try:
+            await asyncio.to_thread(_append_chunk, _upload_part_path(upload_id), chunk_path, offset)
+        except BaseException:
+            await db.beat_uploads.update_one({"id": upload_id, "writer": writer}, {"$set": {"writer": None}})
+            raise
+        updated = await db.beat_uploads.find_one_and_update(
+            {"id": upload_id, "writer": writer},
+            {"$set": {"offset": offset + written, "writer": None}},
+            return_document=ReturnDocument.AFTER
+        )
+    finally:
+        await asyncio.to_thread(chunk_path.unlink, missing_ok=True)
+    if updated is None:
+        raise HTTPException(status_code=409, detail="Upload was changed by another request")
+    return BeatUpload(**updated)
+
+@api_router.post("/beats/uploads/{upload_id}/complete", response_model=Beat)
+async def complete_beat_upload(upload_id: str, sha256: Optional[str] = None):
+    upload = await db.beat_uploads.find_one({"id": upload_id})
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if upload["offset"] != upload["size"]:
+        raise HTTPException(status_code=409, detail=f"Upload incomplete: {upload['offset']} of {upload['size']} bytes")
+    try:
+        digest = await asyncio.to_thread(_store_part, _upload_part_path(upload_id), sha256)
+    except FileNotFoundError:
+        raise HTTPException(status_code=409, detail="Upload already completed")
+    except ValueError as e:
+        await db.beat_uploads.delete_one({"id": upload_id})
+        raise HTTPException(status_code=422, detail=f"{e}, start a new upload")
+    
+    beat = await db.beats.find_one_and_update(
+        {"id": upload["beat_id"]},
+        {"$set": {
+            "file_url": f"/api/beats/{upload['beat_id']}/file",
+            "file_hash": digest,
+            "file_size": upload["size"],
+            "file_content_type": upload.get("content_type"),
+            "updated_at": datetime.utcnow()
+        }},
+        return_document=ReturnDocument.AFTER
+    )
+    await db.beat_uploads.delete_one({"id": upload_id})
+    if not beat:
+        raise HTTPException(status_code=404, detail="Beat not found")
+    await bump_change_tokens("beats")
+    invalidate_beats()
+    if is_wav(upload.get("filename"), upload.get("content_type")) and not beat_analysis.submit(beat["id"]):
+        logger.warning("Audio analysis queue full, beat %s left for analyze-beats", beat["id"])
+    return Beat(**beat)
+
+@api_router.get("/beats/{beat_id}/file")
+async def download_beat_file(
+    beat_id: str,
+    range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None)
+):
+    beat = await db.beats.find_one({"id": beat_id}, {"_id": 0, "file_hash": 1, "file_size": 1, "file_content_type": 1})
+    path = beat_file_path(beat["file_hash"]) if beat and beat.get("file_hash") else None
+    if path is None or not path.exists():
+        raise HTTPException(status_code=404, detail="Beat file not found")
+    
+    # Content-addressed files never change, so the digest is the ETag
+    etag = f'"{beat["file_hash"]}"'
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    size = beat["file_size"]
+    media_type = beat.get("file_content_type") or "application/octet-stream"
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "public, max-age=31536000, immutable"}
+    
+    byte_range = parse_byte_range(range, size) if range else None
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type, headers=headers)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(_read_range(path, start, end), status_code=206, media_type=media_type, headers=headers)
+
+# BEAT AUDIO ANALYSIS
+# Completed WAV uploads are analysed (audio_analysis.analyze_wav) on a dedicated
+# process pool by AUDIO_ANALYSIS_WORKERS tasks draining a bounded queue. A full
+# queue refuses new jobs instead of growing; `python server.py analyze-beats` picks
+# up every stored file without an analysis. Results are kept under `analysis` and
+# fill bpm, key and duration only where those are still empty, so values entered by
+# hand win.
+AUDIO_ANALYSIS_WORKERS = int(os.environ.get("AUDIO_ANALYSIS_WORKERS", "2"))
+AUDIO_ANALYSIS_QUEUE_SIZE = int(os.environ.get("AUDIO_ANALYSIS_QUEUE_SIZE", "100"))
+WAV_CONTENT_TYPES = {"audio/wav", "audio/x-wav", "audio/wave", "audio/vnd.wave"}
+
+def is_wav(filename: Optional[str], content_type: Optional[str]) -> bool:
+    return (filename or "").lower().endswith(".wav") or content_type in WAV_CONTENT_TYPES
+
+def analysis_update_pipeline(analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+    update = {"analysis": {"$literal": analysis}, "updated_at": analysis["analyzed_at"]}
+    for field in ("bpm", "key", "duration"):
+        if analysis.get(field) is not None:
+            update[field] = {"$ifNull": [f"${field}", analysis[field]]}
+    return [{"$set": update}]
+
+class AnalysisQueue:
+    def __init__(self, workers: int, max_queued: int):
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+    
+    def submit(self, beat_id: str) -> bool:
+        try:
+            self._queue.put_nowait(beat_id)
+            return True
+        except asyncio.QueueFull:
+            return False
+    
+    async def enqueue(self, beat_id: str):
+        # Waits for room; for batch callers that want backpressure rather than refusal
+        await self._queue.put(beat_id)
+    
+    async def join(self):
+        await self._queue.join()
+    
+    async def analyze(self, beat_id: str):
+        beat = await db.beats.find_one({"id": beat_id}, {"_id": 0, "file_hash": 1})
+        if not beat or not beat.get("file_hash"):
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            analysis = await loop.run_in_executor(self._pool, analyze_wav, str(beat_file_path(beat["file_hash"])))
+        except Exception as e:
+            # Recorded so the backfill does not retry an unreadable file forever
+            logger.warning("Audio analysis failed for beat %s: %s", beat_id, e)
+            analysis = {"error": str(e)}
+        analysis["analyzed_at"] = datetime.utcnow()
+        beat = await db.beats.find_one_and_update(
+            {"id": beat_id},
+            analysis_update_pipeline(analysis),
+            projection=BEAT_INDEX_FIELDS,
+            return_document=ReturnDocument.AFTER
+        )
+        if beat:
+            index_beats([beat])
+        await bump_change_tokens("beats")
+        invalidate_beats()
+    
+    async def _run(self):
+        while True:
+            beat_id = await self._queue.get()
+            try:
+                await self.analyze(beat_id)
+            except Exception as e:
+                logger.error("Storing audio analysis for beat %s failed: %s", beat_id, e)
+            finally:
+                self._queue.task_done()
+    
+    def start(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+    
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+beat_analysis = AnalysisQueue(AUDIO_ANALYSIS_WORKERS, AUDIO_ANALYSIS_QUEUE_SIZE)
+
+@api_router.post("/beats/{beat_id}/analyze", status_code=202)
+async def analyze_beat(beat_id: str):
+    beat = await db.beats.find_one({"id": beat_id}, {"_id": 0, "file_hash": 1})
+    if not beat or not beat.get("file_hash"):
+        raise HTTPException(status_code=404, detail="Beat file not found")
+    if not beat_analysis.submit(beat_id):
+        raise HTTPException(status_code=503, detail="Analysis queue is full, try again later")
+    return {"message": "Analysis queued"}
+
+async def analyze_pending_beats() -> int:
+    """Analyse every stored beat file that has no analysis yet; returns the number queued."""
+    pending = db.beats.find({"file_hash": {"$ne": None}, "analysis": None}, {"_id": 0, "id": 1})
+    queued = 0
+    beat_analysis.start()
+    try:
+        async for beat in pending:
+            await beat_analysis.enqueue(beat["id"])
+            queued += 1
+        await beat_analysis.join()
+    finally:
+        await beat_analysis.stop()
+    return queued
+
+# BEAT SIMILARITY
+# beat_similarity.BeatIndex keeps one feature row per beat in process memory. It is
+# loaded on first use and extended in place by create_beat and audio analysis; it is
+# rebuilt in the background once older than BEAT_INDEX_MAX_AGE (or after an import),
+# which is also how beats written by other workers arrive. Beats indexed while a
+# rebuild is reading are replayed into the new index so none are dropped.
+BEAT_INDEX_MAX_AGE = float(os.environ.get("BEAT_INDEX_MAX_AGE", "600"))
+BEAT_INDEX_FIELDS = {"_id": 0, "id": 1, "bpm": 1, "key": 1, "mood": 1, "genre": 1, "tags": 1}
+_beat_index: Optional[BeatIndex] = None
+_beat_index_built_at = 0.0
+_beat_index_build: Optional[asyncio.Task] = None
+_beat_index_recent: List[Dict[str, Any]] = []
+
+async def _build_beat_index() -> Optional[BeatIndex]:
+    global _beat_index, _beat_index_built_at
+    started = time.monotonic()
+    _beat_index_recent.clear()
+    try:
+        index = BeatIndex()
+        cursor = db.beats.find({}, BEAT_INDEX_FIELDS).batch_size(5000)
+        while True:
+            batch = await cursor.to_list(5000)
+            if not batch:
+                break
+            index.add_many(batch)
+    except PyMongoError as e:
+        if _beat_index is None:
+            raise
+        logger.error("Beat index rebuild failed, serving the previous index: %s", e)
+        return _beat_index
+    index.add_many(_beat_index_recent)
+    _beat_index_recent.clear()
+    _beat_index, _beat_index_built_at = index, started
+    logger.info("Beat index built: %d beats in %.2fs", len(index), time.monotonic() - started)
+    return index
+
+async def beat_index() -> BeatIndex:
+    global _beat_index_build
+    stale = _beat_index is None or time.monotonic() - _beat_index_built_at > BEAT_INDEX_MAX_AGE
+    if stale and (_beat_index_build is None or _beat_index_build.done()):
+        _beat_index_build = asyncio.create_task(_build_beat_index())
+    if _beat_index is None:
+        # Only the very first build is waited for; later ones run behind the current index
+        return await asyncio.shield(_beat_index_build)
+    return _beat_index
+
+def index_beats(beats: List[Dict[str, Any]]):
+    if _beat_index is not None:
+        _beat_index.add_many(beats)
+    if _beat_index_build is not None and not _beat_index_build.done():
+        _beat_index_recent.extend(beats)
+
+def invalidate_beat_index():
+    global _beat_index_built_at
+    _beat_index_built_at = 0.0
+
+async def _beat_matches(results: List[tuple]) -> List[BeatMatch]:
+    ids = [beat_id for beat_id, _ in results]
+    docs = await db.beats.find({"id": {"$in": ids}}, model_projection(Beat)).to_list(None)
+    by_id = {doc["id"]: doc for doc in docs}
+    return [
+        BeatMatch(beat=Beat(**by_id[beat_id]), distance=round(distance, 4))
+        for beat_id, distance in results if beat_id in by_id
+    ]
+
+@api_router.get("/beats/match", response_model=List[BeatMatch])
+async def match_beats(
+    bpm: Optional[float] = None,
+    key: Optional[str] = None,
+    mood: Optional[str] = None,
+    genre: Optional[str] = None,
+    tags: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=100)
+):
+    vector, present = beat_features(bpm, key, mood, genre, tags.split(",") if tags else ())
+    if not present.any():
+        raise HTTPException(status_code=400, detail="Give at least one of bpm, key, mood, genre or tags")
+    index = await beat_index()
+    return await _beat_matches(index.search(vector, present, limit))
+
+@api_router.get("/beats/{beat_id}/similar", response_model=List[BeatMatch])
+async def get_similar_beats(beat_id: str, limit: int = Query(10, ge=1, le=100)):
+    index = await beat_index()
+    features = index.vector(beat_id)
+    if features is None:
+        # Written by another worker since the last rebuild
+        beat = await db.beats.find_one({"id": beat_id}, BEAT_INDEX_FIELDS)
+        if not beat:
+            raise HTTPException(status_code=404, detail="Beat not found")
+        features = beat_features(beat.get("bpm"), beat.get("key"), beat.get("mood"), beat.get("genre"), beat.get("tags") or ())
+    return await _beat_matches(index.search(*features, limit, exclude=beat_id))
+
+@api_router.get("/verses/{verse_id}/beats", response_model=List[BeatMatch])
+async def match_beats_to_verse(verse_id: str, limit: int = Query(10, ge=1, le=100)):
+    # Verse tags describe lyrics rather than production, so only tempo, key and mood are compared
+    verse = await db.verses.find_one({"id": verse_id}, {"_id": 0, "bpm": 1, "key": 1, "mood": 1})
+    if not verse:
+        raise HTTPException(status_code=404, detail="Verse not found")
+    vector, present = beat_features(verse.get("bpm"), verse.get("key"), verse.get("mood"))
+    if not present.any():
+        raise HTTPException(status_code=400, detail="Verse has no bpm, key or mood to match on")
+    index = await beat_index()
+    return await _beat_matches(index.search(vector, present, limit))
 
 # PRODUCT ENDPOINTS (Enhanced)
+def new_product(product: ProductCreate) -> Product:
+    product_dict = product.dict()
+    if product_dict["track_stock"] is None:
+        product_dict["track_stock"] = product.product_type == ProductType.PHYSICAL and product.stock_quantity > 0
+    return Product(**product_dict)
+
 @api_router.post("/products", response_model=Product)
 async def create_product(product: ProductCreate):
-    product_dict = product.dict()
-    product_obj = Product(**product_dict)
-    result = await db.products.insert_one(product_obj.dict())
+    product_obj = new_product(product)
+    product_doc = product_obj.dict()
+    result = await db.products.insert_one(product_doc)
+    await asyncio.gather(
+        apply_rollup_delta(product_obj.created_at, _product_rollup_delta(product_doc)),
+        apply_tag_deltas("products", document_tag_deltas([product_doc])),
+        bump_change_tokens("products")
+    )
+    invalidate_products([product_obj.id])
     return product_obj
 
-@api_router.get("/products", response_model=List[Product])
-async def get_products(
-    category: Optional[ProductCategory] = None,
-    product_type: Optional[ProductType] = None,
-    is_featured: Optional[bool] = None,
-    min_price: Optional[float] = None,
-    max_price: Optional[float] = None,
-    tags: Optional[str] = None,
-    active_only: bool = True,
-    limit: int = Query(100, le=1000)
-):
+def product_filter_query(category: Optional[ProductCategory], product_type: Optional[ProductType],
+                         is_featured: Optional[bool], min_price: Optional[float], max_price: Optional[float],
+                         tags: Optional[str], active_only: bool) -> Dict[str, Any]:
     query = {}
     
     if category:
@@ -454,61 +2033,318 @@ async def get_products(
     if tags:
         tag_list = [tag.strip() for tag in tags.split(",")]
         query["tags"] = {"$in": tag_list}
-    
-    products = await db.products.find(query).sort("created_at", -1).limit(limit).to_list(limit)
-    return [Product(**product) for product in products]
+    return query
+
+@api_router.get("/products")
+async def get_products(
+    response: Response,
+    category: Optional[ProductCategory] = None,
+    product_type: Optional[ProductType] = None,
+    is_featured: Optional[bool] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    tags: Optional[str] = None,
+    active_only: bool = True,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: str = "summary",
+    if_none_match: Optional[str] = Header(None)
+):
+    query = product_filter_query(category, product_type, is_featured, min_price, max_price, tags, active_only)
+    selected = list_fields(Product, fields, "created_at")
+    key = cache_key(
+        "products:list", category=category, product_type=product_type, is_featured=is_featured,
+        min_price=min_price, max_price=max_price, tags=tags, active_only=active_only, limit=limit, cursor=cursor,
+        fields=selected
+    )
+    return await conditional_page(
+        key, db.products, query, "created_at", limit, cursor, response, Product, if_none_match,
+        cache=True, fields=selected
+    )
+
+@api_router.get("/products/facets")
+async def get_product_facets(
+    category: Optional[ProductCategory] = None,
+    product_type: Optional[ProductType] = None,
+    is_featured: Optional[bool] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    tags: Optional[str] = None,
+    active_only: bool = True,
+    limit: int = Query(100, ge=1, le=1000),
+    fields: str = "summary",
+    tag_limit: int = Query(50, ge=1, le=500)
+):
+    query = product_filter_query(category, product_type, is_featured, min_price, max_price, tags, active_only)
+    return await faceted_page(db.products, Product, query, "created_at", limit, fields, tag_limit)
+
+@api_router.post("/products/batch-get")
+async def batch_get_products(product_ids: List[str], fields: str = "full"):
+    return await batch_get(db.products, Product, product_ids, fields)
 
 @api_router.get("/products/{product_id}", response_model=Product)
-async def get_product(product_id: str):
-    product = await db.products.find_one({"id": product_id})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return Product(**product)
+async def get_product(product_id: str, response: Response, if_none_match: Optional[str] = Header(None)):
+    key = ("products:item", product_id)
+    cached = catalogue_cache.get(key)
+    if cached is None:
+        generation = catalogue_cache.generation(key[0])
+        product = await db.products.find_one({"id": product_id})
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        cached = (Product(**product), document_etag(product, PRODUCT_ETAG_FIELDS))
+        catalogue_cache.set(key, cached, _approximate_size(product), generation)
+    product_obj, etag = cached
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return product_obj
 
 @api_router.put("/products/{product_id}", response_model=Product)
-async def update_product(product_id: str, product_update: dict):
-    product = await db.products.find_one({"id": product_id})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
+async def update_product(
+    product_id: str,
+    product_update: dict,
+    if_match: Optional[str] = Header(None),
+    expected_version: Optional[int] = None
+):
+    for field in ("_id", "id", "version"):
+        product_update.pop(field, None)
+    if any("." in field or field.startswith("$") for field in product_update):
+        raise HTTPException(status_code=400, detail="Field names may not contain '.' or start with '$'")
     product_update["updated_at"] = datetime.utcnow()
-    await db.products.update_one({"id": product_id}, {"$set": product_update})
     
-    updated_product = await db.products.find_one({"id": product_id})
+    product, updated_product = await versioned_update(
+        db.products, product_id, product_update, required_version(if_match, expected_version), "Product not found"
+    )
+    await asyncio.gather(
+        apply_rollup_delta(product["created_at"], _merge_deltas(
+            _product_rollup_delta(product, -1), _product_rollup_delta(updated_product)
+        )),
+        apply_tag_deltas("products", tag_deltas(product.get("tags"), updated_product.get("tags"))),
+        bump_change_tokens("products")
+    )
+    invalidate_products([product_id])
     return Product(**updated_product)
 
 # REVIEW ENDPOINTS
+# Products keep rating_sum and review_count so a new review updates the average
+# without rereading the product's reviews; reconcile_product_ratings recomputes
+# them from the reviews collection. Products reviewed before rating_sum existed
+# only stored a rounded average and a review count capped at 1000, so their sum
+# cannot be recovered from the product: the first new review of such a product
+# recomputes its counts from its reviews, and it is incremental from then on.
+RATING_SUM_KNOWN = {"$or": [{"rating_sum": {"$exists": True}}, {"review_count": {"$in": [0, None]}}]}
+
+def rating_update_pipeline(rating: int) -> List[Dict[str, Any]]:
+    # Only applied to products matching RATING_SUM_KNOWN, where a missing sum means no reviews yet
+    return [
+        {"$set": {
+            "rating_sum": {"$add": [{"$ifNull": ["$rating_sum", 0]}, rating]},
+            "review_count": {"$add": [{"$ifNull": ["$review_count", 0]}, 1]},
+            f"rating_histogram.{rating}": {"$add": [{"$ifNull": [f"$rating_histogram.{rating}", 0]}, 1]}
+        }},
+        {"$set": {"rating": {"$round": [{"$divide": ["$rating_sum", "$review_count"]}, 1]}}}
+    ]
+
+def rating_fields(stars: List[Dict[str, int]]) -> Dict[str, Any]:
+    """rating_sum, review_count, rating and rating_histogram from per-star review counts."""
+    histogram = {str(rating): 0 for rating in range(1, 6)}
+    for star in stars:
+        histogram[str(star["rating"])] = star["count"]
+    rating_sum = sum(star["rating"] * star["count"] for star in stars)
+    review_count = sum(star["count"] for star in stars)
+    return {
+        "rating_sum": rating_sum,
+        "review_count": review_count,
+        "rating": round(rating_sum / review_count, 1) if review_count else 0.0,
+        "rating_histogram": histogram
+    }
+
+async def backfill_product_rating(product_id: str) -> bool:
+    """Set the rating counts of a product that predates rating_sum from its reviews."""
+    stars = await db.reviews.aggregate([
+        {"$match": {"product_id": product_id}},
+        {"$group": {"_id": "$rating", "count": {"$sum": 1}}},
+        {"$project": {"_id": 0, "rating": "$_id", "count": 1}}
+    ]).to_list(None)
+    # Conditional so a concurrent backfill of the same product is only applied once
+    result = await db.products.update_one(
+        {"id": product_id, "rating_sum": {"$exists": False}}, {"$set": rating_fields(stars)}
+    )
+    return bool(result.matched_count)
+
+async def reconcile_product_ratings(chunk_size: int = 1000) -> Dict[str, int]:
+    """Recompute rating_sum, review_count, rating and rating_histogram of every product from its reviews."""
+    groups = db.reviews.aggregate([
+        {"$group": {"_id": {"product_id": "$product_id", "rating": "$rating"}, "count": {"$sum": 1}}},
+        {"$group": {
+            "_id": "$_id.product_id",
+            "stars": {"$push": {"rating": "$_id.rating", "count": "$count"}}
+        }}
+    ])
+    reviewed = set()
+    operations = []
+    updated = 0
+    async for group in groups:
+        reviewed.add(group["_id"])
+        operations.append(UpdateOne({"id": group["_id"]}, {"$set": rating_fields(group["stars"])}))
+        if len(operations) == chunk_size:
+            updated += (await db.products.bulk_write(operations, ordered=False)).modified_count
+            operations = []
+    if operations:
+        updated += (await db.products.bulk_write(operations, ordered=False)).modified_count
+    
+    cleared = await db.products.update_many(
+        {"id": {"$nin": list(reviewed)}, "$or": [{"review_count": {"$ne": 0}}, {"rating_sum": {"$ne": 0}}]},
+        {"$set": rating_fields([])}
+    )
+    await bump_change_tokens("products")
+    return {"reviewed_products": len(reviewed), "updated": updated + cleared.modified_count}
+
 @api_router.post("/reviews", response_model=Review)
 async def create_review(review: ReviewCreate):
     review_dict = review.dict()  
     review_obj = Review(**review_dict)
     result = await db.reviews.insert_one(review_obj.dict())
     
-    # Update product rating
-    reviews = await db.reviews.find({"product_id": review.product_id}).to_list(1000)
-    avg_rating = sum(r["rating"] for r in reviews) / len(reviews)
-    await db.products.update_one(
-        {"id": review.product_id},
-        {"$set": {"rating": round(avg_rating, 1), "review_count": len(reviews)}}
+    # Update product rating incrementally in one atomic pipeline update
+    rated = await db.products.update_one(
+        {"id": review.product_id, **RATING_SUM_KNOWN}, rating_update_pipeline(review.rating)
     )
+    if not rated.matched_count and await db.products.count_documents({"id": review.product_id}, limit=1):
+        # The product predates rating_sum: count its reviews, this one included, once
+        await backfill_product_rating(review.product_id)
+    await bump_change_tokens("reviews", "products")
+    invalidate_products([review.product_id])
     
     return review_obj
 
-@api_router.get("/reviews/product/{product_id}", response_model=List[Review])
-async def get_product_reviews(product_id: str):
-    reviews = await db.reviews.find({"product_id": product_id}).sort("created_at", -1).to_list(1000)
-    return [Review(**review) for review in reviews]
+@api_router.get("/reviews/product/{product_id}")
+async def get_product_reviews(
+    product_id: str,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    format: str = "json",
+    if_none_match: Optional[str] = Header(None)
+):
+    # Newest first, paged by (created_at, id) cursor; format=ndjson streams every review after the cursor
+    query = {"product_id": product_id}
+    if format == "ndjson":
+        reviews = db.reviews.find(
+            keyset_query(query, "created_at", cursor), {"_id": 0}
+        ).sort([("created_at", -1), ("id", -1)]).batch_size(500)
+        
+        async def lines():
+            async for review in reviews:
+                yield Review(**review).model_dump_json() + "\n"
+        
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    
+    key = cache_key("reviews:list", product_id=product_id, limit=limit, cursor=cursor)
+    return await conditional_page(
+        key, db.reviews, query, "created_at", limit, cursor, response, Review, if_none_match
+    )
 
 # ORDER ENDPOINTS (Enhanced)
+# Stock is tracked for physical products with track_stock set; digital goods,
+# subscriptions and products that predate stock tracking have no stock limit. Stock is decremented conditionally ($gte the quantity),
+# so concurrent checkouts can never take it below zero.
+_transactions_supported: Optional[bool] = None
+
+async def transactions_supported() -> bool:
+    # Multi-document transactions need a replica set or mongos
+    global _transactions_supported
+    if _transactions_supported is None:
+        hello = await client.admin.command("hello")
+        _transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+    return _transactions_supported
+
+def _tracks_stock(product: Dict[str, Any]) -> bool:
+    return product.get("product_type") == ProductType.PHYSICAL.value and product.get("track_stock", False)
+
+def _product_stock_change(product: Dict[str, Any], quantity: int, sign: int = 1) -> tuple:
+    # (filter, update) selling (sign=1) or releasing (sign=-1) quantity units of a product
+    if _tracks_stock(product):
+        update = {"$inc": {"sold_count": sign * quantity, "stock_quantity": -sign * quantity}}
+        if sign > 0:
+            return {"id": product["id"], "stock_quantity": {"$gte": quantity}}, update
+        return {"id": product["id"]}, update
+    return {"id": product["id"]}, {"$inc": {"sold_count": sign * quantity}}
+
+def _product_stock_update(product: Dict[str, Any], quantity: int, sign: int = 1) -> UpdateOne:
+    return UpdateOne(*_product_stock_change(product, quantity, sign))
+
+def _out_of_stock() -> HTTPException:
+    return HTTPException(status_code=409, detail="Insufficient stock for one or more products")
+
+async def _place_order_in_transaction(order_doc: Dict[str, Any], quantities: Dict[str, int], products: Dict[str, Any]):
+    operations = [_product_stock_update(products[pid], quantity) for pid, quantity in quantities.items()]
+    
+    async def place(session):
+        result = await db.products.bulk_write(operations, ordered=False, session=session)
+        if result.matched_count < len(operations):
+            raise _out_of_stock()  # aborts the transaction
+        await db.orders.insert_one(order_doc, session=session)
+    
+    async with await client.start_session() as session:
+        # with_transaction retries write conflicts between concurrent checkouts
+        await session.with_transaction(place)
+
+async def _place_order_without_transaction(order_doc: Dict[str, Any], quantities: Dict[str, int], products: Dict[str, Any]):
+    # Reserve stock with concurrent conditional updates, compensating if any line falls short
+    stocked = [pid for pid in quantities if _tracks_stock(products[pid])]
+    results = await asyncio.gather(*(
+        db.products.update_one(*_product_stock_change(products[pid], quantities[pid])) for pid in stocked
+    ))
+    reserved = [pid for pid, result in zip(stocked, results) if result.matched_count]
+    
+    async def release(pids):
+        if pids:
+            await db.products.bulk_write(
+                [_product_stock_update(products[pid], quantities[pid], sign=-1) for pid in pids], ordered=False
+            )
+    
+    if len(reserved) < len(stocked):
+        await release(reserved)
+        raise _out_of_stock()
+    
+    unstocked = [pid for pid in quantities if pid not in stocked]
+    applied = list(reserved)
+    try:
+        if unstocked:
+            try:
+                await db.products.bulk_write(
+                    [_product_stock_update(products[pid], quantities[pid]) for pid in unstocked], ordered=False
+                )
+            except BulkWriteError as e:
+                failed = {error["index"] for error in e.details["writeErrors"]}
+                applied += [pid for i, pid in enumerate(unstocked) if i not in failed]
+                raise
+            applied += unstocked
+        await db.orders.insert_one(order_doc)
+    except Exception:
+        await release(applied)
+        raise
+
 @api_router.post("/orders", response_model=Order)
 async def create_order(order: OrderCreate):
+    # Fetch every product in the cart in one query
+    product_ids = list({item["product_id"] for item in order.products})
+    products = {
+        product["id"]: product
+        for product in await db.products.find({"id": {"$in": product_ids}}).to_list(None)
+    }
+    
     # Calculate amounts
     total_amount = 0
     enhanced_products = []
+    quantities: Dict[str, int] = {}
     
     for item in order.products:
-        product = await db.products.find_one({"id": item["product_id"]})
+        product = products.get(item["product_id"])
         if product:
+            if item["quantity"] < 1:
+                raise HTTPException(status_code=400, detail="Quantity must be at least 1")
             item_total = product["price"] * item["quantity"]
             discount = item_total * (product.get("discount_percentage", 0) / 100)
             final_price = product["price"] - (product["price"] * product.get("discount_percentage", 0) / 100)
@@ -521,6 +2357,12 @@ async def create_order(order: OrderCreate):
                 "discount": discount
             })
             total_amount += final_price * item["quantity"]
+            quantities[product["id"]] = quantities.get(product["id"], 0) + item["quantity"]
+    
+    # Fail fast on stock we can already see is short; the conditional update is the real guard
+    for pid, quantity in quantities.items():
+        if _tracks_stock(products[pid]) and products[pid].get("stock_quantity", 0) < quantity:
+            raise HTTPException(status_code=409, detail=f"Insufficient stock for {products[pid]['name']}")
     
     # Calculate final amounts
     tax_amount = total_amount * 0.08  # 8% tax
@@ -537,22 +2379,30 @@ async def create_order(order: OrderCreate):
     })
     
     order_obj = Order(**order_dict)
-    result = await db.orders.insert_one(order_obj.dict())
+    order_doc = order_obj.dict()
     
-    # Update product sold count
-    for item in enhanced_products:
-        await db.products.update_one(
-            {"id": item["product_id"]},
-            {"$inc": {"sold_count": item["quantity"]}}
-        )
+    # Insert the order and update sold counts/stock together
+    if await transactions_supported():
+        await _place_order_in_transaction(order_doc, quantities, products)
+    else:
+        await _place_order_without_transaction(order_doc, quantities, products)
+    await asyncio.gather(
+        apply_rollup_delta(order_obj.created_at, _order_rollup_delta(order_doc)),
+        bump_change_tokens("orders", "products")
+    )
+    invalidate_products(list(quantities))
     
     return order_obj
 
-@api_router.get("/orders", response_model=List[Order])
+@api_router.get("/orders")
 async def get_orders(
+    response: Response,
     status: Optional[OrderStatus] = None,
     customer_email: Optional[str] = None,
-    limit: int = Query(100, le=1000)
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: str = "summary",
+    if_none_match: Optional[str] = Header(None)
 ):
     query = {}
     if status:
@@ -560,8 +2410,13 @@ async def get_orders(
     if customer_email:
         query["customer_email"] = customer_email
     
-    orders = await db.orders.find(query).sort("created_at", -1).limit(limit).to_list(limit)
-    return [Order(**order) for order in orders]
+    selected = list_fields(Order, fields, "created_at")
+    key = cache_key(
+        "orders:list", status=status, customer_email=customer_email, limit=limit, cursor=cursor, fields=selected
+    )
+    return await conditional_page(
+        key, db.orders, query, "created_at", limit, cursor, response, Order, if_none_match, fields=selected
+    )
 
 @api_router.put("/orders/{order_id}/status")
 async def update_order_status(order_id: str, new_status: OrderStatus, tracking_number: Optional[str] = None):
@@ -573,67 +2428,184 @@ async def update_order_status(order_id: str, new_status: OrderStatus, tracking_n
     elif new_status == OrderStatus.DELIVERED:
         update_data["delivered_at"] = datetime.utcnow()
     
-    await db.orders.update_one({"id": order_id}, {"$set": update_data})
+    order = await db.orders.find_one_and_update(
+        {"id": order_id},
+        {"$set": update_data},
+        projection=ORDER_ROLLUP_FIELDS,
+        return_document=ReturnDocument.BEFORE
+    )
+    if order:
+        await asyncio.gather(
+            apply_rollup_delta(order["created_at"], _merge_deltas(
+                _order_rollup_delta(order, -1), _order_rollup_delta({**order, "status": new_status})
+            )),
+            bump_change_tokens("orders")
+        )
     return {"message": "Order status updated successfully"}
 
 # ADVANCED ANALYTICS ENDPOINTS
-@api_router.get("/analytics/dashboard", response_model=AnalyticsData)
-async def get_analytics_dashboard():
-    # Basic counts
-    verse_count = await db.verses.count_documents({})
-    product_count = await db.products.count_documents({"is_active": True})
-    order_count = await db.orders.count_documents({})
-    
-    # Revenue calculation
-    orders = await db.orders.find({"status": {"$in": ["paid", "shipped", "delivered"]}}).to_list(1000)
-    total_revenue = sum(order.get("final_amount", 0) for order in orders)
-    
-    # Verse stats by category
-    verse_stats = {}
-    for category in VerseCategory:
-        count = await db.verses.count_documents({"category": category})
-        verse_stats[category.value] = count
-    
-    # Product stats by category
-    product_stats = {}
-    for category in ProductCategory:
-        count = await db.products.count_documents({"category": category, "is_active": True})
-        product_stats[category.value] = count
-    
-    # Order stats by status
-    order_stats = {}
-    for status in OrderStatus:
-        count = await db.orders.count_documents({"status": status})
-        order_stats[status.value] = count
-    
-    # Monthly revenue (last 6 months)
+async def _timed(name: str, coro, timings: Dict[str, float]):
+    # Run a query coroutine and record its wall time in milliseconds
+    start = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[name] = (time.perf_counter() - start) * 1000
+
+def _server_timing(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={duration:.2f}" for name, duration in timings.items())
+
+def _month_starts(months: int) -> List[datetime]:
+    # First day of the current month and the previous (months - 1) months, newest first
+    current = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    starts = []
+    for _ in range(months):
+        starts.append(current)
+        current = (current - timedelta(days=1)).replace(day=1)
+    return starts
+
+async def _verse_dashboard_facets() -> Dict[str, Any]:
+    result = await db.verses.aggregate([
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "by_category": [{"$group": {"_id": "$category", "count": {"$sum": 1}}}]
+        }}
+    ]).to_list(1)
+    return result[0]
+
+async def _product_dashboard_facets() -> Dict[str, Any]:
+    result = await db.products.aggregate([
+        {"$match": {"is_active": True}},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "by_category": [{"$group": {"_id": "$category", "count": {"$sum": 1}}}]
+        }}
+    ]).to_list(1)
+    return result[0]
+
+async def _order_dashboard_facets(since: datetime) -> Dict[str, Any]:
+    result = await db.orders.aggregate([
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+            "revenue": [
+                {"$match": {"status": {"$in": REVENUE_STATUSES}}},
+                {"$group": {"_id": None, "revenue": {"$sum": "$final_amount"}}}
+            ],
+            "monthly": [
+                {"$match": {"created_at": {"$gte": since}, "status": {"$in": REVENUE_STATUSES}}},
+                {"$group": {
+                    "_id": {"year": {"$year": "$created_at"}, "month": {"$month": "$created_at"}},
+                    "revenue": {"$sum": "$final_amount"},
+                    "orders": {"$sum": 1}
+                }}
+            ]
+        }}
+    ]).to_list(1)
+    return result[0]
+
+async def _dashboard_counts(months: List[datetime], timings: Dict[str, float]) -> Dict[str, Any]:
+    # Counts come from the rollups when built, otherwise from one aggregation per collection
+    if await rollups_ready():
+        month_rollups = await _timed("rollups", _read_month_rollups(), timings)
+        return _dashboard_counts_from_rollups(month_rollups, months)
+    verse_facets, product_facets, order_facets = await asyncio.gather(
+        _timed("verses", _verse_dashboard_facets(), timings),
+        _timed("products", _product_dashboard_facets(), timings),
+        _timed("orders", _order_dashboard_facets(months[-1]), timings)
+    )
+    return _dashboard_counts_from_facets(verse_facets, product_facets, order_facets, months)
+
+async def _read_month_rollups() -> List[Dict[str, Any]]:
+    return await db.analytics_rollups.find({"period": "month"}).to_list(None)
+
+def _facet_count(facet: List[Dict[str, Any]]) -> int:
+    return facet[0]["count"] if facet else 0
+
+def _facet_groups(facet: List[Dict[str, Any]], keys) -> Dict[str, int]:
+    return _enum_counts({group["_id"]: group["count"] for group in facet}, keys)
+
+def _enum_counts(counts: Dict[str, int], keys) -> Dict[str, int]:
+    return {key.value: counts.get(key.value, 0) for key in keys}
+
+def _monthly_revenue(months: List[datetime], by_month: Dict[tuple, Dict[str, Any]]) -> List[Dict[str, Any]]:
     monthly_revenue = []
-    for i in range(6):
-        start_date = datetime.now().replace(day=1) - timedelta(days=30*i)
-        end_date = start_date.replace(day=28) + timedelta(days=4)
-        end_date = end_date - timedelta(days=end_date.day)
-        
-        month_orders = await db.orders.find({
-            "created_at": {"$gte": start_date, "$lte": end_date},
-            "status": {"$in": ["paid", "shipped", "delivered"]}
-        }).to_list(1000)
-        
-        month_revenue = sum(order.get("final_amount", 0) for order in month_orders)
+    for start_date in months:
+        month = by_month.get((start_date.year, start_date.month), {})
         monthly_revenue.append({
             "month": start_date.strftime("%B %Y"),
-            "revenue": month_revenue,
-            "orders": len(month_orders)
+            "revenue": month.get("revenue", 0),
+            "orders": month.get("orders", 0)
         })
+    return monthly_revenue
+
+def _dashboard_counts_from_facets(verse_facets, product_facets, order_facets, months) -> Dict[str, Any]:
+    revenue = order_facets["revenue"]
+    by_month = {(m["_id"]["year"], m["_id"]["month"]): m for m in order_facets["monthly"]}
+    return {
+        "total_verses": _facet_count(verse_facets["total"]),
+        "total_products": _facet_count(product_facets["total"]),
+        "total_orders": _facet_count(order_facets["total"]),
+        "total_revenue": revenue[0]["revenue"] if revenue else 0,
+        "verse_by_category": _facet_groups(verse_facets["by_category"], VerseCategory),
+        "products_by_category": _facet_groups(product_facets["by_category"], ProductCategory),
+        "orders_by_status": _facet_groups(order_facets["by_status"], OrderStatus),
+        "monthly_revenue": _monthly_revenue(months, by_month)
+    }
+
+def _dashboard_counts_from_rollups(month_rollups, months) -> Dict[str, Any]:
+    totals = sum_rollups(month_rollups)
+    verses, products, orders = (totals.get(key, {}) for key in ("verses", "products", "orders"))
+    by_month = {}
+    for rollup in month_rollups:
+        month_orders = rollup.get("orders", {})
+        by_month[(rollup["start"].year, rollup["start"].month)] = {
+            "revenue": month_orders.get("revenue", 0),
+            "orders": month_orders.get("revenue_orders", 0)
+        }
+    return {
+        "total_verses": verses.get("total", 0),
+        "total_products": products.get("active", 0),
+        "total_orders": orders.get("total", 0),
+        "total_revenue": orders.get("revenue", 0),
+        "verse_by_category": _enum_counts(verses.get("by_category", {}), VerseCategory),
+        "products_by_category": _enum_counts(products.get("by_category", {}), ProductCategory),
+        "orders_by_status": _enum_counts(orders.get("by_status", {}), OrderStatus),
+        "monthly_revenue": _monthly_revenue(months, by_month)
+    }
+
+@api_router.get("/analytics/dashboard", response_model=AnalyticsData)
+async def get_analytics_dashboard(response: Response, if_none_match: Optional[str] = Header(None)):
+    timings: Dict[str, float] = {}
+    months = _month_starts(6)
+    etag = list_etag(
+        await read_change_tokens("verses", "products", "orders"),
+        ("analytics:dashboard", months[0].isoformat())
+    )
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    counts, products, recent_verses, recent_orders, recent_products = await asyncio.gather(
+        _dashboard_counts(months, timings),
+        _timed("top_selling", db.products.find(
+            {"is_active": True}, {"_id": 0, "name": 1, "price": 1, "sold_count": 1}
+        ).sort("sold_count", -1).limit(5).to_list(5), timings),
+        _timed("recent_verses", db.verses.find(
+            {}, {"_id": 0, "title": 1, "created_at": 1, "category": 1}
+        ).sort("created_at", -1).limit(3).to_list(3), timings),
+        _timed("recent_orders", db.orders.find(
+            {}, {"_id": 0, "order_number": 1, "final_amount": 1, "created_at": 1, "status": 1}
+        ).sort("created_at", -1).limit(3).to_list(3), timings),
+        _timed("recent_products", db.products.find(
+            {}, {"_id": 0, "name": 1, "created_at": 1, "category": 1}
+        ).sort("created_at", -1).limit(2).to_list(2), timings)
+    )
+    response.headers["Server-Timing"] = _server_timing(timings)
     
     # Top selling products
-    products = await db.products.find({"is_active": True}).sort("sold_count", -1).limit(5).to_list(5)
     top_selling = [{"name": p["name"], "sold": p.get("sold_count", 0), "revenue": p["price"] * p.get("sold_count", 0)} for p in products]
     
     # Recent activity (last 10 activities)
-    recent_verses = await db.verses.find().sort("created_at", -1).limit(3).to_list(3)
-    recent_orders = await db.orders.find().sort("created_at", -1).limit(3).to_list(3)
-    recent_products = await db.products.find().sort("created_at", -1).limit(2).to_list(2)
-    
     recent_activity = []
     for verse in recent_verses:
         recent_activity.append({
@@ -663,51 +2635,836 @@ async def get_analytics_dashboard():
     recent_activity.sort(key=lambda x: x["date"], reverse=True)
     
     return AnalyticsData(
-        total_verses=verse_count,
-        total_products=product_count,
-        total_orders=order_count,
-        total_revenue=total_revenue,
-        verse_by_category=verse_stats,
-        products_by_category=product_stats,
-        orders_by_status=order_stats,
-        monthly_revenue=monthly_revenue,
+        **counts,
         top_selling_products=top_selling,
         recent_activity=recent_activity[:10]
     )
 
+async def _verse_analytics_from_collections(since: datetime) -> Dict[str, Any]:
+    result = await db.verses.aggregate([
+        {"$facet": {
+            "totals": [{"$group": {
+                "_id": None,
+                "total": {"$sum": 1},
+                "completed": {"$sum": {"$cond": ["$is_complete", 1, 0]}},
+                "recorded": {"$sum": {"$cond": ["$is_recorded", 1, 0]}},
+                "published": {"$sum": {"$cond": ["$is_published", 1, 0]}},
+                "word_count": {"$sum": "$word_count"},
+                "line_count": {"$sum": "$line_count"}
+            }}],
+            "daily": [
+                {"$match": {"created_at": {"$gte": since}}},
+                {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}, "count": {"$sum": 1}}}
+            ]
+        }}
+    ]).to_list(1)
+    totals = result[0]["totals"][0] if result[0]["totals"] else {}
+    return {"verses": totals, "daily": {day["_id"]: day["count"] for day in result[0]["daily"]}}
+
+async def _verse_analytics_from_rollups(since: datetime) -> Dict[str, Any]:
+    month_rollups, day_rollups = await asyncio.gather(
+        _read_month_rollups(),
+        db.analytics_rollups.find(
+            {"period": "day", "start": {"$gte": since.replace(hour=0, minute=0, second=0, microsecond=0)}},
+            {"start": 1, "verses.total": 1}
+        ).to_list(None)
+    )
+    daily = {}
+    for rollup in day_rollups:
+        count = rollup.get("verses", {}).get("total", 0)
+        if count:
+            daily[rollup["start"].strftime("%Y-%m-%d")] = count
+    return {"verses": sum_rollups(month_rollups).get("verses", {}), "daily": daily}
+
 @api_router.get("/analytics/verses")
-async def get_verse_analytics():
+async def get_verse_analytics(response: Response, if_none_match: Optional[str] = Header(None)):
     # Detailed verse analytics
-    total_verses = await db.verses.count_documents({})
-    completed_verses = await db.verses.count_documents({"is_complete": True})
-    recorded_verses = await db.verses.count_documents({"is_recorded": True})
-    published_verses = await db.verses.count_documents({"is_published": True})
+    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    etag = list_etag(await read_change_tokens("verses"), ("analytics:verses", thirty_days_ago.date().isoformat()))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    if await rollups_ready():
+        stats = await _verse_analytics_from_rollups(thirty_days_ago)
+    else:
+        stats = await _verse_analytics_from_collections(thirty_days_ago)
     
-    # Average metrics
-    verses = await db.verses.find().to_list(1000)
-    avg_word_count = sum(v.get("word_count", 0) for v in verses) / len(verses) if verses else 0
-    avg_line_count = sum(v.get("line_count", 0) for v in verses) / len(verses) if verses else 0
-    
-    # Productivity over time (last 30 days)
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    recent_verses = await db.verses.find({"created_at": {"$gte": thirty_days_ago}}).to_list(1000)
+    verses = stats["verses"]
+    total_verses = verses.get("total", 0)
+    completed_verses = verses.get("completed", 0)
     
-    productivity = {}
-    for verse in recent_verses:
-        date_key = verse["created_at"].strftime("%Y-%m-%d")
-        productivity[date_key] = productivity.get(date_key, 0) + 1
+    # Average metrics
+    avg_word_count = verses.get("word_count", 0) / total_verses if total_verses else 0
+    avg_line_count = verses.get("line_count", 0) / total_verses if total_verses else 0
     
     return {
         "total_verses": total_verses,
         "completed_verses": completed_verses,
-        "recorded_verses": recorded_verses,
-        "published_verses": published_verses,
+        "recorded_verses": verses.get("recorded", 0),
+        "published_verses": verses.get("published", 0),
         "completion_rate": (completed_verses / total_verses * 100) if total_verses > 0 else 0,
         "average_word_count": round(avg_word_count, 1),
         "average_line_count": round(avg_line_count, 1),
-        "daily_productivity": productivity
+        "daily_productivity": stats["daily"]
+    }
+
+async def _compute_rollup_documents() -> List[Dict[str, Any]]:
+    # Group raw collections by (day, category/status) server-side, then fold into day and month buckets
+    day = {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}
+    verse_groups, product_groups, order_groups = await asyncio.gather(
+        db.verses.aggregate([
+            {"$group": {
+                "_id": {"day": day, "category": "$category"},
+                "total": {"$sum": 1},
+                "completed": {"$sum": {"$cond": ["$is_complete", 1, 0]}},
+                "recorded": {"$sum": {"$cond": ["$is_recorded", 1, 0]}},
+                "published": {"$sum": {"$cond": ["$is_published", 1, 0]}},
+                "word_count": {"$sum": "$word_count"},
+                "line_count": {"$sum": "$line_count"}
+            }}
+        ]).to_list(None),
+        db.products.aggregate([
+            {"$match": {"is_active": True}},
+            {"$group": {"_id": {"day": day, "category": "$category"}, "count": {"$sum": 1}}}
+        ]).to_list(None),
+        db.orders.aggregate([
+            {"$group": {
+                "_id": {"day": day, "status": "$status"},
+                "count": {"$sum": 1},
+                "revenue": {"$sum": "$final_amount"}
+            }}
+        ]).to_list(None)
+    )
+    
+    changes = []
+    for group in verse_groups:
+        changes.append((group["_id"]["day"], {
+            "verses": {
+                "total": group["total"],
+                "by_category": {group["_id"]["category"]: group["total"]},
+                "completed": group["completed"],
+                "recorded": group["recorded"],
+                "published": group["published"],
+                "word_count": group["word_count"],
+                "line_count": group["line_count"]
+            }
+        }))
+    for group in product_groups:
+        changes.append((group["_id"]["day"], {
+            "products": {"active": group["count"], "by_category": {group["_id"]["category"]: group["count"]}}
+        }))
+    for group in order_groups:
+        status = group["_id"]["status"]
+        orders = {"total": group["count"], "by_status": {status: group["count"]}}
+        if status in REVENUE_STATUSES:
+            orders["revenue"] = group["revenue"]
+            orders["revenue_orders"] = group["count"]
+        changes.append((group["_id"]["day"], {"orders": orders}))
+    
+    documents: Dict[str, Dict[str, Any]] = {}
+    for day_key, counters in changes:
+        for bucket_id, period, start in _rollup_buckets(datetime.strptime(day_key, "%Y-%m-%d")):
+            document = documents.setdefault(bucket_id, {"_id": bucket_id, "period": period, "start": start})
+            _add_nested(document, counters)
+    return list(documents.values())
+
+async def rebuild_rollups() -> List[str]:
+    """Regenerate analytics_rollups from the raw collections and verify them.
+    
+    The rollups are built into a scratch collection and swapped in with a rename.
+    Writes that land while the rebuild runs are not reflected, so run it when the
+    API is quiet. Returns a list of mismatches against a full recompute (empty if
+    the rollups agree).
+    """
+    global _rollups_ready
+    documents = await _compute_rollup_documents()
+    documents.append({"_id": ROLLUPS_META_ID, "period": "meta", "built_at": datetime.utcnow()})
+    
+    scratch = db["analytics_rollups_rebuild"]
+    await scratch.drop()
+    await scratch.insert_many(documents)
+    await scratch.rename("analytics_rollups", dropTarget=True)
+    _rollups_ready = True
+    
+    return await verify_rollups()
+
+async def verify_rollups() -> List[str]:
+    months = _month_starts(6)
+    expected = _dashboard_counts_from_facets(
+        await _verse_dashboard_facets(),
+        await _product_dashboard_facets(),
+        await _order_dashboard_facets(months[-1]),
+        months
+    )
+    actual = _dashboard_counts_from_rollups(await _read_month_rollups(), months)
+    
+    mismatches = []
+    for field, expected_value in expected.items():
+        actual_value = actual[field]
+        if field == "total_revenue":
+            matches = abs(actual_value - expected_value) < 0.01
+        elif field == "monthly_revenue":
+            matches = all(
+                a["orders"] == e["orders"] and abs(a["revenue"] - e["revenue"]) < 0.01
+                for a, e in zip(actual_value, expected_value)
+            )
+        else:
+            matches = actual_value == expected_value
+        if not matches:
+            mismatches.append(f"{field}: rollups={actual_value!r} recompute={expected_value!r}")
+    
+    expected_verses = (await _verse_analytics_from_collections(datetime.utcnow()))["verses"]
+    actual_verses = sum_rollups(await _read_month_rollups()).get("verses", {})
+    for field in ("completed", "recorded", "published", "word_count", "line_count"):
+        if actual_verses.get(field, 0) != expected_verses.get(field, 0):
+            mismatches.append(
+                f"verses.{field}: rollups={actual_verses.get(field, 0)!r} recompute={expected_verses.get(field, 0)!r}"
+            )
+    return mismatches
+
+# LYRIC METRICS BACKFILL
+# Recomputes word_count, line_count and rhyme_scheme for stored verses after the
+# metric definitions change. Verses are streamed in id order, computed in chunks
+# on a process pool and written back with one unordered bulk_write per batch.
+# The last written id is checkpointed so an interrupted run can resume.
+METRICS_CHECKPOINT_ID = "recompute-verse-metrics"
+
+def compute_verse_metrics(chunk: List[tuple]) -> List[tuple]:
+    """Process-pool worker: (id, lyrics) pairs to (id, word_count, line_count, rhyme_scheme)."""
+    return [
+        (verse_id, calculate_word_count(lyrics), calculate_line_count(lyrics), analyze_rhyme_scheme(lyrics))
+        for verse_id, lyrics in chunk
+    ]
+
+def metric_changes(batch: List[Dict[str, Any]], results: List[tuple]):
+    """Indices of the verses whose stored metrics differ from results, plus the
+    word_count and line_count deltas of every row."""
+    count = len(batch)
+    old_words = np.fromiter((verse.get("word_count", 0) for verse in batch), dtype=np.int64, count=count)
+    old_lines = np.fromiter((verse.get("line_count", 0) for verse in batch), dtype=np.int64, count=count)
+    new_words = np.fromiter((metrics[1] for metrics in results), dtype=np.int64, count=count)
+    new_lines = np.fromiter((metrics[2] for metrics in results), dtype=np.int64, count=count)
+    scheme_changed = np.fromiter(
+        (verse.get("rhyme_scheme") != metrics[3] for verse, metrics in zip(batch, results)),
+        dtype=bool, count=count
+    )
+    changed = np.flatnonzero((old_words != new_words) | (old_lines != new_lines) | scheme_changed)
+    return changed, new_words - old_words, new_lines - old_lines
+
+async def recompute_verse_metrics(batch_size: int = 1000, chunk_size: int = 250, workers: Optional[int] = None,
+                                  resume: bool = False, start_after: Optional[str] = None) -> Dict[str, Any]:
+    if resume and start_after is None:
+        checkpoint = await db.maintenance_checkpoints.find_one({"_id": METRICS_CHECKPOINT_ID})
+        start_after = checkpoint["last_id"] if checkpoint else None
+    query = {"id": {"$gt": start_after}} if start_after else {}
+    total = await db.verses.count_documents(query)
+    logger.info("Recomputing metrics for %d verses%s", total, f" after {start_after}" if start_after else "")
+    
+    cursor = db.verses.find(
+        query,
+        {"_id": 0, "id": 1, "version": 1, "lyrics": 1, "created_at": 1, "word_count": 1, "line_count": 1, "rhyme_scheme": 1}
+    ).sort("id", 1).batch_size(batch_size)
+    
+    loop = asyncio.get_running_loop()
+    processed = updated = skipped = 0
+    word_sum = line_sum = 0
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            batch = await cursor.to_list(batch_size)
+            if not batch:
+                break
+            
+            chunks = [
+                [(verse["id"], verse.get("lyrics", "")) for verse in batch[i:i + chunk_size]]
+                for i in range(0, len(batch), chunk_size)
+            ]
+            results = [
+                metrics
+                for chunk in await asyncio.gather(*(loop.run_in_executor(pool, compute_verse_metrics, c) for c in chunks))
+                for metrics in chunk
+            ]
+            
+            changed, word_deltas, line_deltas = metric_changes(batch, results)
+            if changed.size:
+                # Each write is conditional on the version that was read, so a verse edited since
+                # keeps the counts of its new lyrics
+                write = await db.verses.bulk_write([
+                    UpdateOne(
+                        {"id": results[i][0], **version_query(batch[i].get("version", 1))},
+                        {"$set": {
+                            "word_count": results[i][1],
+                            "line_count": results[i][2],
+                            "rhyme_scheme": results[i][3]
+                        }}
+                    )
+                    for i in changed
+                ], ordered=False)
+                applied = changed
+                if write.matched_count < len(changed):
+                    # bulk_write only reports a total: re-read the versions to find the
+                    # rows that were edited or deleted and so were not rewritten
+                    current = {
+                        verse["id"]: verse.get("version", 1)
+                        async for verse in db.verses.find(
+                            {"id": {"$in": [results[i][0] for i in changed]}}, {"_id": 0, "id": 1, "version": 1}
+                        )
+                    }
+                    applied = [i for i in changed if current.get(results[i][0]) == batch[i].get("version", 1)]
+                updated += len(applied)
+                skipped += len(changed) - len(applied)
+                # Keep the rollup word/line sums in step with the rewritten counts
+                await apply_rollup_deltas([
+                    (batch[i]["created_at"], {
+                        "verses.word_count": int(word_deltas[i]),
+                        "verses.line_count": int(line_deltas[i])
+                    })
+                    for i in applied if "created_at" in batch[i]
+                ])
+            
+            await db.maintenance_checkpoints.update_one(
+                {"_id": METRICS_CHECKPOINT_ID},
+                {"$set": {"last_id": batch[-1]["id"], "updated_at": datetime.utcnow()}},
+                upsert=True
+            )
+            
+            processed += len(batch)
+            word_sum += sum(metrics[1] for metrics in results)
+            line_sum += sum(metrics[2] for metrics in results)
+            elapsed = time.perf_counter() - started
+            logger.info(
+                "Metrics: %d/%d verses (%d updated), %.0f verses/sec",
+                processed, total, updated, processed / elapsed if elapsed else 0
+            )
+    
+    await asyncio.gather(
+        db.maintenance_checkpoints.delete_one({"_id": METRICS_CHECKPOINT_ID}),
+        bump_change_tokens("verses")
+    )
+    elapsed = time.perf_counter() - started
+    return {
+        "processed": processed,
+        "updated": updated,
+        "skipped_edited": skipped,
+        "seconds": round(elapsed, 2),
+        "verses_per_sec": round(processed / elapsed, 1) if elapsed else 0,
+        "average_word_count": round(word_sum / processed, 1) if processed else 0,
+        "average_line_count": round(line_sum / processed, 1) if processed else 0
     }
 
+# BULK IMPORT ENDPOINTS
+# NDJSON or CSV uploads are parsed incrementally, validated in batches and inserted
+# with unordered insert_many, so one bad row never aborts the rest of the batch.
+# CSV list columns (tags, collaborators, ...) are ";"-separated, as in the CSV export.
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+IMPORT_LIST_FIELDS = {"tags", "collaborators", "gallery_urls", "features", "requirements"}
+INVALID_UTF8 = "Row is not valid UTF-8 (re-save the file as UTF-8)"
+_metrics_pool: Optional[ProcessPoolExecutor] = None
+
+def metrics_pool() -> ProcessPoolExecutor:
+    global _metrics_pool
+    if _metrics_pool is None:
+        _metrics_pool = ProcessPoolExecutor()
+    return _metrics_pool
+
+def _import_rows(upload: UploadFile, format: str):
+    """Yield (row number, parsed row or ValueError) from the uploaded file."""
+    # Undecodable bytes become U+FFFD so one bad row (e.g. a cp1252 export) is reported, not fatal
+    text = io.TextIOWrapper(upload.file, encoding="utf-8-sig", errors="replace", newline="")
+    if format == "csv":
+        reader = csv.DictReader(text)
+        number = 0
+        while True:
+            number += 1
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                yield number, ValueError(f"Invalid CSV: {e}")
+                continue
+            if any("\ufffd" in value for value in row.values() if isinstance(value, str)):
+                yield number, ValueError(INVALID_UTF8)
+                continue
+            yield number, {
+                field: [item.strip() for item in value.split(";") if item.strip()] if field in IMPORT_LIST_FIELDS else value
+                for field, value in row.items() if field and value not in ("", None)
+            }
+    else:
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            if "\ufffd" in line:
+                yield number, ValueError(INVALID_UTF8)
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError as e:
+                yield number, ValueError(f"Invalid JSON: {e}")
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in error.errors())
+
+async def bulk_import(upload: UploadFile, format: Optional[str], create_model, build_documents,
+                      collection, rollup_delta=None) -> Dict[str, Any]:
+    if format is None:
+        is_csv = (upload.filename or "").lower().endswith(".csv") or upload.content_type == "text/csv"
+        format = "csv" if is_csv else "ndjson"
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Unsupported format")
+    
+    rows = _import_rows(upload, format)
+    report = {"rows": 0, "inserted": 0, "failed": 0, "errors": []}
+    
+    def fail(number: int, message: str):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": number, "error": message})
+    
+    while True:
+        # The spooled upload is read off the event loop, one batch at a time
+        batch = await asyncio.to_thread(lambda: list(islice(rows, IMPORT_BATCH_SIZE)))
+        if not batch:
+            break
+        report["rows"] += len(batch)
+        
+        numbers, valid = [], []
+        for number, row in batch:
+            if isinstance(row, Exception):
+                fail(number, str(row))
+                continue
+            try:
+                valid.append(create_model(**row))
+                numbers.append(number)
+            except (ValidationError, TypeError) as e:
+                fail(number, _validation_message(e) if isinstance(e, ValidationError) else str(e))
+        if not valid:
+            continue
+        
+        documents = await build_documents(valid)
+        failed_indexes = set()
+        try:
+            await collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details["writeErrors"]:
+                failed_indexes.add(error["index"])
+                fail(numbers[error["index"]], error["errmsg"])
+        inserted = [doc for i, doc in enumerate(documents) if i not in failed_indexes]
+        report["inserted"] += len(inserted)
+        
+        if rollup_delta:
+            await apply_rollup_deltas([(doc["created_at"], rollup_delta(doc)) for doc in inserted])
+        if collection.name in TAGGED_COLLECTIONS:
+            await apply_tag_deltas(collection.name, document_tag_deltas(inserted))
+    
+    if report["inserted"]:
+        await bump_change_tokens(collection.name)
+    return report
+
+async def _build_verse_documents(verses: List[VerseCreate]) -> List[Dict[str, Any]]:
+    # Lyric metrics are computed on the process pool in chunks
+    loop = asyncio.get_running_loop()
+    chunk_size = 250
+    chunks = [
+        [(i, verse.lyrics) for i, verse in enumerate(verses[start:start + chunk_size], start=start)]
+        for start in range(0, len(verses), chunk_size)
+    ]
+    results = await asyncio.gather(*(loop.run_in_executor(metrics_pool(), compute_verse_metrics, c) for c in chunks))
+    
+    documents = []
+    for chunk in results:
+        for i, word_count, line_count, rhyme_scheme in chunk:
+            documents.append(Verse(
+                **verses[i].dict(),
+                word_count=word_count,
+                line_count=line_count,
+                rhyme_scheme=rhyme_scheme
+            ).dict())
+    return documents
+
+async def _build_beat_documents(beats: List[BeatCreate]) -> List[Dict[str, Any]]:
+    return [Beat(**beat.dict()).dict() for beat in beats]
+
+async def _build_product_documents(products: List[ProductCreate]) -> List[Dict[str, Any]]:
+    return [new_product(product).dict() for product in products]
+
+@api_router.post("/verses/import")
+async def import_verses(file: UploadFile = File(...), format: Optional[str] = None):
+    return await bulk_import(file, format, VerseCreate, _build_verse_documents, db.verses, _verse_rollup_delta)
+
+@api_router.post("/beats/import")
+async def import_beats(file: UploadFile = File(...), format: Optional[str] = None):
+    report = await bulk_import(file, format, BeatCreate, _build_beat_documents, db.beats)
+    invalidate_beats()
+    if report["inserted"]:
+        invalidate_beat_index()
+    return report
+
+@api_router.post("/products/import")
+async def import_products(file: UploadFile = File(...), format: Optional[str] = None):
+    report = await bulk_import(file, format, ProductCreate, _build_product_documents, db.products, _product_rollup_delta)
+    invalidate_products([])
+    return report
+
+# ENGAGEMENT COUNTERS
+# Plays, likes and downloads are counted in an in-process buffer and flushed as one
+# unordered bulk_write of $incs every COUNTER_FLUSH_INTERVAL seconds (sooner once
+# COUNTER_MAX_PENDING documents are pending), and once more on shutdown.
+#
+# Delivery: a failed flush puts its counts back into the buffer and is retried on
+# the next tick, so every increment accepted while the process is up reaches Mongo
+# at least once. A flush that fails after partially applying can therefore count
+# some increments twice. Shutdown lets an in-flight flush finish rather than
+# cancelling it, then flushes what is left. Increments still buffered when the
+# process is killed without a clean shutdown (at most one flush interval) are lost.
+COUNTER_FLUSH_INTERVAL = float(os.environ.get("COUNTER_FLUSH_INTERVAL", "1.0"))
+COUNTER_MAX_PENDING = int(os.environ.get("COUNTER_MAX_PENDING", "10000"))
+
+class CounterBuffer:
+    def __init__(self, flush_interval: float, max_pending: int):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[tuple, Dict[str, int]] = {}
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+    
+    def increment(self, collection: str, doc_id: str, field: str, amount: int = 1):
+        counts = self._pending.setdefault((collection, doc_id), {})
+        counts[field] = counts.get(field, 0) + amount
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+    
+    async def flush(self):
+        if not self._pending:
+            return
+        # Swap the buffer first; increments arriving during the write go to the next flush
+        pending, self._pending = self._pending, {}
+        by_collection: Dict[str, List[UpdateOne]] = {}
+        for (collection, doc_id), counts in pending.items():
+            by_collection.setdefault(collection, []).append(UpdateOne({"id": doc_id}, {"$inc": counts}))
+        try:
+            await asyncio.gather(*(
+                db[collection].bulk_write(operations, ordered=False)
+                for collection, operations in by_collection.items()
+            ))
+        except BaseException:
+            # Also on cancellation, so the swapped-out counts are never dropped
+            for (collection, doc_id), counts in pending.items():
+                for field, amount in counts.items():
+                    self.increment(collection, doc_id, field, amount)
+            raise
+        await bump_change_tokens(*by_collection)
+    
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Counter flush failed, retrying next interval: %s", e)
+    
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            # The loop exits after the flush it is in (or the one the wakeup triggers)
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+counters = CounterBuffer(COUNTER_FLUSH_INTERVAL, COUNTER_MAX_PENDING)
+
+@api_router.post("/verses/{verse_id}/play", status_code=202)
+async def record_verse_play(verse_id: str):
+    counters.increment("verses", verse_id, "plays_count")
+    return {"message": "Play recorded"}
+
+@api_router.post("/verses/{verse_id}/like", status_code=202)
+async def record_verse_like(verse_id: str):
+    counters.increment("verses", verse_id, "likes_count")
+    return {"message": "Like recorded"}
+
+@api_router.post("/beats/{beat_id}/download", status_code=202)
+async def record_beat_download(beat_id: str):
+    counters.increment("beats", beat_id, "download_count")
+    return {"message": "Download recorded"}
+
+# DATABASE INDEXES
+# One entry per query shape the API issues. create_indexes is idempotent, so the
+# catalogue is applied on every startup; `python server.py indexes --check` explains
+# the representative queries below and fails if any of them still scans a collection.
+LIST_ORDER = [("created_at", -1), ("id", -1)]
+VERSE_LIST_ORDER = [("updated_at", -1), ("id", -1)]
+
+INDEX_CATALOGUE: Dict[str, List[IndexModel]] = {
+    "verses": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel(VERSE_LIST_ORDER),
+        IndexModel([("category", 1)] + VERSE_LIST_ORDER),
+        IndexModel([("priority", 1)] + VERSE_LIST_ORDER),
+        IndexModel([("tags", 1)] + VERSE_LIST_ORDER),
+        IndexModel(LIST_ORDER),
+        IndexModel(
+            [("title", TEXT), ("lyrics", TEXT), ("tags", TEXT), ("beat_name", TEXT)],
+            weights={"title": 10, "tags": 5, "beat_name": 3, "lyrics": 1},
+            name="verses_text"
+        )
+    ],
+    "beats": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel(LIST_ORDER),
+        IndexModel([("bpm", 1), ("created_at", -1)])
+    ],
+    "products": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel(LIST_ORDER),
+        IndexModel([("is_active", 1)] + LIST_ORDER),
+        IndexModel([("is_active", 1), ("sold_count", -1)]),
+        IndexModel([("category", 1), ("is_active", 1)] + LIST_ORDER),
+        IndexModel([("tags", 1)] + LIST_ORDER)
+    ],
+    "reviews": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel([("product_id", 1)] + LIST_ORDER)
+    ],
+    "orders": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel([("order_number", 1)], unique=True),
+        IndexModel(LIST_ORDER),
+        IndexModel([("status", 1)] + LIST_ORDER),
+        IndexModel([("customer_email", 1)] + LIST_ORDER)
+    ],
+    "verse_revisions": [
+        IndexModel([("verse_id", 1), ("version", -1)], unique=True),
+        IndexModel([("verse_id", 1), ("kind", 1), ("version", -1)])
+    ],
+    "analytics_rollups": [
+        IndexModel([("period", 1), ("start", 1)])
+    ],
+    "tag_counts": [
+        IndexModel([("collection", 1), ("count", -1)])
+    ],
+    "beat_uploads": [
+        IndexModel([("id", 1)], unique=True),
+        IndexModel([("created_at", 1)], expireAfterSeconds=BEAT_UPLOAD_TTL)
+    ]
+}
+
+# (endpoint, collection, filter, sort) for the representative query of each endpoint
+INDEX_CHECK_QUERIES = [
+    ("get_verse", "verses", {"id": "check"}, None),
+    ("get_verses", "verses", {}, VERSE_LIST_ORDER),
+    ("get_verses?category", "verses", {"category": VerseCategory.ALBUM.value}, VERSE_LIST_ORDER),
+    ("get_verses?priority", "verses", {"priority": Priority.HIGH.value}, VERSE_LIST_ORDER),
+    ("get_verses?tags", "verses", {"tags": {"$in": ["check"]}}, VERSE_LIST_ORDER),
+    ("search_verses", "verses", {"$text": {"$search": "check"}}, None),
+    ("get_beats", "beats", {}, LIST_ORDER),
+    ("get_beats?bpm", "beats", {"bpm": {"$gte": 80, "$lte": 100}}, LIST_ORDER),
+    ("get_products", "products", {"is_active": True}, LIST_ORDER),
+    ("get_products?category", "products", {"category": ProductCategory.BEATS.value, "is_active": True}, LIST_ORDER),
+    ("get_products?tags", "products", {"tags": {"$in": ["check"]}, "is_active": True}, LIST_ORDER),
+    ("get_product", "products", {"id": "check"}, None),
+    ("top_selling", "products", {"is_active": True}, [("sold_count", -1)]),
+    ("get_product_reviews", "reviews", {"product_id": "check"}, LIST_ORDER),
+    ("get_orders", "orders", {}, LIST_ORDER),
+    ("get_orders?status", "orders", {"status": OrderStatus.PAID.value}, LIST_ORDER),
+    ("get_orders?customer_email", "orders", {"customer_email": "check@example.com"}, LIST_ORDER),
+    ("update_order_status", "orders", {"id": "check"}, None),
+    ("order_number", "orders", {"order_number": "check"}, None),
+    ("monthly_revenue", "orders", {"status": {"$in": REVENUE_STATUSES}, "created_at": {"$gte": datetime(2000, 1, 1)}}, None),
+    ("get_verse_revisions", "verse_revisions", {"verse_id": "check"}, [("version", -1)]),
+    ("reconstruct_revision", "verse_revisions", {"verse_id": "check", "kind": "snapshot", "version": {"$lte": 10}}, [("version", -1)]),
+    ("analytics_rollups", "analytics_rollups", {"period": "month"}, None)
+]
+
+async def ensure_indexes():
+    for collection_name, indexes in INDEX_CATALOGUE.items():
+        try:
+            await db[collection_name].create_indexes(indexes)
+        except OperationFailure as e:
+            # A conflicting or non-unique existing index must not keep the API from starting
+            logger.error("Could not build indexes on %s: %s", collection_name, e)
+
+def _plan_stages(plan: Dict[str, Any]):
+    yield plan.get("stage")
+    for child in ("inputStage", "queryPlan"):
+        if child in plan:
+            yield from _plan_stages(plan[child])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+async def check_indexes() -> List[str]:
+    """Explain each representative query; return the endpoints that fall back to COLLSCAN."""
+    collscans = []
+    for endpoint, collection_name, query, sort in INDEX_CHECK_QUERIES:
+        find = db[collection_name].find(query).limit(100)
+        if sort:
+            find = find.sort(sort)
+        explain = await find.explain()
+        if "COLLSCAN" in _plan_stages(explain["queryPlanner"]["winningPlan"]):
+            collscans.append(f"{endpoint} ({collection_name} {query})")
+    return collscans
+
+# REQUEST METRICS
+# Prometheus text metrics on /metrics, per process: every uvicorn worker keeps and
+# serves its own. MetricsMiddleware times each request up to its last body byte,
+# counts the response bytes and the Mongo commands charged to the request, and logs
+# requests slower than SLOW_REQUEST_SECONDS with the shapes (values blanked) and
+# timings of their commands.
+SLOW_REQUEST_SECONDS = float(os.environ.get("SLOW_REQUEST_SECONDS", "1.0"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+COMMAND_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+def _label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _label_text(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_label_value(value)}"' for name, value in zip(names, values)) + "}"
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple, buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket (+Inf last), sum]
+        self._series: Dict[tuple, list] = {}
+    
+    def observe(self, values: tuple, value: float):
+        series = self._series.get(values)
+        if series is None:
+            series = self._series[values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                labels = _label_text(self.labels + ("le",), values + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, values)} {total}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, values)} {cumulative}")
+        return lines
+
+class CounterMetric:
+    def __init__(self, name: str, help_text: str, labels: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+    
+    def inc(self, values: tuple, amount: float = 1):
+        self._values[values] = self._values.get(values, 0) + amount
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for values, total in sorted(self._values.items()):
+            lines.append(f"{self.name}{_label_text(self.labels, values)} {total}")
+        return lines
+
+class RequestMetrics:
+    def __init__(self):
+        route = ("method", "route")
+        self.in_flight = 0
+        self.requests = CounterMetric("http_requests_total", "HTTP requests by route and status.", route + ("status",))
+        self.latency = Histogram("http_request_duration_seconds", "Time to the last response byte.", route, LATENCY_BUCKETS)
+        self.sizes = Histogram("http_response_size_bytes", "Response body size.", route, SIZE_BUCKETS)
+        self.request_commands = Histogram(
+            "http_request_mongo_commands", "Mongo commands issued per request.", route, COMMAND_COUNT_BUCKETS
+        )
+        self.request_mongo_time = Histogram(
+            "http_request_mongo_seconds", "Time spent in Mongo commands per request.", route, LATENCY_BUCKETS
+        )
+        self.commands = CounterMetric("mongo_commands_total", "Mongo commands by name and outcome.", ("command", "outcome"))
+        self.command_time = CounterMetric("mongo_command_seconds_total", "Time spent in Mongo commands.", ("command",))
+        # The listener runs on Motor's executor threads
+        self._command_lock = threading.Lock()
+    
+    def record_command(self, name: str, seconds: float, failed: bool):
+        with self._command_lock:
+            self.commands.inc((name, "failed" if failed else "succeeded"))
+            self.command_time.inc((name,), seconds)
+    
+    def record_request(self, method: str, route: str, status: int, seconds: float, size: int, stats: RequestStats):
+        labels = (method, route)
+        self.requests.inc(labels + (str(status),))
+        self.latency.observe(labels, seconds)
+        self.sizes.observe(labels, size)
+        self.request_commands.observe(labels, stats.commands)
+        self.request_mongo_time.observe(labels, stats.mongo_seconds)
+    
+    def render(self) -> str:
+        lines = ["# HELP http_requests_in_flight Requests being served.", "# TYPE http_requests_in_flight gauge",
+                 f"http_requests_in_flight {self.in_flight}"]
+        for metric in (self.requests, self.latency, self.sizes, self.request_commands, self.request_mongo_time):
+            lines.extend(metric.render())
+        with self._command_lock:
+            lines.extend(self.commands.render())
+            lines.extend(self.command_time.render())
+        return "\n".join(lines) + "\n"
+
+request_metrics = RequestMetrics()
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        status, size = 500, 0
+        
+        async def send_counted(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+        
+        request_metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, send_counted)
+        finally:
+            request_metrics.in_flight -= 1
+            _request_stats.reset(token)
+            elapsed = time.perf_counter() - started
+            # Label by route template, never the raw path, to keep the series count bounded
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            request_metrics.record_request(scope["method"], route_path, status, elapsed, size, stats)
+            if elapsed >= SLOW_REQUEST_SECONDS:
+                logger.warning(
+                    "Slow request %s %s -> %d in %.0f ms, %d Mongo commands (%.0f ms): %s",
+                    scope["method"], scope["path"], status, elapsed * 1000, stats.commands, stats.mongo_seconds * 1000,
+                    "; ".join(f"{json.dumps(shape, default=str)} {seconds * 1000:.1f} ms" for shape, seconds in stats.shapes)
+                )
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(request_metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -717,7 +3474,10 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
+# Added last so it is outermost and its timings include CORS handling
+app.add_middleware(MetricsMiddleware)
 
 # Configure logging
 logging.basicConfig(
@@ -726,6 +3486,114 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_db_indexes():
+    await ensure_indexes()
+
+@app.on_event("startup")
+async def start_counter_flusher():
+    counters.start()
+
+@app.on_event("startup")
+async def start_beat_analysis():
+    beat_analysis.start()
+
+_catalogue_watch: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def start_catalogue_watch():
+    global _catalogue_watch
+    if CATALOGUE_CACHE_CHANGE_STREAM:
+        _catalogue_watch = asyncio.create_task(watch_catalogue_changes())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    try:
+        await counters.stop()
+    except Exception as e:
+        logger.error("Final counter flush failed: %s", e)
+    if _catalogue_watch is not None:
+        _catalogue_watch.cancel()
+    await beat_analysis.stop()
+    client.close()
+    if _metrics_pool is not None:
+        _metrics_pool.shutdown()
+
+# MAINTENANCE COMMANDS
+async def _run_rebuild_rollups() -> int:
+    mismatches = await rebuild_rollups()
+    for mismatch in mismatches:
+        logger.error("Rollup mismatch - %s", mismatch)
+    if mismatches:
+        return 1
+    logger.info("Analytics rollups rebuilt and verified")
+    return 0
+
+async def _run_recompute_metrics(args) -> int:
+    summary = await recompute_verse_metrics(
+        batch_size=args.batch_size,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        resume=args.resume,
+        start_after=args.start_after
+    )
+    logger.info("Verse metrics recomputed: %s", summary)
+    return 0
+
+async def _run_reconcile_ratings() -> int:
+    summary = await reconcile_product_ratings()
+    logger.info("Product ratings reconciled: %s", summary)
+    return 0
+
+async def _run_rebuild_tags() -> int:
+    summary = await rebuild_tag_counts()
+    logger.info("Tag counts rebuilt: %s", summary)
+    return 0
+
+async def _run_analyze_beats() -> int:
+    queued = await analyze_pending_beats()
+    logger.info("Analysed %d beat files", queued)
+    return 0
+
+async def _run_indexes(check: bool) -> int:
+    if not check:
+        await ensure_indexes()
+        logger.info("Indexes built")
+        return 0
+    collscans = await check_indexes()
+    for collscan in collscans:
+        logger.error("COLLSCAN - %s", collscan)
+    return 1 if collscans else 0
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    
+    parser = argparse.ArgumentParser(description="ONIMIX Artist Platform maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild-rollups", help="Regenerate analytics rollups and verify them against a full recompute")
+    indexes = commands.add_parser("indexes", help="Build the index catalogue")
+    indexes.add_argument("--check", action="store_true", help="Explain each endpoint's query and fail on COLLSCAN")
+    metrics = commands.add_parser("recompute-metrics", help="Recompute word/line counts and rhyme schemes of all verses")
+    metrics.add_argument("--batch-size", type=int, default=1000)
+    metrics.add_argument("--chunk-size", type=int, default=250, help="Verses per process-pool task")
+    metrics.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count)")
+    metrics.add_argument("--resume", action="store_true", help="Continue after the last checkpointed verse id")
+    metrics.add_argument("--start-after", default=None, help="Only process verses with id greater than this")
+    commands.add_parser("reconcile-ratings", help="Recompute every product rating from its reviews (run once after upgrading)")
+    commands.add_parser("rebuild-tags", help="Recount the tags of verses, beats and products")
+    commands.add_parser("analyze-beats", help="Estimate bpm, key and duration of stored beat files not analysed yet")
+    args = parser.parse_args()
+    
+    if args.command == "rebuild-rollups":
+        sys.exit(asyncio.run(_run_rebuild_rollups()))
+    elif args.command == "indexes":
+        sys.exit(asyncio.run(_run_indexes(args.check)))
+    elif args.command == "recompute-metrics":
+        sys.exit(asyncio.run(_run_recompute_metrics(args)))
+    elif args.command == "reconcile-ratings":
+        sys.exit(asyncio.run(_run_reconcile_ratings()))
+    elif args.command == "rebuild-tags":
+        sys.exit(asyncio.run(_run_rebuild_tags()))
+    elif args.command == "analyze-beats":
+        sys.exit(asyncio.run(_run_analyze_beats()))
\ No newline at end of file
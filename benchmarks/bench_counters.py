@@ -0,0 +1,78 @@
+"""Measure engagement-counter throughput against a stub collection.
+
+    python benchmarks/bench_counters.py --seconds 5 --write-latency 0.005
+
+Writers call CounterBuffer.increment (what the play/like/download endpoints do)
+in a tight loop across a pool of documents while the flush loop runs. Each
+bulk_write waits --write-latency seconds, standing in for the Mongo round trip.
+Prints increments/sec, the number of flushes, and checks that every increment
+was written exactly once after the shutdown flush.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bench_counters")
+
+import server  # noqa: E402
+from server import CounterBuffer  # noqa: E402
+
+
+class StubCollection:
+    def __init__(self, latency):
+        self.latency = latency
+        self.total = 0
+        self.flushes = 0
+
+    async def bulk_write(self, operations, ordered=True):
+        await asyncio.sleep(self.latency)
+        self.flushes += 1
+        self.total += sum(amount for operation in operations for amount in operation._doc["$inc"].values())
+
+
+async def no_change_tokens(*collections):
+    pass
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--documents", type=int, default=100000)
+    parser.add_argument("--write-latency", type=float, default=0.005)
+    parser.add_argument("--flush-interval", type=float, default=server.COUNTER_FLUSH_INTERVAL)
+    parser.add_argument("--max-pending", type=int, default=server.COUNTER_MAX_PENDING)
+    args = parser.parse_args()
+
+    verses = StubCollection(args.write_latency)
+    server.db = {"verses": verses}
+    server.bump_change_tokens = no_change_tokens
+    buffer = CounterBuffer(args.flush_interval, args.max_pending)
+    ids = [f"verse-{i}" for i in range(args.documents)]
+    rng = random.Random(0)
+
+    buffer.start()
+    increments = 0
+    started = time.perf_counter()
+    deadline = started + args.seconds
+    while time.perf_counter() < deadline:
+        for doc_id in rng.choices(ids, k=1000):
+            buffer.increment("verses", doc_id, "plays_count")
+        increments += 1000
+        # Yield like a request handler would, so the flush loop gets to run
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+    await buffer.stop()
+
+    print(f"{increments / elapsed:,.0f} increments/sec over {elapsed:.1f} s, {verses.flushes} flushes")
+    assert verses.total == increments, (verses.total, increments)
+    print("every increment written exactly once")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
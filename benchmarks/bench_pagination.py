@@ -0,0 +1,88 @@
+"""Compare skip/limit paging with keyset cursors on a deep verse listing.
+
+Needs a local mongod:
+
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_pagination.py --rows 200000
+
+Seeds a throwaway database, walks to the requested page depths both ways and
+prints the median time of one page fetch at each depth.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bench_pagination")
+
+from fastapi import Response  # noqa: E402
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from server import NEXT_CURSOR_HEADER, fetch_page  # noqa: E402
+
+DB_NAME = "bench_pagination"
+
+
+async def seed(collection, rows):
+    await collection.drop()
+    start = datetime(2020, 1, 1)
+    batch = []
+    for i in range(rows):
+        batch.append({"id": str(uuid.uuid4()), "title": f"Verse {i}", "content": "line\n" * 16,
+                      "category": "freestyle", "created_at": start + timedelta(seconds=i)})
+        if len(batch) == 10000:
+            await collection.insert_many(batch)
+            batch = []
+    if batch:
+        await collection.insert_many(batch)
+    await collection.create_index([("created_at", -1), ("id", -1)])
+
+
+async def timed(coroutine):
+    started = time.perf_counter()
+    await coroutine
+    return time.perf_counter() - started
+
+
+async def cursor_at(collection, depth, limit):
+    # Follow cursors page by page up to the one at the requested depth
+    cursor = None
+    for _ in range(depth // limit):
+        response = Response()
+        await fetch_page(collection, {}, "created_at", limit, cursor, response)
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+    return cursor
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 1000, 10000, 100000, 190000])
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    collection = client[DB_NAME].verses
+    await seed(collection, args.rows)
+    print(f"{'depth':>8} {'skip ms':>10} {'cursor ms':>10}")
+    for depth in args.depths:
+        if depth >= args.rows:
+            continue
+        cursor = await cursor_at(collection, depth, args.limit)
+        skip_times = [await timed(fetch_page(collection, {}, "created_at", args.limit, None, Response(), skip=depth))
+                      for _ in range(args.repeat)]
+        cursor_times = [await timed(fetch_page(collection, {}, "created_at", args.limit, cursor, Response()))
+                        for _ in range(args.repeat)]
+        print(f"{depth:>8} {statistics.median(skip_times) * 1000:>10.2f} {statistics.median(cursor_times) * 1000:>10.2f}")
+    await client.drop_database(DB_NAME)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+"""Time review inserts against products with growing review counts.
+
+Needs a local mongod:
+
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_reviews.py
+
+Each product is seeded with a number of existing reviews and correct rating
+counts, then create_review is timed. The latency should stay flat as the count
+grows, since the product's reviews are not re-read. The one-off backfill of a
+product that predates rating_sum is timed separately.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ["DB_NAME"] = "bench_reviews"
+
+import server  # noqa: E402
+from server import ReviewCreate, rating_fields  # noqa: E402
+
+
+async def seed_product(review_count, legacy=False):
+    product_id = str(uuid.uuid4())
+    rng = random.Random(review_count)
+    ratings = [rng.randint(1, 5) for _ in range(review_count)]
+    for start in range(0, review_count, 10000):
+        await server.db.reviews.insert_many([
+            {"id": str(uuid.uuid4()), "product_id": product_id, "customer_name": "Bench",
+             "customer_email": "bench@example.com", "rating": rating, "comment": "", "created_at": datetime.utcnow()}
+            for rating in ratings[start:start + 10000]
+        ])
+    product = {"id": product_id, "name": f"Product with {review_count} reviews", "created_at": datetime.utcnow()}
+    if legacy:
+        # Written before rating_sum existed: only a rounded average and the count
+        product.update(rating=round(sum(ratings) / review_count, 1), review_count=min(review_count, 1000))
+    else:
+        product.update(rating_fields([{"rating": r, "count": ratings.count(r)} for r in range(1, 6) if r in ratings]))
+    await server.db.products.insert_one(product)
+    return product_id
+
+
+async def time_reviews(product_id, repeat):
+    timings = []
+    for _ in range(repeat):
+        review = ReviewCreate(product_id=product_id, customer_name="Bench", customer_email="bench@example.com",
+                              rating=random.randint(1, 5), comment="")
+        started = time.perf_counter()
+        await server.create_review(review)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--counts", type=int, nargs="+", default=[10, 1000, 100000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    await server.client.drop_database("bench_reviews")
+    await server.ensure_indexes()
+    print(f"{'reviews':>8} {'median ms':>10} {'p95 ms':>8}")
+    for count in args.counts:
+        timings = sorted(await time_reviews(await seed_product(count), args.repeat))
+        print(f"{count:>8} {statistics.median(timings) * 1000:>10.2f} {timings[int(len(timings) * 0.95) - 1] * 1000:>8.2f}")
+    for count in args.counts:
+        first, = await time_reviews(await seed_product(count, legacy=True), 1)
+        print(f"backfill of a legacy product with {count} reviews: {first * 1000:.2f} ms")
+    await server.client.drop_database("bench_reviews")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,56 @@
+"""Time rhyme analysis of cold verses against the bundled pronunciation dictionary.
+
+    python benchmarks/bench_rhymes.py --lines 64
+
+Every run clears the per-word caches and analyses a verse of distinct dictionary
+words, so each word costs a real dictionary lookup. The first (mapping) load is
+timed separately.
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import rhymes  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=64)
+    parser.add_argument("--words-per-line", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    entries = rhymes.dictionary.load()
+    print(f"load: {entries} entries in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    words = sorted({
+        entry.split()[0] for entry in rhymes.DICT_PATH.read_text(encoding="latin-1").splitlines()
+        if entry[:1].isalpha()
+    })
+    words = [word for word in words if word.isalpha()]
+    rng = random.Random(0)
+    timings = []
+    for _ in range(args.repeat):
+        chosen = rng.sample(words, args.lines * args.words_per_line)
+        verse = "\n".join(
+            " ".join(chosen[i:i + args.words_per_line]) for i in range(0, len(chosen), args.words_per_line)
+        )
+        rhymes.pronounce.cache_clear()
+        rhymes.word_rhyme_key.cache_clear()
+        rhymes.word_vowels.cache_clear()
+        started = time.perf_counter()
+        rhymes.analyze_rhymes(verse)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    print(f"{args.lines}-line cold verse: median {statistics.median(timings) * 1000:.2f} ms, "
+          f"p95 {timings[int(len(timings) * 0.95) - 1] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
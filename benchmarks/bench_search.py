@@ -0,0 +1,80 @@
+"""Time lyric search (GET /api/verses/search) on a seeded verse collection.
+
+Needs a local mongod:
+
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_search.py --verses 100000
+
+Seeds a throwaway database with generated verses, builds the index catalogue
+(including the verses text index) and times search_verses for a mix of common,
+rare and multi-word queries. The target is p95 under 20 ms at 100k verses.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ["DB_NAME"] = "bench_search"
+
+import server  # noqa: E402
+from server import Verse, VerseCategory, calculate_line_count, calculate_word_count  # noqa: E402
+
+VOCABULARY = (
+    "money night light dream street grind hustle flow rhyme time mind shine crown city block "
+    "pain gain love heart cold gold fire higher ride side pride real deal beat heat soul road "
+    "window shadow river echo thunder velvet diamond midnight concrete satellite"
+).split()
+QUERIES = ["money", "midnight", "velvet thunder", "grind hustle flow", "satellite", "crown city", "zzzz"]
+
+
+def generated_verse(rng):
+    lyrics = "\n".join(
+        " ".join(rng.choices(VOCABULARY, k=rng.randint(5, 10))) for _ in range(rng.randint(8, 32))
+    )
+    return Verse(
+        title=" ".join(rng.choices(VOCABULARY, k=3)).title(), lyrics=lyrics,
+        category=rng.choice(list(VerseCategory)), tags=rng.sample(VOCABULARY, 2),
+        word_count=calculate_word_count(lyrics), line_count=calculate_line_count(lyrics)
+    ).dict()
+
+
+async def seed(count):
+    await server.client.drop_database("bench_search")
+    rng = random.Random(0)
+    for start in range(0, count, 5000):
+        await server.db.verses.insert_many([generated_verse(rng) for _ in range(min(5000, count - start))])
+    await server.ensure_indexes()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--verses", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    await seed(args.verses)
+    print(f"{'query':>20} {'median ms':>10} {'p95 ms':>8}")
+    everything = []
+    for q in QUERIES:
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            await server.search_verses(q=q, category=None, limit=args.limit)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        everything.extend(timings)
+        print(f"{q:>20} {statistics.median(timings) * 1000:>10.2f} {timings[int(len(timings) * 0.95) - 1] * 1000:>8.2f}")
+    everything.sort()
+    p95 = everything[int(len(everything) * 0.95) - 1] * 1000
+    print(f"overall p95 {p95:.2f} ms ({'within' if p95 < 20 else 'over'} the 20 ms target)")
+    await server.client.drop_database("bench_search")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
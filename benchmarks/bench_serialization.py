@@ -0,0 +1,85 @@
+"""Compare list-page serialization: trusted_rows + encode_rows against
+Verse(**doc) with FastAPI's response_model serialization.
+
+    python benchmarks/bench_serialization.py --rows 1000
+
+No database needed: the page is built in memory, shaped like stored verses
+(every field present, as written through the model).
+Both paths are checked to produce the same JSON before timing.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bench_serialization")
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from server import LIST_SUMMARY_FIELDS, Verse, encode_rows, trusted_rows  # noqa: E402
+
+
+def verse_docs(rows):
+    created = datetime(2024, 1, 1)
+    lyrics = "\n".join(f"line {i} of a verse that runs on for a while" for i in range(16))
+    return [{
+        "id": str(uuid.uuid4()), "title": f"Verse {i}", "lyrics": lyrics, "category": "freestyle",
+        "beat_file_url": None, "beat_external_link": None, "beat_name": "Night drive", "tags": ["dark", "trap"], "notes": "double the hook", "version": 3,
+        "word_count": 144, "line_count": 16, "rhyme_scheme": "AABB", "bpm": 140, "key": "A minor",
+        "mood": "dark", "priority": "high", "collaborators": ["Ann"], "recording_notes": None, "created_at": created + timedelta(minutes=i),
+        "updated_at": created + timedelta(minutes=i, seconds=30), "last_edited_at": created + timedelta(minutes=i),
+        "is_complete": i % 2 == 0, "is_recorded": False, "is_published": False, "plays_count": i, "likes_count": i // 3,
+    } for i in range(rows)]
+
+
+def trusted(docs, fields):
+    return encode_rows(trusted_rows(docs, Verse, fields))
+
+
+def validated(docs, fields, field):
+    # What a response_model=List[Verse] endpoint does with the models it returns
+    content = [Verse(**doc) for doc in docs]
+    body = asyncio.run(serialize_response(field=field, response_content=content, is_coroutine=True))
+    if fields:
+        body = [{name: row[name] for name in fields} for row in body]
+    return JSONResponse(body).body
+
+
+def timed(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    docs = verse_docs(args.rows)
+    field = create_response_field(name="Response_list", type_=List[Verse], mode="serialization")
+    for label, fields in (("full", None), ("summary", tuple(LIST_SUMMARY_FIELDS[Verse]))):
+        assert json.loads(trusted(docs, fields)) == json.loads(validated(docs, fields, field))
+        fast = timed(lambda: trusted(docs, fields), args.repeat)
+        slow = timed(lambda: validated(docs, fields, field), args.repeat)
+        print(f"{args.rows} rows, {label}: trusted_rows+encode_rows {fast:.2f} ms, "
+              f"Verse(**doc)+response_model {slow:.2f} ms ({slow / fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -291,6 +291,8 @@ const VerseManager = () => {
       Object.entries(filters).forEach(([key, value]) => {
         if (value) params.append(key, value);
       });
+      // List cards only need the summary fields plus lyrics for the preview
+      params.append('fields', 'summary,lyrics');
       
       const response = await axios.get(`${API}/verses?${params}`);
       setVerses(response.data);
@@ -370,7 +372,9 @@ const VerseManager = () => {
     setIsEditing(false);
   };
 
-  const editVerse = (verse) => {
+  const editVerse = async (listedVerse) => {
+    // The list holds summary rows; load the full verse for the form
+    const { data: verse } = await axios.get(`${API}/verses/${listedVerse.id}`);
     setSelectedVerse(verse);
     setFormData({
       title: verse.title,
@@ -0,0 +1,91 @@
+import wave
+
+import numpy as np
+import pytest
+
+from audio_analysis import analyze_wav, estimate_key, read_wav_blocks, PITCH_CLASSES
+
+
+def write_wav(path, signal, rate, sample_width, channels=1):
+    signal = np.clip(signal, -1.0, 1.0)
+    if channels == 2:
+        signal = np.repeat(signal, 2)
+    if sample_width == 1:
+        data = (signal * 127 + 128).astype(np.uint8).tobytes()
+    elif sample_width == 2:
+        data = (signal * 32767).astype("<i2").tobytes()
+    elif sample_width == 3:
+        values = (signal * 8388607).astype("<i4")
+        data = values.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    else:
+        data = (signal * 2147483647).astype("<i4").tobytes()
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(sample_width)
+        wav.setframerate(rate)
+        wav.writeframes(data)
+    return path
+
+
+def click_track(bpm, rate, seconds, tonic_hz, minor):
+    """Noise-burst clicks on every beat over a sustained tonic triad plus octave."""
+    t = np.arange(int(rate * seconds)) / rate
+    signal = np.zeros_like(t)
+    burst = int(0.03 * rate)
+    envelope = np.exp(-np.arange(burst) / (0.005 * rate))
+    noise = np.random.default_rng(0).standard_normal(burst) * envelope * 0.6
+    for start in np.arange(0, seconds, 60.0 / bpm):
+        i = int(start * rate)
+        n = min(burst, len(signal) - i)
+        signal[i:i + n] += noise[:n]
+    third = 2 ** ((3 if minor else 4) / 12)
+    for frequency in (tonic_hz, tonic_hz * third, tonic_hz * 2 ** (7 / 12), tonic_hz * 2):
+        signal += 0.08 * np.sin(2 * np.pi * frequency * t)
+    return signal
+
+
+@pytest.mark.parametrize("sample_width, channels", [(1, 1), (2, 2), (3, 1), (4, 1)])
+def test_decodes_every_pcm_width_to_the_same_mono_signal(tmp_path, sample_width, channels):
+    rate = 11025
+    signal = 0.5 * np.sin(2 * np.pi * 440 * np.arange(rate) / rate)
+    path = write_wav(tmp_path / "tone.wav", signal, rate, sample_width, channels)
+    blocks = list(read_wav_blocks(path))
+    decoded = np.concatenate([block for _, block in blocks])
+    assert blocks[0][0] == rate
+    assert np.abs(decoded - signal).max() < (0.02 if sample_width == 1 else 1e-3)
+
+
+def test_decimates_towards_the_target_rate(tmp_path):
+    path = write_wav(tmp_path / "hi.wav", np.zeros(44100), 44100, 2)
+    (rate, block), = read_wav_blocks(path)
+    assert rate == 11025 and len(block) == 11025
+
+
+@pytest.mark.parametrize("sample_width", [1, 2, 3, 4])
+def test_click_track_tempo_and_key(tmp_path, sample_width):
+    path = write_wav(tmp_path / "beat.wav", click_track(128, 22050, 20, 220.0, minor=True), 22050, sample_width)
+    result = analyze_wav(path)
+    assert result["bpm"] == 128
+    assert result["key"] == "A minor"
+    assert result["duration"] == 20
+    assert result["tempo_confidence"] > 0.5
+
+
+def test_major_key_at_cd_rate(tmp_path):
+    path = write_wav(tmp_path / "beat.wav", click_track(90, 44100, 20, 261.63, minor=False), 44100, 2)
+    result = analyze_wav(path)
+    assert result["bpm"] == 90
+    assert result["key"] == "C major"
+
+
+def test_estimate_key_handles_silence_and_transposition():
+    assert estimate_key(np.zeros(12))["key"] is None
+    d_major = np.zeros(12)
+    d_major[[2, 6, 9]] = 1.0
+    assert estimate_key(d_major)["key"] == f"{PITCH_CLASSES[2]} major"
+
+
+def test_empty_wav_is_rejected(tmp_path):
+    path = write_wav(tmp_path / "empty.wav", np.zeros(0), 22050, 2)
+    with pytest.raises(ValueError):
+        analyze_wav(path)
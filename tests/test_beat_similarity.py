@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from beat_similarity import DIMENSIONS, BeatIndex, beat_features, camelot
+
+
+@pytest.mark.parametrize("key, expected", [
+    ("C major", (8, "B")),
+    ("C", (8, "B")),
+    ("C Major", (8, "B")),
+    ("D MAJOR", (10, "B")),
+    ("CM", (8, "B")),
+    ("A Minor", (8, "A")),
+    ("A minor", (8, "A")),
+    ("Am", (8, "A")),
+    ("G major", (9, "B")),
+    ("F major", (7, "B")),
+    ("E minor", (9, "A")),
+    ("C#m", (12, "A")),
+    ("Db major", (3, "B")),
+    ("F♯ minor", (11, "A")),
+    ("B major", (1, "B")),
+    ("8A", (8, "A")),
+    ("12b", (12, "B")),
+    ("", None),
+    (None, None),
+    ("H major", None),
+    ("C dorian", None),
+])
+def test_camelot(key, expected):
+    assert camelot(key) == expected
+
+
+def test_half_and_double_time_share_a_tempo_point():
+    half, _ = beat_features(bpm=70)
+    double, _ = beat_features(bpm=140)
+    other, _ = beat_features(bpm=100)
+    assert np.allclose(half, double, atol=1e-5)
+    assert np.linalg.norm(half - other) > 0.5
+
+
+def test_presence_mask_follows_the_groups_given():
+    vector, present = beat_features(bpm=90, mood="dark")
+    assert vector.shape == (DIMENSIONS,)
+    assert present.tolist() == [1, 0, 1, 0, 0]
+
+
+def beats():
+    return [
+        {"id": "same", "bpm": 140, "key": "A minor", "mood": "dark", "genre": "trap", "tags": ["808"]},
+        {"id": "relative", "bpm": 140, "key": "C major", "mood": "dark", "genre": "trap"},
+        {"id": "far", "bpm": 100, "key": "F# major", "mood": "happy", "genre": "pop"},
+        {"id": "unknown", "bpm": 140},
+    ]
+
+
+def test_search_orders_by_distance_and_honours_exclude():
+    index = BeatIndex(capacity=2)  # grows past its initial capacity
+    index.add_many(beats())
+    assert len(index) == 4 and "far" in index
+    vector, present = index.vector("same")
+    ranked = [beat_id for beat_id, _ in index.search(vector, present, k=4)]
+    assert ranked[0] == "same"
+    assert ranked.index("relative") < ranked.index("far")
+    # Beats missing groups the query has rank behind the ones that match on them
+    assert ranked.index("relative") < ranked.index("unknown")
+    assert [beat_id for beat_id, _ in index.search(vector, present, k=4, exclude="same")] == ranked[1:]
+
+
+def test_search_only_compares_the_groups_the_query_carries():
+    index = BeatIndex()
+    index.add_many(beats())
+    vector, present = beat_features(bpm=70)
+    distances = dict(index.search(vector, present, k=4))
+    # Tempo-only query: 70 BPM is half of 140, so keys and moods don't matter
+    assert distances["same"] == pytest.approx(0.0, abs=1e-5)
+    assert distances["relative"] == pytest.approx(0.0, abs=1e-5)
+    assert distances["far"] > 0.5
+
+
+def test_add_replaces_an_indexed_beat():
+    index = BeatIndex()
+    index.add_many(beats())
+    index.add({"id": "far", "bpm": 140, "key": "A minor", "mood": "dark", "genre": "trap", "tags": ["808"]})
+    assert len(index) == 4
+    vector, present = index.vector("same")
+    top_two = {beat_id for beat_id, _ in index.search(vector, present, k=2)}
+    assert top_two == {"same", "far"}
+
+
+def test_empty_index_and_empty_query():
+    index = BeatIndex()
+    vector, present = beat_features()
+    assert index.search(vector, present) == []
+    index.add_many(beats())
+    assert index.search(vector, present) == []
+    assert index.vector("missing") is None
@@ -0,0 +1,82 @@
+import hashlib
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from server import _append_chunk, _read_range, _store_part, parse_byte_range
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "BEAT_STORAGE_DIR", tmp_path)
+    return tmp_path
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+    ("bytes=abc-", None),
+])
+def test_parse_byte_range(header, expected):
+    assert parse_byte_range(header, 1000) == expected
+
+
+def test_parse_byte_range_past_the_end_is_416():
+    with pytest.raises(HTTPException) as error:
+        parse_byte_range("bytes=1000-", 1000)
+    assert error.value.status_code == 416
+    assert error.value.headers["Content-Range"] == "bytes */1000"
+
+
+def _chunk(storage, name, data):
+    path = storage / "uploads" / f"{name}.chunk"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def test_chunks_append_at_their_offset_and_drop_uncommitted_bytes(storage):
+    part = storage / "uploads" / "u1.part"
+    _append_chunk(part, _chunk(storage, "a", b"hello "), 0)
+    # An interrupted second chunk left bytes past the committed offset
+    with open(part, "ab") as f:
+        f.write(b"garbage")
+    _append_chunk(part, _chunk(storage, "b", b"world"), 6)
+    assert part.read_bytes() == b"hello world"
+
+
+def test_chunk_past_the_stored_data_is_rejected(storage):
+    part = storage / "uploads" / "u1.part"
+    _append_chunk(part, _chunk(storage, "a", b"abc"), 0)
+    with pytest.raises(HTTPException) as error:
+        _append_chunk(part, _chunk(storage, "b", b"def"), 10)
+    assert error.value.status_code == 409
+
+
+def test_store_part_is_content_addressed_and_deduplicated(storage):
+    data = b"RIFF....WAVE" * 1000
+    digest = hashlib.sha256(data).hexdigest()
+    for upload_id in ("u1", "u2"):
+        part = storage / "uploads" / f"{upload_id}.part"
+        part.parent.mkdir(parents=True, exist_ok=True)
+        part.write_bytes(data)
+        assert _store_part(part, digest.upper()) == digest
+        assert not part.exists()
+    assert server.beat_file_path(digest).read_bytes() == data
+    assert b"".join(_read_range(server.beat_file_path(digest), 4, 11)) == data[4:12]
+
+
+def test_store_part_rejects_a_checksum_mismatch(storage):
+    part = storage / "uploads" / "u1.part"
+    part.parent.mkdir(parents=True, exist_ok=True)
+    part.write_bytes(b"corrupted")
+    with pytest.raises(ValueError):
+        _store_part(part, hashlib.sha256(b"original").hexdigest())
+    assert not part.exists()
+    assert not any(storage.glob("??/*"))
@@ -0,0 +1,66 @@
+import asyncio
+from types import SimpleNamespace
+
+from fastapi import Response
+
+import server
+from server import Beat, CatalogueCache, cache_key
+
+
+def test_lru_eviction_and_namespace_invalidation():
+    cache = CatalogueCache(ttl=60, max_bytes=10)
+    cache.set(("beats:list", "a"), "A", 4)
+    cache.set(("beats:list", "b"), "B", 4)
+    assert cache.get(("beats:list", "a")) == "A"
+    cache.set(("products:item", "p1"), "P", 4)
+    # "b" was least recently used
+    assert cache.get(("beats:list", "b")) is None
+    cache.invalidate("beats:list")
+    assert cache.get(("beats:list", "a")) is None
+    assert cache.get(("products:item", "p1")) == "P"
+
+
+def test_set_is_dropped_when_the_namespace_was_invalidated_during_the_read():
+    cache = CatalogueCache(ttl=60, max_bytes=1000)
+    generation = cache.generation("products:list")
+    cache.invalidate("products:list")
+    cache.set(("products:list", ()), "stale", 1, generation)
+    assert cache.get(("products:list", ())) is None
+    cache.set(("products:list", ()), "fresh", 1, cache.generation("products:list"))
+    assert cache.get(("products:list", ())) == "fresh"
+
+
+def test_cache_key_normalizes_tags_and_enums():
+    assert cache_key("beats:list", tags="b, a", limit=10, genre=None) == cache_key("beats:list", limit=10, tags="a,b")
+
+
+def test_page_read_across_a_write_is_not_cached_under_the_old_etag(monkeypatch):
+    cache = CatalogueCache(ttl=60, max_bytes=1 << 20)
+    monkeypatch.setattr(server, "catalogue_cache", cache)
+    tokens = {"beats": ("epoch", 1)}
+    key = cache_key("beats:list", limit=10)
+
+    async def read_change_tokens(*collections):
+        return dict(tokens)
+
+    async def fetch_page(*args, **kwargs):
+        # A writer inserts, bumps the token and invalidates while this read is in flight
+        tokens["beats"] = ("epoch", 2)
+        cache.invalidate("beats:list")
+        return [{"id": "b1", "name": "New beat"}]
+
+    monkeypatch.setattr(server, "read_change_tokens", read_change_tokens)
+    monkeypatch.setattr(server, "fetch_page", fetch_page)
+    collection = SimpleNamespace(name="beats")
+    first = asyncio.run(server.conditional_page(key, collection, {}, "created_at", 10, None, Response(), Beat, None, cache=True))
+    old_etag = first.headers["ETag"]
+    assert cache.get(key) is None
+
+    async def fetch_unchanged(*args, **kwargs):
+        return [{"id": "b1", "name": "New beat"}]
+
+    monkeypatch.setattr(server, "fetch_page", fetch_unchanged)
+    # A client holding the pre-write ETag gets the new body, not a 304
+    second = asyncio.run(server.conditional_page(key, collection, {}, "created_at", 10, None, Response(), Beat, old_etag, cache=True))
+    assert second.status_code == 200 and second.headers["ETag"] != old_etag
+    assert cache.get(key)[2] == second.headers["ETag"]
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+import server
+from server import CounterBuffer
+
+
+class StubCollection:
+    def __init__(self, fail=0, gate=None):
+        self.fail = fail
+        self.gate = gate
+        self.counts = {}
+
+    async def bulk_write(self, operations, ordered=True):
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.fail:
+            self.fail -= 1
+            raise server.PyMongoError("connection reset")
+        for operation in operations:
+            counts = self.counts.setdefault(operation._filter["id"], {})
+            for field, amount in operation._doc["$inc"].items():
+                counts[field] = counts.get(field, 0) + amount
+
+
+@pytest.fixture
+def collections(monkeypatch):
+    collections = {"verses": StubCollection(), "beats": StubCollection()}
+
+    async def bump_change_tokens(*names):
+        pass
+
+    monkeypatch.setattr(server, "db", collections)
+    monkeypatch.setattr(server, "bump_change_tokens", bump_change_tokens)
+    return collections
+
+
+def test_failed_flush_merges_its_counts_back(collections):
+    collections["verses"].fail = 1
+    buffer = CounterBuffer(flush_interval=60, max_pending=100)
+
+    async def run():
+        buffer.increment("verses", "v1", "plays_count", 2)
+        with pytest.raises(server.PyMongoError):
+            await buffer.flush()
+        buffer.increment("verses", "v1", "plays_count")
+        buffer.increment("verses", "v1", "likes_count")
+        await buffer.flush()
+
+    asyncio.run(run())
+    assert collections["verses"].counts == {"v1": {"plays_count": 3, "likes_count": 1}}
+
+
+def test_max_pending_flushes_before_the_interval(collections):
+    buffer = CounterBuffer(flush_interval=60, max_pending=2)
+
+    async def run():
+        buffer.start()
+        buffer.increment("verses", "v1", "plays_count")
+        await asyncio.sleep(0.01)
+        assert collections["verses"].counts == {}
+        buffer.increment("beats", "b1", "download_count")
+        await asyncio.sleep(0.01)
+        assert collections["verses"].counts == {"v1": {"plays_count": 1}}
+        assert collections["beats"].counts == {"b1": {"download_count": 1}}
+        await buffer.stop()
+
+    asyncio.run(run())
+
+
+def test_stop_lets_an_in_flight_flush_finish_and_flushes_the_rest(collections):
+    gate = asyncio.Event()
+    collections["verses"].gate = gate
+    buffer = CounterBuffer(flush_interval=60, max_pending=1)
+
+    async def run():
+        buffer.start()
+        buffer.increment("verses", "v1", "plays_count")
+        await asyncio.sleep(0.01)  # the loop is now blocked inside bulk_write
+        buffer.increment("verses", "v1", "plays_count")
+        stopping = asyncio.create_task(buffer.stop())
+        await asyncio.sleep(0.01)
+        assert not stopping.done()
+        gate.set()
+        await stopping
+
+    asyncio.run(run())
+    assert collections["verses"].counts == {"v1": {"plays_count": 2}}
+
+
+def test_cancelled_flush_keeps_its_counts(collections):
+    gate = asyncio.Event()
+    collections["verses"].gate = gate
+    buffer = CounterBuffer(flush_interval=60, max_pending=100)
+
+    async def run():
+        buffer.increment("verses", "v1", "plays_count")
+        flushing = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0.01)
+        flushing.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await flushing
+        gate.set()
+        await buffer.flush()
+
+    asyncio.run(run())
+    assert collections["verses"].counts == {"v1": {"plays_count": 1}}
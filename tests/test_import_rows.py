@@ -0,0 +1,39 @@
+import csv
+import io
+from types import SimpleNamespace
+
+from server import INVALID_UTF8, _import_rows
+
+
+def rows(data: bytes, format: str):
+    return list(_import_rows(SimpleNamespace(file=io.BytesIO(data)), format))
+
+
+def test_csv_rows_split_list_columns_and_drop_empty_values():
+    parsed = rows(b"\xef\xbb\xbftitle,tags,mood\nOne,a; b;,\n", "csv")
+    assert parsed == [(1, {"title": "One", "tags": ["a", "b"]})]
+
+
+def test_csv_row_that_is_not_utf8_is_reported_and_the_rest_still_parse():
+    data = "title,mood\nCaf\xe9,calm\nPlain,dark\n".encode("cp1252")
+    (first_number, first), second = rows(data, "csv")
+    assert first_number == 1 and isinstance(first, ValueError) and str(first) == INVALID_UTF8
+    assert second == (2, {"title": "Plain", "mood": "dark"})
+
+
+def test_csv_errors_are_reported_per_row():
+    limit = csv.field_size_limit()
+    data = b"title,mood\n" + b"x" * (limit + 1) + b",calm\nShort,dark\n"
+    parsed = rows(data, "csv")
+    assert isinstance(parsed[0][1], ValueError) and str(parsed[0][1]).startswith("Invalid CSV")
+    assert parsed[-1][1] == {"title": "Short", "mood": "dark"}
+
+
+def test_ndjson_reports_bad_lines_and_skips_blank_ones():
+    data = b'{"title": "One"}\n\nnot json\n{"title": "Caf\xe9"}\n{"title": "Two"}\n'
+    parsed = rows(data, "ndjson")
+    assert [number for number, _ in parsed] == [1, 3, 4, 5]
+    assert parsed[0][1] == {"title": "One"}
+    assert str(parsed[1][1]).startswith("Invalid JSON")
+    assert str(parsed[2][1]) == INVALID_UTF8
+    assert parsed[3][1] == {"title": "Two"}
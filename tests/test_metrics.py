@@ -0,0 +1,108 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import server
+from server import Histogram, MetricsMiddleware, RequestMetrics, RequestStats, command_shape
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency.", ("route",), (0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(("/a",), value)
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/a",le="0.1"} 2',
+        'latency_seconds_bucket{route="/a",le="1.0"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 3.65',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    histogram = Histogram("h", "H.", ("route",), (1,))
+    histogram.observe(('say "hi"\\\n',), 0)
+    assert 'h_count{route="say \\"hi\\"\\\\\\n"} 1' in histogram.render()
+
+
+def test_command_shape_blanks_values_but_keeps_sorts_and_stages():
+    shape = command_shape("aggregate", {
+        "aggregate": "beats",
+        "pipeline": [{"$match": {"bpm": {"$gte": 90}, "tags": {"$in": ["808", "dark"]}}}, {"$sort": {"bpm": -1}}],
+        "cursor": {},
+        "lsid": {"id": "secret"},
+    })
+    assert shape == {
+        "command": "aggregate",
+        "collection": "beats",
+        "pipeline": [{"$match": {"bpm": {"$gte": "?"}, "tags": {"$in": ["?"]}}}, {"$sort": {"bpm": -1}}],
+    }
+
+
+def run_request(monkeypatch, app, path="/api/beats/b1"):
+    metrics = RequestMetrics()
+    monkeypatch.setattr(server, "request_metrics", metrics)
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "headers": []}
+    asyncio.run(MetricsMiddleware(app)(scope, receive, send))
+    return metrics, sent
+
+
+def test_middleware_records_route_status_size_and_mongo_commands(monkeypatch):
+    async def app(scope, receive, send):
+        # What routing and two Mongo commands would leave behind
+        scope["route"] = SimpleNamespace(path="/api/beats/{beat_id}")
+        server._request_stats.get().add(0.002, {"command": "find"})
+        server._request_stats.get().add(0.003, None)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"x" * 300, "more_body": True})
+        await send({"type": "http.response.body", "body": b"y" * 200})
+
+    metrics, sent = run_request(monkeypatch, app)
+    assert len(sent) == 3
+    text = metrics.render()
+    assert 'http_requests_total{method="GET",route="/api/beats/{beat_id}",status="200"} 1' in text
+    assert 'http_response_size_bytes_sum{method="GET",route="/api/beats/{beat_id}"} 500' in text
+    assert 'http_request_mongo_commands_sum{method="GET",route="/api/beats/{beat_id}"} 2' in text
+    assert "http_requests_in_flight 0" in text
+    assert server._request_stats.get() is None
+
+
+def test_unmatched_routes_share_one_label(monkeypatch):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 404, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    metrics, _ = run_request(monkeypatch, app, path="/random/123")
+    assert 'route="unmatched",status="404"' in metrics.render()
+
+
+def test_slow_requests_are_logged_with_their_query_shapes(monkeypatch, caplog):
+    monkeypatch.setattr(server, "SLOW_REQUEST_SECONDS", 0.0)
+
+    async def app(scope, receive, send):
+        server._request_stats.get().add(0.25, {"command": "find", "filter": {"tags": "?"}})
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    with caplog.at_level(logging.WARNING, logger=server.logger.name):
+        run_request(monkeypatch, app)
+    assert "Slow request GET /api/beats/b1" in caplog.text
+    assert '{"command": "find", "filter": {"tags": "?"}} 250.0 ms' in caplog.text
+
+
+def test_request_stats_cap_the_recorded_shapes():
+    stats = RequestStats()
+    for _ in range(server.MAX_REQUEST_SHAPES + 10):
+        stats.add(0.001, {"command": "find"})
+    assert stats.commands == server.MAX_REQUEST_SHAPES + 10
+    assert len(stats.shapes) == server.MAX_REQUEST_SHAPES
@@ -0,0 +1,29 @@
+from server import ProductCreate, _product_stock_change, _tracks_stock, new_product
+
+
+def _product(**overrides):
+    fields = {"name": "Tee", "description": "Cotton", "price": 25.0, "category": "merch", "product_type": "physical"}
+    return ProductCreate(**{**fields, **overrides})
+
+
+def test_new_physical_products_with_stock_are_tracked():
+    assert new_product(_product(stock_quantity=10)).track_stock is True
+    assert new_product(_product()).track_stock is False
+    assert new_product(_product(stock_quantity=10, track_stock=False)).track_stock is False
+    assert new_product(_product(product_type="digital", stock_quantity=10)).track_stock is False
+
+
+def test_products_from_before_stock_tracking_are_unlimited():
+    legacy = {"id": "p1", "product_type": "physical", "stock_quantity": 0}
+    assert not _tracks_stock(legacy)
+    assert _product_stock_change(legacy, 3) == ({"id": "p1"}, {"$inc": {"sold_count": 3}})
+
+
+def test_tracked_stock_is_decremented_conditionally_and_released_unconditionally():
+    product = {"id": "p1", "product_type": "physical", "track_stock": True, "stock_quantity": 5}
+    assert _product_stock_change(product, 2) == (
+        {"id": "p1", "stock_quantity": {"$gte": 2}}, {"$inc": {"sold_count": 2, "stock_quantity": -2}}
+    )
+    assert _product_stock_change(product, 2, sign=-1) == (
+        {"id": "p1"}, {"$inc": {"sold_count": -2, "stock_quantity": 2}}
+    )
@@ -0,0 +1,80 @@
+import asyncio
+import base64
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException, Response
+from fastapi.routing import APIRoute
+
+from server import NEXT_CURSOR_HEADER, app, decode_cursor, encode_cursor, fetch_page, keyset_query
+
+
+def test_cursor_round_trips_datetimes_and_raw_values():
+    when = datetime(2024, 5, 1, 12, 30, 15, 250000)
+    assert decode_cursor(encode_cursor({"id": "v9", "updated_at": when}, "updated_at")) == (when, "v9")
+    assert decode_cursor(encode_cursor({"id": "p3", "price": 19.99}, "price")) == (19.99, "p3")
+    assert decode_cursor(encode_cursor({"id": "p4"}, "price")) == (None, "p4")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64 at all!",
+    base64.urlsafe_b64encode(b"[1, 2]").decode(),
+    base64.urlsafe_b64encode(b'{"t": "dt", "v": "yesterday", "id": "x"}').decode(),
+    base64.urlsafe_b64encode(b'{"t": "raw", "v": 1}').decode(),
+])
+def test_malformed_cursors_are_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_keyset_query_continues_after_the_cursor():
+    when = datetime(2024, 5, 1)
+    cursor = encode_cursor({"id": "v9", "created_at": when}, "created_at")
+    after = {"$or": [{"created_at": {"$lt": when}}, {"created_at": when, "id": {"$lt": "v9"}}]}
+    assert keyset_query({}, "created_at", cursor) == after
+    assert keyset_query({"category": "hooks"}, "created_at", cursor) == {"$and": [{"category": "hooks"}, after]}
+    assert keyset_query({"category": "hooks"}, "created_at", None) == {"category": "hooks"}
+
+
+class StubFind:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys):
+        return self
+
+    def skip(self, count):
+        return StubFind(self.docs[count:])
+
+    def limit(self, count):
+        return StubFind(self.docs[:count])
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+def test_fetch_page_sets_the_next_cursor_only_when_more_rows_exist():
+    docs = [{"id": f"v{i}", "created_at": datetime(2024, 1, 10 - i)} for i in range(3)]
+    collection = SimpleNamespace(find=lambda query, projection=None: StubFind(docs))
+    response = Response()
+    page = asyncio.run(fetch_page(collection, {}, "created_at", 2, None, response))
+    assert [doc["id"] for doc in page] == ["v0", "v1"]
+    assert decode_cursor(response.headers[NEXT_CURSOR_HEADER]) == (docs[1]["created_at"], "v1")
+    response = Response()
+    asyncio.run(fetch_page(collection, {}, "created_at", 3, None, response))
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+def test_every_limit_parameter_rejects_zero():
+    # limit=0 would make fetch_page build a cursor from an empty page
+    limits = [
+        (route.path, param)
+        for route in app.routes if isinstance(route, APIRoute)
+        for param in route.dependant.query_params if param.name.endswith("limit")
+    ]
+    assert limits
+    for path, param in limits:
+        lower = [constraint.ge for constraint in param.field_info.metadata if hasattr(constraint, "ge")]
+        assert lower and lower[0] >= 1, path
@@ -0,0 +1,143 @@
+import asyncio
+from types import SimpleNamespace
+
+import server
+from server import RATING_SUM_KNOWN, ReviewCreate, rating_fields, rating_update_pipeline
+
+
+def evaluate(doc, expression):
+    """The aggregation operators rating_update_pipeline uses, over dotted paths."""
+    if isinstance(expression, str) and expression.startswith("$"):
+        value = doc
+        for part in expression[1:].split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        return value
+    if isinstance(expression, dict):
+        (operator, argument), = expression.items()
+        values = [evaluate(doc, item) for item in argument]
+        if operator == "$add":
+            return sum(values)
+        if operator == "$ifNull":
+            return values[1] if values[0] is None else values[0]
+        if operator == "$divide":
+            return values[0] / values[1]
+        if operator == "$round":
+            return round(values[0], values[1])
+        raise AssertionError(f"unsupported operator {operator}")
+    return expression
+
+
+def apply_pipeline(doc, pipeline):
+    for stage in pipeline:
+        updates = {field: evaluate(doc, value) for field, value in stage["$set"].items()}
+        for field, value in updates.items():
+            target = doc
+            *parents, leaf = field.split(".")
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            target[leaf] = value
+    return doc
+
+
+def test_rating_update_pipeline_starts_an_unreviewed_product():
+    doc = apply_pipeline({"id": "p1"}, rating_update_pipeline(4))
+    assert doc == {"id": "p1", "rating_sum": 4, "review_count": 1, "rating_histogram": {"4": 1}, "rating": 4.0}
+
+
+def test_rating_update_pipeline_adds_to_the_existing_counts():
+    doc = {"rating_sum": 9, "review_count": 2, "rating_histogram": {"4": 1, "5": 1}}
+    apply_pipeline(doc, rating_update_pipeline(1))
+    assert (doc["rating_sum"], doc["review_count"], doc["rating"]) == (10, 3, 3.3)
+    assert doc["rating_histogram"] == {"1": 1, "4": 1, "5": 1}
+
+
+def test_rating_fields():
+    assert rating_fields([{"rating": 5, "count": 2}, {"rating": 2, "count": 1}]) == {
+        "rating_sum": 12,
+        "review_count": 3,
+        "rating": 4.0,
+        "rating_histogram": {"1": 0, "2": 1, "3": 0, "4": 0, "5": 2},
+    }
+    assert rating_fields([])["rating"] == 0.0
+
+
+class StubCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+    async def to_list(self, length):
+        return list(self.docs)
+
+
+class StubProducts:
+    def __init__(self, matched=1):
+        self.matched = matched
+        self.calls = []
+
+    async def update_one(self, query, update):
+        self.calls.append(("update_one", query, update))
+        return SimpleNamespace(matched_count=self.matched)
+
+    async def update_many(self, query, update):
+        self.calls.append(("update_many", query, update))
+        return SimpleNamespace(modified_count=1)
+
+    async def bulk_write(self, operations, ordered=True):
+        self.calls.append(("bulk_write", [(op._filter, op._doc) for op in operations]))
+        return SimpleNamespace(modified_count=len(operations))
+
+    async def count_documents(self, query, limit=0):
+        return 1
+
+
+def stub_db(monkeypatch, products, review_groups):
+    reviews = SimpleNamespace(aggregate=lambda pipeline: StubCursor(review_groups))
+
+    async def insert_one(doc):
+        return SimpleNamespace(inserted_id=doc["id"])
+
+    async def bump_change_tokens(*collections):
+        pass
+
+    reviews.insert_one = insert_one
+    monkeypatch.setattr(server, "db", SimpleNamespace(products=products, reviews=reviews))
+    monkeypatch.setattr(server, "bump_change_tokens", bump_change_tokens)
+    monkeypatch.setattr(server, "invalidate_products", lambda ids: None)
+
+
+def test_reconcile_sets_reviewed_products_and_clears_the_rest(monkeypatch):
+    products = StubProducts()
+    stub_db(monkeypatch, products, [
+        {"_id": "p1", "stars": [{"rating": 5, "count": 3}, {"rating": 3, "count": 1}]},
+        {"_id": "p2", "stars": [{"rating": 1, "count": 1}]},
+    ])
+    result = asyncio.run(server.reconcile_product_ratings(chunk_size=1))
+    assert result == {"reviewed_products": 2, "updated": 3}
+    writes = [call[1] for call in products.calls if call[0] == "bulk_write"]
+    assert writes == [
+        [({"id": "p1"}, {"$set": rating_fields([{"rating": 5, "count": 3}, {"rating": 3, "count": 1}])})],
+        [({"id": "p2"}, {"$set": rating_fields([{"rating": 1, "count": 1}])})],
+    ]
+    (_, query, update), = [call for call in products.calls if call[0] == "update_many"]
+    assert sorted(query["id"]["$nin"]) == ["p1", "p2"]
+    assert update == {"$set": rating_fields([])}
+
+
+def test_first_review_of_a_legacy_product_backfills_its_counts(monkeypatch):
+    # A product rated before rating_sum existed does not match RATING_SUM_KNOWN
+    products = StubProducts(matched=0)
+    stars = [{"rating": 4, "count": 2}, {"rating": 5, "count": 1}]
+    stub_db(monkeypatch, products, stars)
+    asyncio.run(server.create_review(ReviewCreate(
+        product_id="p1", customer_name="Ann", customer_email="ann@example.com", rating=5, comment="ok"
+    )))
+    incremental, backfill = products.calls
+    assert incremental[1] == {"id": "p1", **RATING_SUM_KNOWN}
+    assert backfill[1:] == ({"id": "p1", "rating_sum": {"$exists": False}}, {"$set": rating_fields(stars)})
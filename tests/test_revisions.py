@@ -0,0 +1,51 @@
+import random
+
+import pytest
+
+from server import REVISION_SNAPSHOT_INTERVAL, _apply_revision_delta, _revision_delta, _revision_fields
+
+OLD = ["Money on my mind", "I never sleep", "Promises I made", "I gotta keep"]
+
+
+@pytest.mark.parametrize("new", [
+    OLD,
+    [],
+    ["New intro"] + OLD,
+    OLD[:2] + ["Changed line"] + OLD[3:],
+    OLD[::-1],
+    OLD + ["", "Outro"],
+])
+def test_delta_rebuilds_the_new_lyrics(new):
+    ops = _revision_delta(OLD, new)
+    assert _apply_revision_delta(OLD, ops) == new
+
+
+def test_delta_copies_unchanged_ranges_instead_of_storing_them():
+    ops = _revision_delta(OLD, OLD[:3] + ["I gotta keep it real"])
+    assert ops == [{"c": [0, 3]}, {"i": ["I gotta keep it real"]}]
+
+
+def test_random_edit_chains_rebuild_exactly():
+    rng = random.Random(7)
+    lines = [f"line {i}" for i in range(40)]
+    for _ in range(200):
+        edited = list(lines)
+        for _ in range(rng.randint(1, 4)):
+            position = rng.randrange(len(edited) + 1)
+            action = rng.choice(["insert", "delete", "replace"])
+            if action == "insert" or not edited:
+                edited.insert(position, f"new {rng.random():.6f}")
+            elif action == "delete":
+                del edited[min(position, len(edited) - 1)]
+            else:
+                edited[min(position, len(edited) - 1)] = f"changed {rng.random():.6f}"
+        assert _apply_revision_delta(lines, _revision_delta(lines, edited)) == edited
+        lines = edited
+
+
+def test_snapshots_every_interval():
+    verse = {"id": "v1", "title": "T", "lyrics": "a\nb"}
+    previous = {**verse, "lyrics": "a"}
+    assert _revision_fields({**verse, "version": 1})["kind"] == "snapshot"
+    assert _revision_fields({**verse, "version": 2}, previous)["kind"] == "delta"
+    assert _revision_fields({**verse, "version": REVISION_SNAPSHOT_INTERVAL + 1}, previous)["kind"] == "snapshot"
@@ -0,0 +1,122 @@
+import random
+
+import pytest
+
+import rhymes
+from rhymes import PronunciationDictionary, analyze_rhymes, letter_to_sound, rhyme_tail
+
+FIXTURE_DICT = """;;; tiny CMUdict-format fixture, deliberately unsorted
+night N AY1 T
+light L AY1 T
+aalborg AO1 L B AO0 R G # place, danish
+read R EH1 D
+read(2) R IY1 D
+dreams D R IY1 M Z
+"""
+
+
+@pytest.fixture
+def fixture_dictionary(tmp_path):
+    path = tmp_path / "fixture.dict"
+    path.write_text(FIXTURE_DICT)
+    return PronunciationDictionary(path)
+
+
+def test_lookup_finds_entries_in_unsorted_file(fixture_dictionary):
+    assert fixture_dictionary.load() == 6
+    assert fixture_dictionary.lookup("night") == ["N", "AY1", "T"]
+    assert fixture_dictionary.lookup("dreams") == ["D", "R", "IY1", "M", "Z"]
+    assert fixture_dictionary.lookup("nope") is None
+
+
+def test_lookup_strips_trailing_comments(fixture_dictionary):
+    assert fixture_dictionary.lookup("aalborg") == ["AO1", "L", "B", "AO0", "R", "G"]
+
+
+def test_lookup_prefers_primary_pronunciation(fixture_dictionary):
+    assert fixture_dictionary.lookup("read") == ["R", "EH1", "D"]
+
+
+def test_missing_dictionary_falls_back_to_nothing(tmp_path):
+    dictionary = PronunciationDictionary(tmp_path / "absent.dict")
+    assert dictionary.load() == 0
+    assert dictionary.lookup("night") is None
+
+
+def test_letter_to_sound_handles_magic_e_and_suffixes():
+    assert letter_to_sound("time") == ["T", "AY", "M"]
+    assert letter_to_sound("grindin'") == ["G", "R", "IH", "N", "D", "IH", "N"]
+
+
+def test_rhyme_tail_starts_at_last_stressed_vowel():
+    assert rhyme_tail(("M", "AH1", "N", "IY0"), True) == ("AH", "N", "IY")
+    # Unstressed "-er" endings rhyme on the syllable before
+    assert rhyme_tail(("K", "IH", "L", "ER"), False) == ("IH", "L", "ER")
+
+
+def test_analyze_rhymes_aabb():
+    verse = (
+        "I been grinding every day and night\n"
+        "Chasing dreams until the morning light\n"
+        "\n"
+        "Money on my mind I never sleep\n"
+        "Promises I made I gotta keep\n"
+    )
+    result = analyze_rhymes(verse)
+    assert result["scheme"] == "AABB"
+    assert result["groups"] == {"A": [0, 1], "B": [2, 3]}
+    assert result["lines"][0]["end_word"] == "night"
+    assert result["lines"][0]["rhymes_with"] == [1]
+    assert result["lines"][3]["rhymes_with"] == [2]
+
+
+def test_analyze_rhymes_leaves_unrhymed_lines_in_their_own_group():
+    result = analyze_rhymes("Look at the sky\nWe walk to the river\nNothing but orange")
+    assert len(set(result["scheme"])) == 3
+
+
+def test_internal_rhymes_ignore_stopwords():
+    result = analyze_rhymes("The cat sat on the mat with a hat")
+    assert result["lines"][0]["internal_rhymes"] == [["cat", "hat", "mat", "sat"]]
+
+
+def test_lookups_bisect_the_keys_built_at_load(fixture_dictionary, monkeypatch):
+    fixture_dictionary.load()
+
+    def key_at(offset):
+        raise AssertionError("lookup re-read a key from the mapping")
+
+    monkeypatch.setattr(fixture_dictionary, "_key_at", key_at)
+    assert fixture_dictionary.lookup("light") == ["L", "AY1", "T"]
+    assert fixture_dictionary.lookup("zzz") is None
+
+
+def test_first_lookup_logs_the_dictionary_status(fixture_dictionary, tmp_path, caplog):
+    caplog.set_level("INFO", logger="rhymes")
+    fixture_dictionary.lookup("night")
+    fixture_dictionary.lookup("light")
+    PronunciationDictionary(tmp_path / "absent.dict").lookup("night")
+    assert [(record.levelname, "6 entries" in record.getMessage()) for record in caplog.records] == [
+        ("INFO", True), ("WARNING", False)
+    ]
+
+
+def dictionary_verse(lines, words_per_line=8, seed=0):
+    """Distinct dictionary words, so every lookup misses the per-word caches."""
+    entries = rhymes.DICT_PATH.read_text(encoding="latin-1").splitlines()
+    words = sorted({entry.split()[0] for entry in entries if entry[:1].isalpha()})
+    words = [word for word in words if word.isalpha() and word.islower()]
+    chosen = random.Random(seed).sample(words, lines * words_per_line)
+    return "\n".join(" ".join(chosen[i:i + words_per_line]) for i in range(0, len(chosen), words_per_line))
+
+
+@pytest.mark.skipif(not rhymes.dictionary.load(), reason="bundled pronunciation dictionary not present")
+def test_cold_64_line_verse_uses_the_dictionary_for_every_line():
+    verse = dictionary_verse(64)
+    rhymes.pronounce.cache_clear()
+    rhymes.word_rhyme_key.cache_clear()
+    rhymes.word_vowels.cache_clear()
+    result = analyze_rhymes(verse)
+    assert len(result["lines"]) == 64 and all(line["group"] for line in result["lines"])
+    end_words = {line["end_word"] for line in result["lines"]}
+    assert all(rhymes.dictionary.lookup(word) for word in end_words)
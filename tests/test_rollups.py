@@ -0,0 +1,127 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import server
+from server import (
+    OrderStatus, VerseCategory, _compute_rollup_documents, _merge_deltas, _order_rollup_delta,
+    _product_rollup_delta, _rollup_buckets, _verse_rollup_delta, apply_rollup_deltas,
+)
+
+
+def verse(**fields):
+    return {"category": VerseCategory.FREESTYLE, "is_complete": False, "is_recorded": False,
+            "is_published": False, "word_count": 40, "line_count": 8, **fields}
+
+
+def test_rollup_buckets_are_the_day_and_month_of_created_at():
+    assert _rollup_buckets(datetime(2024, 2, 29, 23, 59, 59)) == [
+        ("day:2024-02-29", "day", datetime(2024, 2, 29)),
+        ("month:2024-02", "month", datetime(2024, 2, 1)),
+    ]
+
+
+def test_verse_delta_counts_flags_and_sizes_with_sign():
+    assert _verse_rollup_delta(verse(is_complete=True, is_published=True), -1) == {
+        "verses.total": -1,
+        "verses.by_category.freestyle": -1,
+        "verses.completed": -1,
+        "verses.recorded": 0,
+        "verses.published": -1,
+        "verses.word_count": -40,
+        "verses.line_count": -8,
+    }
+
+
+def test_verse_update_that_changes_category_moves_one_count():
+    before = verse()
+    after = verse(category="hooks", is_recorded=True, word_count=52)
+    assert _merge_deltas(_verse_rollup_delta(before, -1), _verse_rollup_delta(after)) == {
+        "verses.by_category.freestyle": -1,
+        "verses.by_category.hooks": 1,
+        "verses.recorded": 1,
+        "verses.word_count": 12,
+    }
+
+
+def test_order_status_change_moves_revenue_in_and_out():
+    order = {"status": OrderStatus.PENDING, "final_amount": 25.0}
+    paid = {**order, "status": OrderStatus.PAID}
+    assert _merge_deltas(_order_rollup_delta(order, -1), _order_rollup_delta(paid)) == {
+        "orders.by_status.pending": -1,
+        "orders.by_status.paid": 1,
+        "orders.revenue": 25.0,
+        "orders.revenue_orders": 1,
+    }
+    shipped = {**order, "status": "shipped"}
+    # Moving between revenue statuses leaves the revenue where it was
+    assert _merge_deltas(_order_rollup_delta(paid, -1), _order_rollup_delta(shipped)) == {
+        "orders.by_status.paid": -1,
+        "orders.by_status.shipped": 1,
+    }
+    cancelled = {**order, "status": "cancelled"}
+    assert _merge_deltas(_order_rollup_delta(shipped, -1), _order_rollup_delta(cancelled))["orders.revenue"] == -25.0
+
+
+def test_inactive_products_are_not_counted():
+    assert _product_rollup_delta({"category": "merch", "is_active": False}) == {}
+    assert _product_rollup_delta({"category": "merch"}, -1) == {"products.active": -1, "products.by_category.merch": -1}
+
+
+def test_merge_deltas_sums_fields_and_drops_zeros():
+    assert _merge_deltas({"a": 1, "b": 2}, {"a": -1, "c": 0.5}, {}) == {"b": 2, "c": 0.5}
+
+
+def test_apply_rollup_deltas_merges_per_bucket(monkeypatch):
+    writes = []
+
+    async def bulk_write(operations, ordered=True):
+        writes.extend((op._filter["_id"], op._doc["$inc"]) for op in operations)
+
+    monkeypatch.setattr(server, "db", SimpleNamespace(analytics_rollups=SimpleNamespace(bulk_write=bulk_write)))
+    asyncio.run(apply_rollup_deltas([
+        (datetime(2024, 3, 1, 9), {"verses.total": 1}),
+        (datetime(2024, 3, 2, 9), {"verses.total": 1}),
+        (datetime(2024, 4, 1, 9), {"verses.total": 1}),
+        (datetime(2024, 4, 1, 18), {"verses.total": -1}),
+    ]))
+    # April's changes cancel out, so neither of its buckets is written
+    assert sorted(writes) == [
+        ("day:2024-03-01", {"verses.total": 1}),
+        ("day:2024-03-02", {"verses.total": 1}),
+        ("month:2024-03", {"verses.total": 2}),
+    ]
+
+
+def test_compute_rollup_documents_folds_days_into_months(monkeypatch):
+    groups = {
+        "verses": [
+            {"_id": {"day": "2024-03-01", "category": "hooks"}, "total": 2, "completed": 1, "recorded": 0,
+             "published": 0, "word_count": 60, "line_count": 12},
+            {"_id": {"day": "2024-03-02", "category": "hooks"}, "total": 1, "completed": 0, "recorded": 1,
+             "published": 1, "word_count": 30, "line_count": 6},
+        ],
+        "products": [{"_id": {"day": "2024-03-02", "category": "merch"}, "count": 3}],
+        "orders": [
+            {"_id": {"day": "2024-03-01", "status": "paid"}, "count": 2, "revenue": 40.0},
+            {"_id": {"day": "2024-03-02", "status": "pending"}, "count": 1, "revenue": 15.0},
+        ],
+    }
+
+    def collection(name):
+        async def to_list(length):
+            return groups[name]
+        return SimpleNamespace(aggregate=lambda pipeline: SimpleNamespace(to_list=to_list))
+
+    monkeypatch.setattr(server, "db", SimpleNamespace(**{name: collection(name) for name in groups}))
+    documents = {document["_id"]: document for document in asyncio.run(_compute_rollup_documents())}
+    assert set(documents) == {"day:2024-03-01", "day:2024-03-02", "month:2024-03"}
+    month = documents["month:2024-03"]
+    assert (month["period"], month["start"]) == ("month", datetime(2024, 3, 1))
+    assert month["verses"] == {"total": 3, "by_category": {"hooks": 3}, "completed": 1, "recorded": 1,
+                               "published": 1, "word_count": 90, "line_count": 18}
+    assert month["products"] == {"active": 3, "by_category": {"merch": 3}}
+    # Pending orders count but carry no revenue
+    assert month["orders"] == {"total": 3, "by_status": {"paid": 2, "pending": 1}, "revenue": 40.0, "revenue_orders": 2}
+    assert documents["day:2024-03-01"]["orders"]["by_status"] == {"paid": 2}
+    assert "products" not in documents["day:2024-03-01"]
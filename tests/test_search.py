@@ -0,0 +1,53 @@
+import pytest
+
+from server import SNIPPET_LENGTH, lyric_snippet, search_terms_pattern
+
+
+def hits(pattern, text):
+    return [match.group() for match in pattern.finditer(text)]
+
+
+def test_pattern_matches_terms_as_case_insensitive_word_prefixes():
+    pattern = search_terms_pattern("Rhyme TIME")
+    assert hits(pattern, "Rhymes all the time, lifetime sometimes") == ["Rhymes", "time"]
+
+
+def test_pattern_keeps_apostrophes_and_drops_one_letter_terms():
+    pattern = search_terms_pattern("a ain't I")
+    assert hits(pattern, "I ain't a rapper, ain'tcha") == ["ain't", "ain'tcha"]
+
+
+@pytest.mark.parametrize("search", ["a", "!!", " ", "I ."])
+def test_pattern_is_none_without_usable_terms(search):
+    assert search_terms_pattern(search) is None
+
+
+def test_pattern_escapes_regex_characters():
+    # Only word characters and apostrophes make terms, so nothing reaches the regex unescaped
+    assert hits(search_terms_pattern("(money)+ [cash]*"), "money over cash") == ["money", "cash"]
+
+
+def test_snippet_is_the_line_with_most_hits_with_end_exclusive_offsets():
+    lyrics = "  Intro line here  \n\nMoney money, more money\nI want money\n"
+    snippet, highlights = lyric_snippet(lyrics, search_terms_pattern("money"))
+    assert snippet == "Money money, more money"
+    assert highlights == [[0, 5], [6, 11], [18, 23]]
+    assert [snippet[start:end] for start, end in highlights] == ["Money", "money", "money"]
+
+
+def test_snippet_ties_go_to_the_first_line():
+    snippet, highlights = lyric_snippet("cash rules\nmoney talks", search_terms_pattern("cash money"))
+    assert (snippet, highlights) == ("cash rules", [[0, 4]])
+
+
+def test_snippet_is_truncated_and_highlights_stay_inside_it():
+    line = "word " * 40 + "money"
+    snippet, highlights = lyric_snippet(line, search_terms_pattern("word money"))
+    assert len(snippet) == SNIPPET_LENGTH
+    assert highlights[-1][1] <= SNIPPET_LENGTH
+    assert len(highlights) == SNIPPET_LENGTH // 5
+
+
+def test_snippet_without_pattern_or_lyrics():
+    assert lyric_snippet("first\nsecond", None) == ("first", [])
+    assert lyric_snippet(" \n\n", search_terms_pattern("money")) == ("", [])
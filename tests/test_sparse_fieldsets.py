@@ -0,0 +1,57 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from fastapi.routing import APIRoute
+
+from server import LIST_SUMMARY_FIELDS, app, Beat, Order, Product, Verse, list_fields, model_projection, trusted_rows
+
+
+def test_full_or_empty_selects_every_field():
+    assert list_fields(Verse, "full", "updated_at") is None
+    assert list_fields(Verse, " , ", "updated_at") is None
+
+
+@pytest.mark.parametrize("model", [Verse, Beat, Product, Order])
+def test_summary_fields_exist_on_their_model(model):
+    selected = list_fields(model, "summary", "created_at")
+    assert set(LIST_SUMMARY_FIELDS[model]) <= set(selected)
+    assert set(selected) <= set(model.model_fields)
+
+
+def test_explicit_fields_keep_model_order_and_always_include_id_and_sort_field():
+    assert list_fields(Verse, "lyrics, title", "updated_at") == ("id", "title", "lyrics", "updated_at")
+    selected = list_fields(Verse, "summary,lyrics", "updated_at")
+    assert "lyrics" in selected and "notes" not in selected
+
+
+def test_unknown_fields_are_400():
+    with pytest.raises(HTTPException) as error:
+        list_fields(Beat, "name,password,_id", "created_at")
+    assert error.value.status_code == 400
+    assert error.value.detail == "Unknown fields: _id, password"
+
+
+def test_projection_never_includes_mongo_id():
+    assert model_projection(Verse, ("id", "title")) == {"_id": 0, "id": 1, "title": 1}
+    assert set(model_projection(Order)) == {"_id", *Order.model_fields}
+
+
+def test_trusted_rows_match_model_construct_and_fill_only_missing_fields():
+    created = datetime(2024, 1, 1)
+    full = Verse(title="t", lyrics="a\nb", category="freestyle", created_at=created).dict()
+    old = {key: value for key, value in full.items() if key not in ("plays_count", "likes_count")}
+    rows = trusted_rows([full, old, {**full, "_id": "x"}], Verse)
+    assert rows[0] == full and list(rows[0]) == list(Verse.model_fields)
+    assert rows[1] == Verse.model_construct(**old).__dict__
+    assert rows[1]["plays_count"] == 0 and list(rows[1]) == list(Verse.model_fields)
+    assert "_id" not in rows[2]
+    summary = trusted_rows([old], Verse, ("id", "plays_count", "unknown"))
+    assert summary == [{"id": full["id"], "plays_count": 0}]
+
+
+@pytest.mark.parametrize("path", ["/api/verses", "/api/beats", "/api/products", "/api/reviews/product/{product_id}", "/api/orders"])
+def test_list_routes_do_not_declare_a_response_model(path):
+    # They return pre-encoded rows (summary rows by default), which a List[Model] schema would misdescribe
+    route, = [route for route in app.routes if isinstance(route, APIRoute) and route.path == path and "GET" in route.methods]
+    assert route.response_model is None
@@ -0,0 +1,78 @@
+import asyncio
+import random
+from types import SimpleNamespace
+
+import pytest
+
+import server
+from server import TagIndex, apply_tag_deltas, document_tag_deltas, tag_deltas
+
+
+def test_tag_deltas_count_each_tag_once_per_document():
+    assert tag_deltas(["a", "b", "b"], ["b", "c", "c"]) == {"a": -1, "b": 0, "c": 1}
+    assert tag_deltas(None, ["a"]) == {"a": 1}
+    assert tag_deltas(["a"], None) == {"a": -1}
+    assert document_tag_deltas([{"tags": ["a", "a"]}, {"tags": ["a", "b"]}, {}], -1) == {"a": -2, "b": -1}
+
+
+def brute_force(counts, prefix, limit):
+    folded = prefix.casefold()
+    matching = sorted(
+        (-count, (tag.casefold(), tag)) for tag, count in counts.items() if tag.casefold().startswith(folded)
+    )
+    return [{"tag": key[1], "count": -negated} for negated, key in matching[:limit]]
+
+
+@pytest.mark.parametrize("prefix", ["", "t", "tr", "trap", "TR", "x", "zz", "trap soul"])
+def test_top_matches_a_full_scan_whichever_order_it_walks(prefix):
+    rng = random.Random(0)
+    words = ["trap", "Trap", "drill", "soul", "lofi", "boom bap", "x"]
+    counts = {f"{rng.choice(words)}{rng.randrange(500)}": rng.randint(1, 50) for _ in range(2000)}
+    counts.update({"trap soul": 5, "x": 1000})
+    index = TagIndex(counts)
+    for limit in (1, 5, 200):
+        assert index.top(prefix, limit) == brute_force(counts, prefix, limit)
+
+
+def test_add_moves_counts_and_drops_tags_at_zero():
+    index = TagIndex({"trap": 3, "drill": 2})
+    index.add("drill", 2)
+    assert index.top("", 2) == [{"tag": "drill", "count": 4}, {"tag": "trap", "count": 3}]
+    index.add("trap", -3)
+    assert index.get("trap") == 0 and len(index) == 1
+    assert index.top("tr", 5) == []
+
+
+@pytest.fixture
+def tag_counts(monkeypatch):
+    calls = []
+
+    async def bulk_write(operations, ordered=True):
+        calls.append(("bulk_write", {op._filter["_id"]: op._doc["$inc"]["count"] for op in operations}))
+
+    async def delete_many(query):
+        calls.append(("delete_many", query))
+
+    monkeypatch.setattr(server, "db", SimpleNamespace(tag_counts=SimpleNamespace(bulk_write=bulk_write, delete_many=delete_many)))
+    monkeypatch.setattr(server, "_tag_indexes", {"verses": (0.0, TagIndex({"trap": 2, "drill": 1}))})
+    return calls
+
+
+def test_apply_tag_deltas_writes_and_updates_the_loaded_index(tag_counts):
+    asyncio.run(apply_tag_deltas("verses", {"trap": 1, "soul": 1, "unchanged": 0, "": 1}))
+    assert tag_counts == [("bulk_write", {"verses:trap": 1, "verses:soul": 1})]
+    index = server._tag_indexes["verses"][1]
+    assert (index.get("trap"), index.get("soul")) == (3, 1)
+
+
+def test_apply_tag_deltas_removes_tags_that_reach_zero(tag_counts):
+    asyncio.run(apply_tag_deltas("verses", {"drill": -1, "trap": -1}))
+    assert tag_counts[1] == ("delete_many", {"collection": "verses", "count": {"$lte": 0}})
+    index = server._tag_indexes["verses"][1]
+    assert index.get("drill") == 0 and index.top("", 5) == [{"tag": "trap", "count": 1}]
+
+
+def test_apply_tag_deltas_without_changes_writes_nothing(tag_counts):
+    asyncio.run(apply_tag_deltas("verses", {"trap": 0}))
+    asyncio.run(apply_tag_deltas("beats", {"trap": 1}))
+    assert tag_counts == [("bulk_write", {"beats:trap": 1})]
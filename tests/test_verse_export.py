@@ -0,0 +1,82 @@
+import asyncio
+import io
+import json
+import tracemalloc
+import zipfile
+from datetime import datetime
+
+import pytest
+
+from server import VERSE_CSV_COLUMNS, VERSE_EXPORT_FORMATS
+
+LYRICS = "Money on my mind I never sleep\nPromises I made I gotta keep\n" * 8
+
+
+def verse(i):
+    return {
+        "id": f"{i:08d}-0000-0000-0000-000000000000", "title": f"Verse {i}", "lyrics": LYRICS,
+        "category": "freestyle", "priority": "medium", "tags": ["late night", "demo"],
+        "created_at": datetime(2024, 1, 1), "updated_at": datetime(2024, 1, 2)
+    }
+
+
+async def cursor(count):
+    # Stands in for the Motor cursor: documents are produced one at a time, never held
+    for i in range(count):
+        yield verse(i)
+
+
+def export(format, count, keep=False):
+    """Run an export writer to completion; return (bytes written or kept output, peak traced bytes)."""
+    async def consume():
+        output = bytearray() if keep else None
+        written = 0
+        async for chunk in VERSE_EXPORT_FORMATS[format][2](cursor(count)):
+            data = chunk.encode() if isinstance(chunk, str) else chunk
+            written += len(data)
+            if keep:
+                output.extend(data)
+        return bytes(output) if keep else written
+
+    tracemalloc.start()
+    try:
+        result = asyncio.run(consume())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+# pytest records every warning it sees; the per-row Model.dict() deprecation warning would dominate the measurement
+@pytest.mark.filterwarnings("ignore::DeprecationWarning")
+@pytest.mark.parametrize("format", ["ndjson", "csv"])
+def test_100k_export_memory_stays_flat(format):
+    written, peak = export(format, 100_000)
+    assert written > 100_000 * len(LYRICS)
+    # A handful of verses' worth, against ~50 MB of output
+    assert peak < 2_000_000
+
+
+def test_zip_export_keeps_only_entry_metadata():
+    count = 10_000
+    written, peak = export("zip", count)
+    assert written > 0
+    # zipfile holds one ZipInfo per entry for the central directory, but never the lyrics themselves
+    assert peak < count * 2_000
+
+
+def test_exports_round_trip():
+    ndjson, _ = export("ndjson", 3, keep=True)
+    lines = [json.loads(line) for line in ndjson.decode().splitlines()]
+    assert [line["title"] for line in lines] == ["Verse 0", "Verse 1", "Verse 2"]
+
+    csv_text, _ = export("csv", 2, keep=True)
+    header, first = csv_text.decode().splitlines()[:2]
+    assert header == ",".join(VERSE_CSV_COLUMNS)
+    assert "late night;demo" in first
+
+    archive, _ = export("zip", 2, keep=True)
+    with zipfile.ZipFile(io.BytesIO(archive)) as zipped:
+        names = zipped.namelist()
+        assert names == ["Verse 0-00000000.txt", "Verse 1-00000001.txt"]
+        assert LYRICS in zipped.read(names[0]).decode()
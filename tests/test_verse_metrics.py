@@ -0,0 +1,31 @@
+from server import compute_verse_metrics, metric_changes
+
+LYRICS = "I got the cat\nsitting on a mat\n\nthe night is bright\n"
+
+
+def test_compute_verse_metrics():
+    assert compute_verse_metrics([("v1", LYRICS), ("v2", ""), ("v3", "one line only")]) == [
+        ("v1", 12, 3, "AAB"),
+        ("v2", 0, 0, "N/A"),
+        ("v3", 3, 1, "N/A"),
+    ]
+
+
+def test_metric_changes_flags_any_differing_metric_and_returns_deltas():
+    batch = [
+        {"id": "same", "word_count": 12, "line_count": 3, "rhyme_scheme": "AAB"},
+        {"id": "words", "word_count": 10, "line_count": 3, "rhyme_scheme": "AAB"},
+        {"id": "lines", "word_count": 12, "line_count": 4, "rhyme_scheme": "AAB"},
+        {"id": "scheme", "word_count": 12, "line_count": 3, "rhyme_scheme": "ABC"},
+        {"id": "never-computed"},
+    ]
+    results = [(verse["id"], 12, 3, "AAB") for verse in batch]
+    changed, word_deltas, line_deltas = metric_changes(batch, results)
+    assert changed.tolist() == [1, 2, 3, 4]
+    assert word_deltas.tolist() == [0, 2, 0, 0, 12]
+    assert line_deltas.tolist() == [0, 0, -1, 0, 3]
+
+
+def test_metric_changes_of_an_empty_batch():
+    changed, word_deltas, line_deltas = metric_changes([], [])
+    assert changed.size == word_deltas.size == line_deltas.size == 0
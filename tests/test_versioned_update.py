@@ -0,0 +1,146 @@
+import asyncio
+import copy
+
+import pytest
+from fastapi import HTTPException
+
+from server import required_version, versioned_update
+
+
+class StubCollection:
+    """In-memory stand-in for the part of a Motor collection versioned_update uses.
+
+    It understands exactly the filter and pipeline shapes versioned_update sends:
+    equality, $or and $exists filters, and $literal / $add / $ifNull / "$field"
+    expressions in a single $set stage. Each call is atomic, like the server's.
+    """
+
+    def __init__(self, *docs):
+        self.docs = [copy.deepcopy(doc) for doc in docs]
+        self.lock = asyncio.Lock()
+
+    def _matches(self, doc, query):
+        for field, condition in query.items():
+            if field == "$or":
+                if not any(self._matches(doc, option) for option in condition):
+                    return False
+            elif isinstance(condition, dict) and "$exists" in condition:
+                if (field in doc) != condition["$exists"]:
+                    return False
+            elif doc.get(field, None) != condition or field not in doc:
+                return False
+        return True
+
+    def _evaluate(self, doc, expression):
+        if isinstance(expression, str) and expression.startswith("$"):
+            return doc.get(expression[1:])
+        if isinstance(expression, dict):
+            (operator, argument), = expression.items()
+            if operator == "$literal":
+                return argument
+            if operator == "$add":
+                return sum(self._evaluate(doc, item) for item in argument)
+            if operator == "$ifNull":
+                value = self._evaluate(doc, argument[0])
+                return self._evaluate(doc, argument[1]) if value is None else value
+            raise AssertionError(f"unsupported operator {operator}")
+        return expression
+
+    async def find_one_and_update(self, query, pipeline, return_document=None):
+        async with self.lock:
+            # Yield inside the "server" so concurrent callers really interleave around it
+            await asyncio.sleep(0)
+            for doc in self.docs:
+                if self._matches(doc, query):
+                    before = copy.deepcopy(doc)
+                    (stage,) = pipeline
+                    doc.update({field: self._evaluate(before, value) for field, value in stage["$set"].items()})
+                    return before
+            return None
+
+    async def count_documents(self, query, limit=0):
+        return sum(1 for doc in self.docs if self._matches(doc, query))
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.mark.parametrize("if_match, expected_version, version", [
+    (None, None, None),
+    ("*", None, None),
+    ('"3"', None, 3),
+    ('W/"3"', None, 3),
+    ('"3-1f2e3d4c5b6a7980"', None, 3),
+    ('"3"', 5, 5),
+])
+def test_required_version(if_match, expected_version, version):
+    assert required_version(if_match, expected_version) == version
+
+
+def test_required_version_rejects_garbage():
+    with pytest.raises(HTTPException) as error:
+        required_version('"abc"', None)
+    assert error.value.status_code == 400
+
+
+def test_update_bumps_version_and_returns_both_images():
+    collection = StubCollection({"id": "p1", "name": "Old", "version": 4})
+    before, after = run(versioned_update(collection, "p1", {"name": "New"}, 4, "Product not found"))
+    assert before["name"] == "Old" and before["version"] == 4
+    assert after == {"id": "p1", "name": "New", "version": 5}
+    assert collection.docs[0] == after
+
+
+def test_stale_version_is_a_conflict_and_missing_document_is_not_found():
+    collection = StubCollection({"id": "p1", "name": "Old", "version": 4})
+    with pytest.raises(HTTPException) as error:
+        run(versioned_update(collection, "p1", {"name": "New"}, 3, "Product not found"))
+    assert error.value.status_code == 409
+    assert collection.docs[0]["name"] == "Old"
+    with pytest.raises(HTTPException) as error:
+        run(versioned_update(collection, "missing", {"name": "New"}, 3, "Product not found"))
+    assert error.value.status_code == 404
+
+
+def test_unversioned_document_reads_and_updates_as_version_1():
+    collection = StubCollection({"id": "p1", "name": "Legacy"})
+    # The ETag of a legacy document says version 1, so If-Match "1" must apply
+    _, after = run(versioned_update(collection, "p1", {"name": "Edited"}, 1, "Product not found"))
+    assert after["version"] == 2 and collection.docs[0]["version"] == 2
+    # ...and an editor still holding "1" is now stale
+    with pytest.raises(HTTPException) as error:
+        run(versioned_update(collection, "p1", {"name": "Clobber"}, 1, "Product not found"))
+    assert error.value.status_code == 409
+
+
+def test_unconditional_update_of_unversioned_document_moves_to_version_2():
+    collection = StubCollection({"id": "p1", "name": "Legacy"})
+    _, after = run(versioned_update(collection, "p1", {"name": "Edited"}, None, "Product not found"))
+    assert after["version"] == 2 and collection.docs[0]["version"] == 2
+
+
+def test_dollar_strings_are_stored_literally():
+    collection = StubCollection({"id": "v1", "lyrics": "", "version": 1})
+    _, after = run(versioned_update(collection, "v1", {"lyrics": "$money"}, None, "Verse not found"))
+    assert collection.docs[0]["lyrics"] == after["lyrics"] == "$money"
+
+
+def test_concurrent_updates_with_the_same_version_let_exactly_one_through():
+    collection = StubCollection({"id": "v1", "title": "Draft", "version": 7})
+
+    async def edit(title):
+        try:
+            await versioned_update(collection, "v1", {"title": title}, 7, "Verse not found")
+            return title
+        except HTTPException as error:
+            return error.status_code
+
+    async def race():
+        return await asyncio.gather(*(edit(f"Edit {i}") for i in range(10)))
+
+    outcomes = run(race())
+    winners = [outcome for outcome in outcomes if outcome != 409]
+    assert len(winners) == 1
+    assert outcomes.count(409) == 9
+    assert collection.docs[0] == {"id": "v1", "title": winners[0], "version": 8}